@@ -0,0 +1,285 @@
+"""
+Réponses pré-calculées pour les questions juridiques les plus fréquentes.
+
+Un job hors ligne extrait les questions les plus posées (app.log, journal
+structuré des requêtes ou fichier JSONL de questions), les fait passer par
+query() et conserve les réponses validées avec l'embedding de leur question. À l'exécution, une question
+suffisamment proche d'une question stockée (similarité cosinus, mêmes
+articles et mêmes codes cités) reçoit la réponse stockée; toute autre
+question suit le pipeline complet.
+
+Le magasin porte une empreinte des prompts (versions des gabarits), des
+modèles (et du routage), du format de contexte et du corpus: s'il ne
+correspond plus à la configuration courante, il est ignoré jusqu'à sa
+régénération.
+
+Usage:
+    python answer_store.py build --log app.log --top 50
+    python answer_store.py build --query-log logs --top 50
+    python answer_store.py build --questions questions.jsonl --top 100
+    python answer_store.py refresh      # régénère les questions déjà stockées
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from legal_entities import parse_legal_entities
+from metrics import REGISTRY
+from singleflight import normalize_question
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = REGISTRY.counter("rag_answer_store_lookups_total", "Recherches dans le magasin de réponses pré-calculées")
+
+# Métadonnées de la réponse conservées avec elle (les durées et dégradations sont celles du build)
+STORED_METADATA = ("used_pinecone", "used_web", "chunks_found")
+
+# Ligne de app.log écrite par _run_query (question tronquée à 100 caractères)
+_LOG_QUESTION_RE = re.compile(r"📝 Nouvelle requête: (.*)\.\.\.$")
+_LOG_QUESTION_MAX = 100
+
+
+def corpus_version(engine) -> str:
+    """Version du corpus: CORPUS_VERSION si défini, sinon manifeste local ou statistiques Pinecone."""
+    if Config.CORPUS_VERSION:
+        return Config.CORPUS_VERSION
+    if getattr(engine, "local_index", False):
+        manifest = engine.index.manifest
+        return f"local:{manifest['count']}:{manifest['built_at']}"
+    try:
+        stats = engine.index.describe_index_stats()
+        stats = stats.to_dict() if hasattr(stats, "to_dict") else stats
+        namespace = (stats.get("namespaces") or {}).get(engine.namespace or "", {})
+        return f"pinecone:{stats.get('total_vector_count')}:{namespace.get('vector_count')}"
+    except Exception as e:
+        # Version inconnue: l'empreinte ne correspondra à aucun magasin (jamais de réponse périmée)
+        logger.warning(f"⚠️  Version du corpus indéterminée ({e}), magasin de réponses ignoré")
+        return f"inconnue:{time.time()}"
+
+
+def fingerprint(engine) -> str:
+    """Empreinte de tout ce dont dépend une réponse: prompts, modèles, format de contexte, corpus."""
+    parts = {
+        "prompts": {name: scaffold.version for name, scaffold in sorted(engine.prompt_scaffolds.items())},
+        "models": [Config.EMBEDDING_MODEL, Config.EXPANDER_MODEL, Config.SYNTHESIZER_MODEL],
+        "context_format": Config.CONTEXT_FORMAT.lower(),
+        "namespace": engine.namespace or "",
+        "corpus": corpus_version(engine),
+    }
+    if Config.MODEL_ROUTING:
+        # Avec le routage, une réponse stockée peut venir du petit modèle
+        parts["routing"] = [Config.SMALL_EXPANDER_MODEL, Config.SMALL_SYNTHESIZER_MODEL, Config.ROUTER_THRESHOLD]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _legal_key(question: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    # Deux questions très proches peuvent viser des articles différents (1457 / 1458)
+    parsed = parse_legal_entities(question)
+    return tuple(sorted(parsed.article_numbers)), tuple(sorted(parsed.codes))
+
+
+class AnswerStore:
+    """Réponses validées, recherchées par texte normalisé puis par plus proche voisin."""
+
+    def __init__(self, entries: List[Dict[str, Any]], fingerprint: str, min_similarity: float):
+        self.fingerprint = fingerprint
+        self.min_similarity = min_similarity
+        self.entries = [e for e in entries if e.get("vetted")]
+        # Les questions sont comparées sous leur forme nettoyée par les guardrails, comme à l'exécution
+        self._by_text = {normalize_question(e["sanitized"]): e for e in self.entries}
+        self._keys = [_legal_key(e["sanitized"]) for e in self.entries]
+        if self.entries:
+            matrix = np.asarray([e["embedding"] for e in self.entries], dtype=np.float32)
+            self._matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        else:
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def load(cls, path: str, expected_fingerprint: str, min_similarity: float) -> Optional["AnswerStore"]:
+        """Charge le magasin s'il existe et correspond à la configuration courante."""
+        if not os.path.exists(path):
+            logger.warning(f"⚠️  Magasin de réponses introuvable: {path}")
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("fingerprint") != expected_fingerprint:
+            logger.warning(
+                f"⚠️  Magasin de réponses obsolète (prompts, modèles ou corpus modifiés depuis le {data.get('built_at')}): "
+                f"ignoré, relancez 'python answer_store.py refresh'"
+            )
+            return None
+        store = cls(data.get("entries", []), expected_fingerprint, min_similarity)
+        logger.info(f"✅ Magasin de réponses chargé: {len(store)} réponse(s) validée(s), construit le {data.get('built_at')}")
+        return store
+
+    def lookup_text(self, question: str) -> Optional[Dict[str, Any]]:
+        """Correspondance exacte sur la question normalisée (sans embedding)."""
+        return self._by_text.get(normalize_question(question))
+
+    def lookup(self, question: str, embedding: List[float]) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Entrée la plus proche si sa similarité atteint le seuil et qu'elle cite les mêmes articles et codes."""
+        if not self.entries:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = self._matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        key = _legal_key(question)
+        for i in np.argsort(-scores):
+            if scores[i] < self.min_similarity:
+                break
+            if self._keys[i] == key:
+                return self.entries[i], float(scores[i])
+        return None
+
+
+def record_lookup(outcome: str):
+    """Compte une recherche dans le magasin ("hit" ou "miss")."""
+    LOOKUPS.inc(outcome=outcome)
+
+
+# ---------------------------------------------------------------------------
+# Job hors ligne
+# ---------------------------------------------------------------------------
+
+def questions_from_log(path: str) -> Iterable[str]:
+    """Questions de app.log; celles tronquées à l'écriture du journal sont écartées."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = _LOG_QUESTION_RE.search(line.rstrip("\n"))
+            if match and len(match.group(1)) < _LOG_QUESTION_MAX:
+                yield match.group(1)
+
+
+def questions_from_query_log(directory: str) -> Iterable[str]:
+    """Questions du journal structuré (QUERY_LOG_QUESTION_TEXT=true), requêtes répondues seulement."""
+    from query_log import read_events
+    for event in read_events(directory):
+        text = event.get("question", {}).get("text")
+        if text and event.get("outcome") == "answered" and not event.get("follow_up"):
+            yield text
+
+
+def questions_from_jsonl(path: str) -> Iterable[str]:
+    from batch_runner import read_questions
+    for item in read_questions(path):
+        yield item["question"]
+
+
+def top_questions(questions: Iterable[str], top: int) -> List[Tuple[str, int]]:
+    """Questions les plus fréquentes (regroupées par forme normalisée, première graphie conservée)."""
+    counts: Counter = Counter()
+    spelling: Dict[str, str] = {}
+    for question in questions:
+        normalized = normalize_question(question)
+        if normalized:
+            counts[normalized] += 1
+            spelling.setdefault(normalized, question.strip())
+    return [(spelling[q], n) for q, n in counts.most_common(top)]
+
+
+def vet(metadata: Dict[str, Any]) -> Optional[str]:
+    """Raison du rejet d'une réponse, None si elle peut être servie telle quelle."""
+    if metadata.get("blocked") or metadata.get("error"):
+        return "requête bloquée ou en erreur"
+    if not metadata.get("used_pinecone") or not metadata.get("chunks_found"):
+        return "réponse non fondée sur la base interne"
+    if metadata.get("used_web"):
+        return "réponse fondée sur le web (contenu non figé)"
+    if metadata.get("degradations"):
+        return f"pipeline dégradé ({', '.join(metadata['degradations'])})"
+    return None
+
+
+def build_store(questions: List[Tuple[str, int]], path: str, engine=None) -> Dict[str, Any]:
+    """Fait passer les questions par query() et écrit le magasin (réponses validées et rejetées)."""
+    if engine is None:
+        from rag_engine import ImprovedFusionRAGQuery
+        engine = ImprovedFusionRAGQuery()
+    # Le build ne doit jamais se servir du magasin qu'il remplace
+    engine.answer_store = None
+
+    from guardrails import get_guardrails
+    guardrails = get_guardrails()
+
+    entries = []
+    for i, (question, count) in enumerate(questions, 1):
+        with guardrails.rate_limit_exemption("answer-store"):
+            answer, metadata = engine.query(question, user_id="answer-store")
+        rejected = vet(metadata)
+        sanitized = guardrails.sanitize_input(question)
+        entries.append({
+            "question": question,
+            "sanitized": sanitized,
+            "count": count,
+            "embedding": engine._embed_query(sanitized),
+            "answer": answer,
+            "metadata": {k: metadata[k] for k in STORED_METADATA if k in metadata},
+            "vetted": rejected is None,
+            "rejected": rejected,
+        })
+        logger.info(f"   {i}/{len(questions)} {'✅' if rejected is None else '❌ ' + rejected}: {question[:60]}")
+
+    data = {
+        "fingerprint": fingerprint(engine),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "entries": entries,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+    summary = {"questions": len(entries), "vetted": sum(e["vetted"] for e in entries), "fingerprint": data["fingerprint"]}
+    logger.info(f"✅ Magasin de réponses écrit dans {path}: {json.dumps(summary, ensure_ascii=False)}")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Construit le magasin de réponses pré-calculées")
+    parser.add_argument("command", choices=("build", "refresh"))
+    parser.add_argument("--log", help="Journal applicatif (app.log) d'où extraire les questions")
+    parser.add_argument("--query-log", help="Répertoire du journal structuré des requêtes (QUERY_LOG_DIR)")
+    parser.add_argument("--questions", help="Questions (JSONL: {\"question\"} par ligne)")
+    parser.add_argument("--top", type=int, default=Config.ANSWER_STORE_TOP_N, help="Nombre de questions à pré-calculer")
+    parser.add_argument("--output", default=Config.ANSWER_STORE_PATH)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.command == "refresh":
+        # Mêmes questions, réponses régénérées avec les prompts, modèles et corpus courants
+        with open(args.output, encoding="utf-8") as f:
+            questions = [(e["question"], e.get("count", 0)) for e in json.load(f)["entries"]]
+    else:
+        sources: List[Iterable[str]] = []
+        if args.log:
+            sources.append(questions_from_log(args.log))
+        if args.query_log:
+            sources.append(questions_from_query_log(args.query_log))
+        if args.questions:
+            sources.append(questions_from_jsonl(args.questions))
+        if not sources:
+            parser.error("build: --log, --query-log ou --questions requis")
+        questions = top_questions((q for source in sources for q in source), args.top)
+
+    print(json.dumps(build_store(questions, args.output), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
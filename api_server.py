@@ -0,0 +1,299 @@
+"""
+API HTTP (ASGI) du moteur RAG, sans interface Streamlit.
+
+Endpoints:
+- POST /v1/query          question → réponse + métadonnées (JSON)
+- POST /v1/query/stream   même chose en Server-Sent Events (morceaux de réponse)
+- POST /v1/transcribe     audio brut (corps de la requête) → texte
+- POST /v1/speak          texte → audio MP3
+- GET  /health, /metrics
+
+Lancement: python api_server.py (API_WORKERS processus uvicorn, un moteur
+partagé par processus). Les requêtes passent par le service d'exécution
+(file bornée, délestage en 503) et par le rate limiting par user_id; les
+quotas, tenus par processus, sont répartis entre les workers.
+"""
+
+import hmac
+import json
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+from config import Config
+from rag_engine import ImprovedFusionRAGQuery
+from audio_utils import AudioManager
+from guardrails import get_guardrails
+from metrics import render_prometheus
+from session_context import SessionRetrievalContext
+from execution_service import DeadlineExpiredError, Job, QueueFullError, get_execution_service
+from tenants import get_tenants, set_processes
+from config_reload import config_version
+from deadline import expires_after
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Limite de l'API de synthèse vocale
+TTS_MAX_CHARS = 4096
+
+
+class QueryRequest(BaseModel):
+    question: str
+    session_id: Optional[str] = None
+    # Profil d'exécution de la requête (pris en compte si PROFILE_ON_DEMAND)
+    profile: bool = False
+    # Corpus interrogé (None = PINECONE_NAMESPACE), parmi NAMESPACES
+    namespace: Optional[str] = None
+
+
+class SpeakRequest(BaseModel):
+    text: str
+
+
+@lru_cache(maxsize=1)
+def get_engine() -> ImprovedFusionRAGQuery:
+    """Moteur RAG partagé par toutes les requêtes du processus."""
+    logger.info("🚀 Initialisation du moteur RAG (API)...")
+    return ImprovedFusionRAGQuery()
+
+
+@lru_cache(maxsize=1)
+def get_audio_manager() -> Optional[AudioManager]:
+    try:
+        return AudioManager()
+    except Exception as e:
+        logger.error(f"❌ Erreur initialisation audio: {e}")
+        return None
+
+
+class SessionStore:
+    """Contextes de conversation par (user_id, session_id), bornés en LRU (par processus)."""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[tuple, SessionRetrievalContext]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, session_id: Optional[str]) -> Optional[SessionRetrievalContext]:
+        if not session_id:
+            return None
+        key = (user_id, session_id)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = SessionRetrievalContext()
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+
+sessions = SessionStore(Config.API_MAX_SESSIONS)
+
+# Quotas des namespaces et rate limiting sont tenus par processus: chaque worker en applique sa part
+set_processes(Config.API_WORKERS)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Initialise les clients au démarrage du worker plutôt qu'à la première requête
+    get_engine()
+    get_audio_manager()
+    yield
+
+
+app = FastAPI(title="Legal AI API", version="0.10", lifespan=lifespan)
+
+
+def authorize(request: Request) -> str:
+    """
+    Vérifie la clé d'API (si configurée) et retourne le user_id utilisé pour
+    le rate limiting et les contextes de conversation: en-tête X-User-Id pour
+    un appelant authentifié, sinon adresse du client (sans clé d'API, l'en-tête
+    permettrait de contourner les quotas ou de lire la session d'un autre).
+    """
+    client = request.client.host if request.client else "anonymous"
+    if not Config.API_KEY:
+        return client
+    expected = f"Bearer {Config.API_KEY}".encode("utf-8")
+    if not hmac.compare_digest(request.headers.get("authorization", "").encode("utf-8"), expected):
+        raise HTTPException(status_code=401, detail="Clé d'API invalide")
+    return request.headers.get("x-user-id") or client
+
+
+def check_rate_limit(user_id: str):
+    """Rate limiting des endpoints audio (même quota que les questions)."""
+    allowed, message = get_guardrails().check_rate_limit(user_id)
+    if not allowed:
+        raise HTTPException(status_code=429, detail=message)
+
+
+def submit_job(user_id: str, fn, *args, **kwargs) -> Job:
+    """Soumet fn au service d'exécution (503 si la file est pleine)."""
+    try:
+        return get_execution_service().submit(user_id, fn, *args, **kwargs)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+
+def submit_query(user_id: str, body: QueryRequest, session, on_token=None) -> Job:
+    """
+    Réserve une place dans le quota du namespace puis soumet la requête: un
+    namespace saturé est refusé (429) avant d'occuper la file d'exécution
+    partagée. La place est libérée à la fin du travail. Le délai de la requête
+    court dès maintenant: l'attente en file en fait partie.
+    """
+    tenants = get_tenants()
+    if tenants.resolve(body.namespace) is None:
+        raise HTTPException(status_code=400, detail=f"Namespace inconnu: {body.namespace}")
+    admission = tenants.acquire(body.namespace)
+    if not admission.admitted:
+        raise HTTPException(status_code=429, detail=admission.rejection, headers={"Retry-After": "5"})
+    deadline_at = expires_after(Config.QUERY_DEADLINE_MS)
+    try:
+        job = submit_job(
+            user_id, get_engine().query, body.question, user_id, session, on_token,
+            profile=body.profile and Config.PROFILE_ON_DEMAND, namespace=body.namespace, admission=admission,
+            deadline_at=deadline_at, expires_at=deadline_at,
+        )
+    except HTTPException:
+        tenants.release(admission)
+        raise
+    job.future.add_done_callback(lambda _: tenants.release(admission))
+    return job
+
+
+async def wait_job(job: Job) -> Any:
+    """Attend le résultat d'un travail sans bloquer la boucle."""
+    await asyncio.wrap_future(job.future)
+    get_execution_service().release(job.id)
+    if isinstance(job.error, DeadlineExpiredError):
+        raise HTTPException(status_code=503, detail=str(job.error), headers={"Retry-After": "5"})
+    if job.error is not None:
+        logger.error(f"❌ Erreur travail API: {job.error}")
+        raise HTTPException(status_code=500, detail="Erreur interne")
+    return job.result
+
+
+async def run_job(user_id: str, fn, *args, **kwargs) -> Any:
+    """Exécute fn sur le service d'exécution et attend son résultat sans bloquer la boucle."""
+    return await wait_job(submit_job(user_id, fn, *args, **kwargs))
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/health")
+def health() -> Dict[str, Any]:
+    return {
+        "status": "ok",
+        "execution": get_execution_service().stats(),
+        "namespaces": get_tenants().stats(),
+        "config_version": config_version(),
+    }
+
+
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/v1/query")
+async def query(body: QueryRequest, request: Request) -> Dict[str, Any]:
+    user_id = authorize(request)
+    session = sessions.get(user_id, body.session_id)
+    answer, metadata = await wait_job(submit_query(user_id, body, session))
+    return {"answer": answer, "metadata": metadata}
+
+
+@app.post("/v1/query/stream")
+async def query_stream(body: QueryRequest, request: Request) -> StreamingResponse:
+    user_id = authorize(request)
+    session = sessions.get(user_id, body.session_id)
+    loop = asyncio.get_running_loop()
+    tokens: asyncio.Queue = asyncio.Queue()
+
+    def on_token(token: str):
+        loop.call_soon_threadsafe(tokens.put_nowait, token)
+
+    job = submit_query(user_id, body, session, on_token)
+    done = asyncio.wrap_future(job.future)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            while not (done.done() and tokens.empty()):
+                getter = asyncio.ensure_future(tokens.get())
+                await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield _sse("token", {"text": getter.result()})
+                else:
+                    getter.cancel()
+
+            if job.error is not None:
+                yield _sse("error", {"detail": "Erreur interne"})
+                return
+            # Réponse complète: fait foi (les requêtes bloquées ou coalescées n'émettent pas de morceaux)
+            answer, metadata = job.result
+            yield _sse("done", {"answer": answer, "metadata": metadata})
+        finally:
+            get_execution_service().release(job.id)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/transcribe")
+async def transcribe(request: Request) -> Dict[str, str]:
+    user_id = authorize(request)
+    audio_manager = get_audio_manager()
+    if audio_manager is None:
+        raise HTTPException(status_code=503, detail="Audio indisponible")
+
+    audio_bytes = await request.body()
+    if not audio_bytes:
+        raise HTTPException(status_code=400, detail="Corps audio vide")
+    check_rate_limit(user_id)
+
+    text = await run_job(user_id, audio_manager.transcribe_audio, audio_bytes)
+    if text is None:
+        raise HTTPException(status_code=502, detail="Échec de la transcription")
+    return {"text": text}
+
+
+@app.post("/v1/speak")
+async def speak(body: SpeakRequest, request: Request) -> Response:
+    user_id = authorize(request)
+    audio_manager = get_audio_manager()
+    if audio_manager is None:
+        raise HTTPException(status_code=503, detail="Audio indisponible")
+    if not body.text.strip() or len(body.text) > TTS_MAX_CHARS:
+        raise HTTPException(status_code=400, detail=f"Texte vide ou trop long (max {TTS_MAX_CHARS} caractères)")
+    check_rate_limit(user_id)
+
+    audio = await run_job(user_id, audio_manager.generate_audio, body.text)
+    if audio is None:
+        raise HTTPException(status_code=502, detail="Échec de la synthèse vocale")
+    return Response(content=audio, media_type="audio/mpeg")
+
+
+if __name__ == "__main__":
+    Config.validate()
+    uvicorn.run(
+        "api_server:app",
+        host=Config.API_HOST,
+        port=Config.API_PORT,
+        workers=Config.API_WORKERS,
+    )
@@ -6,16 +6,26 @@ from streamlit_mic_recorder import mic_recorder
 from config import Config
 from rag_engine import ImprovedFusionRAGQuery
 from audio_utils import AudioManager
-
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('app.log', encoding='utf-8')
-    ]
-)
+from http_pool import get_pool_stats
+from resilience import breaker_stats
+from metrics import start_metrics_exporter
+from session_context import SessionRetrievalContext
+from execution_service import DeadlineExpiredError, QueueFullError, get_execution_service
+from deadline import expires_after
+from chat_history import ChatHistory
+from query_log import async_handler
+
+# Configuration du logging (une seule fois: Streamlit ré-exécute le script à chaque interaction)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            # Écriture de app.log dans un thread dédié, hors du chemin des requêtes
+            async_handler(logging.FileHandler('app.log', encoding='utf-8'))
+        ]
+    )
 logger = logging.getLogger(__name__)
 
 # Configuration de LangSmith (optionnel)
@@ -24,6 +34,9 @@ if Config.setup_langsmith():
 else:
     logger.info("ℹ️  LangSmith traçage désactivé")
 
+# Export des métriques Prometheus (une seule fois par processus)
+start_metrics_exporter()
+
 
 # --- Configuration Streamlit ---
 st.set_page_config(
@@ -143,6 +156,16 @@ def render_css():
             background-color: #856404;
             color: #fff3cd;
         }
+
+        .source-degraded {
+            background-color: #e2e3e5;
+            color: #383d41;
+        }
+
+        [data-theme="dark"] .source-degraded {
+            background-color: #383d41;
+            color: #e2e3e5;
+        }
     </style>
     """, unsafe_allow_html=True)
 
@@ -152,12 +175,25 @@ def render_sidebar():
         st.header("⚙️ Options")
 
         if st.button("🗑️ Effacer l'historique", use_container_width=True):
-            st.session_state.messages = []
+            st.session_state.chat_history.clear()
+            st.session_state.history_pages = 0
+            st.session_state.retrieval_context.clear()
             st.rerun()
 
         st.markdown("---")
         st.markdown("### 📊 Statistiques")
-        st.metric("Messages", len(st.session_state.messages))
+        st.metric("Messages", len(st.session_state.chat_history))
+
+        with st.expander("🧵 Contexte de session"):
+            st.json(st.session_state.retrieval_context.stats())
+
+        with st.expander("🚦 File d'exécution"):
+            st.json(get_execution_service().stats())
+
+        with st.expander("🔌 Connexions HTTP"):
+            st.json(get_pool_stats())
+            st.caption("Disjoncteurs par service")
+            st.json(breaker_stats())
 
         st.markdown("---")
         st.markdown("### 🔧 Caractéristiques")
@@ -196,17 +232,41 @@ def render_message_badges(metadata: dict):
             '<span class="source-badge source-web">🌐 Web</span>'
         )
 
+    if metadata.get("degradations"):
+        # Réponse produite en mode dégradé pour respecter le délai
+        badges.append(
+            '<span class="source-badge source-degraded">⏱️ Réponse accélérée</span>'
+        )
+
     if badges:
         st.markdown(" ".join(badges), unsafe_allow_html=True)
 
 
+def render_message(message: dict):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
+        if message["role"] == "assistant" and "metadata" in message:
+            render_message_badges(message["metadata"])
+
+
 def render_chat_history():
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    # Seule la dernière page est rendue à chaque rerun; les plus anciennes à la demande
+    history = st.session_state.chat_history
+    page_size = Config.CHAT_HISTORY_PAGE_SIZE
+    older_pages = st.session_state.history_pages
+
+    archived = len(history) - history.available()
+    if history.available() > page_size * (older_pages + 1):
+        if st.button("⬆️ Afficher les messages précédents"):
+            st.session_state.history_pages += 1
+            st.rerun()
+    elif archived:
+        st.caption(f"🗄️ {archived} message(s) plus ancien(s) archivé(s)")
 
-            if message["role"] == "assistant" and "metadata" in message:
-                render_message_badges(message["metadata"])
+    for page in range(older_pages, -1, -1):
+        for message in history.page(page, page_size):
+            render_message(message)
 
 
 def render_input_bar(audio_manager):
@@ -243,6 +303,24 @@ def render_input_bar(audio_manager):
         return text_prompt if submit_button and text_prompt else None, audio_data
 
 
+def run_chat_turn(rag_engine, audio_manager, prompt: str, user_id: str, session, with_audio: bool, deadline_at: float):
+    """Exécuté par un worker du service d'exécution: requête RAG puis audio éventuel."""
+    try:
+        # Passe le user_id pour le rate limiting
+        response_text, metadata = rag_engine.query(prompt, user_id=user_id, session=session, deadline_at=deadline_at)
+    except Exception as e:
+        logger.error(f"❌ Erreur génération réponse: {e}", exc_info=True)
+        response_text = f"Désolé, une erreur s'est produite. Veuillez réessayer.\n\n{Config.LEGAL_DISCLAIMER}"
+        metadata = {"error": True}
+
+    # Audio (seulement si entrée audio et clients disponibles)
+    audio_response = None
+    if with_audio and audio_manager:
+        audio_response = audio_manager.generate_audio(response_text)
+
+    return response_text, metadata, audio_response
+
+
 def process_query(prompt: str, rag_engine, audio_manager, is_audio_input: bool):
     # Génère un user_id pour le rate limiting (basé sur la session Streamlit)
     import hashlib
@@ -253,44 +331,65 @@ def process_query(prompt: str, rag_engine, audio_manager, is_audio_input: bool):
 
     user_id = st.session_state.user_id
 
+    # Une seule question en cours par session
+    if st.session_state.pending_job:
+        st.warning("⏳ Une question est déjà en cours de traitement, veuillez patienter.")
+        return
+
     # Ajoute le message utilisateur
-    st.session_state.messages.append({"role": "user", "content": prompt})
-
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    # Génère la réponse
-    with st.chat_message("assistant"):
-        with st.spinner("🔍 Recherche approfondie en cours..."):
-            try:
-                # Passe le user_id pour le rate limiting
-                response_text, metadata = rag_engine.query(prompt, user_id=user_id)
-                st.markdown(response_text)
-                render_message_badges(metadata)
-
-            except Exception as e:
-                logger.error(f"❌ Erreur génération réponse: {e}", exc_info=True)
-                response_text = f"Désolé, une erreur s'est produite. Veuillez réessayer.\n\n{Config.LEGAL_DISCLAIMER}"
-                metadata = {"error": True}
-                st.error("Une erreur s'est produite lors de la génération de la réponse.")
-
-        # Audio (seulement si entrée audio et clients disponibles)
-        if is_audio_input and audio_manager:
-            with st.spinner("🔊 Génération de l'audio..."):
-                audio_response = audio_manager.generate_audio(response_text)
-                if audio_response:
-                    st.audio(audio_response, autoplay=True)
+    st.session_state.chat_history.append("user", prompt)
+    st.session_state.history_pages = 0
 
-    # Sauvegarde le message
-    st.session_state.messages.append({
-        "role": "assistant",
-        "content": response_text,
-        "metadata": metadata
-    })
+    # Soumet la requête au pool de workers (le thread de script est libéré);
+    # son délai court dès la soumission, attente en file comprise
+    deadline_at = expires_after(Config.QUERY_DEADLINE_MS)
+    try:
+        job = get_execution_service().submit(
+            user_id, run_chat_turn, rag_engine, audio_manager, prompt, user_id,
+            st.session_state.retrieval_context, is_audio_input, deadline_at, expires_at=deadline_at
+        )
+        st.session_state.pending_job = job.id
+    except QueueFullError as e:
+        st.session_state.chat_history.append("assistant", str(e), {"shed": True})
+
+    st.rerun()
+
+
+@st.fragment(run_every=Config.EXEC_POLL_INTERVAL)
+def render_pending_job():
+    """Interroge le travail en cours de la session jusqu'à sa fin."""
+    job_id = st.session_state.pending_job
+    if not job_id:
+        return
+
+    service = get_execution_service()
+    job = service.get(job_id)
+
+    if job is not None and not job.done:
+        with st.chat_message("assistant"):
+            position = service.position(job_id)
+            if position:
+                st.info(f"⏳ En file d'attente (position {position})...")
+            else:
+                st.markdown("🔍 Recherche approfondie en cours...")
+        return
+
+    st.session_state.pending_job = None
+    service.release(job_id)
+    if job is not None and isinstance(job.error, DeadlineExpiredError):
+        # Délestée en sortie de file, comme une file pleine
+        response_text, metadata, audio_response = str(job.error), {"shed": True}, None
+    elif job is None or job.error is not None:
+        response_text = f"Désolé, une erreur s'est produite. Veuillez réessayer.\n\n{Config.LEGAL_DISCLAIMER}"
+        metadata = {"error": True}
+        audio_response = None
+    else:
+        response_text, metadata, audio_response = job.result
 
-    # Rerun seulement pour les entrées texte
-    if not is_audio_input:
-        st.rerun()
+    # Sauvegarde le message
+    st.session_state.chat_history.append("assistant", response_text, metadata)
+    st.session_state.pending_audio = audio_response
+    st.rerun()
 
 
 def main():
@@ -327,12 +426,20 @@ def main():
         st.stop()
 
     # Initialisation de l'état de session
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    if "chat_history" not in st.session_state:
+        st.session_state.chat_history = ChatHistory()
+    if "history_pages" not in st.session_state:
+        st.session_state.history_pages = 0
     if "last_input_method" not in st.session_state:
         st.session_state.last_input_method = "text"
     if "processed_audio_id" not in st.session_state:
         st.session_state.processed_audio_id = None
+    if "retrieval_context" not in st.session_state:
+        st.session_state.retrieval_context = SessionRetrievalContext()
+    if "pending_job" not in st.session_state:
+        st.session_state.pending_job = None
+    if "pending_audio" not in st.session_state:
+        st.session_state.pending_audio = None
 
     # Affiche la sidebar
     render_sidebar()
@@ -340,6 +447,15 @@ def main():
     # Affiche l'historique
     render_chat_history()
 
+    # Réponse audio de la dernière question (jouée une seule fois)
+    if st.session_state.pending_audio:
+        st.audio(st.session_state.pending_audio, autoplay=True)
+        st.session_state.pending_audio = None
+
+    # Question en cours de traitement
+    if st.session_state.pending_job:
+        render_pending_job()
+
     # Barre d'input
     text_prompt, audio_data = render_input_bar(audio_manager)
 
@@ -7,6 +7,8 @@ import logging
 from typing import Optional
 import openai
 from config import Config
+from http_pool import get_http_client, http_timeout
+from metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -30,9 +32,18 @@ class AudioManager:
 
             self.groq_client = openai.OpenAI(
                 api_key=Config.GROQ_API_KEY,
-                base_url=Config.GROQ_BASE_URL
+                base_url=Config.GROQ_BASE_URL,
+                http_client=get_http_client(Config.GROQ_BASE_URL),
+                timeout=http_timeout(),
+                max_retries=0
+            )
+            self.openai_client = openai.OpenAI(
+                api_key=Config.OPENAI_API_KEY,
+                base_url=Config.OPENAI_BASE_URL,
+                http_client=get_http_client(Config.OPENAI_BASE_URL),
+                timeout=http_timeout(),
+                max_retries=0
             )
-            self.openai_client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
 
             logger.info("✅ Clients audio initialisés")
 
@@ -59,10 +70,11 @@ class AudioManager:
             audio_file = io.BytesIO(audio_bytes)
             audio_file.name = "recording.wav"
 
-            transcription = self.groq_client.audio.transcriptions.create(
-                model="whisper-large-v3",
-                file=audio_file
-            )
+            with span("stt"):
+                transcription = self.groq_client.audio.transcriptions.create(
+                    model="whisper-large-v3",
+                    file=audio_file
+                )
 
             logger.info(f"✅ Transcription: {transcription.text[:100]}...")
             return transcription.text
@@ -87,11 +99,12 @@ class AudioManager:
 
         try:
             logger.info("🔊 Génération audio...")
-            response = self.openai_client.audio.speech.create(
-                model="tts-1",
-                voice="nova",
-                input=text
-            )
+            with span("tts"):
+                response = self.openai_client.audio.speech.create(
+                    model="tts-1",
+                    voice="nova",
+                    input=text
+                )
             logger.info("✅ Audio généré")
             return response.content
 
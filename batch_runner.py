@@ -0,0 +1,205 @@
+"""
+Mode batch: exécute une liste de questions (JSONL) à travers query().
+
+Entrée: une question par ligne, {"id": "...", "question": "...", "namespace": "..."}
+(id optionnel, numéro de ligne par défaut; namespace optionnel, voir NAMESPACES). Sortie: une ligne JSONL par question, écrite dès
+qu'elle est terminée (réponse, métadonnées, durées par étape). Le fichier de
+sortie sert de checkpoint: relancer la même commande reprend là où le batch
+s'est arrêté.
+
+Les embeddings et résultats Pinecone sont partagés et dédupliqués entre les
+questions du batch (caches LRU + coalescence des appels simultanés).
+
+Usage:
+    python batch_runner.py questions.jsonl reponses.jsonl --concurrency 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Lit les questions en flux (les lignes vides sont ignorées)."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            item.setdefault("id", str(line_no))
+            item["id"] = str(item["id"])
+            yield item
+
+
+def completed_ids(path: str) -> Set[str]:
+    """IDs déjà présents dans la sortie (checkpoint); une dernière ligne tronquée est ignorée."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def _truncate_partial_line(path: str):
+    # Une interruption pendant l'écriture peut laisser une ligne incomplète
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 4,
+    user_id: str = "batch",
+    resume: bool = True,
+    engine=None,
+) -> Dict[str, Any]:
+    """
+    Exécute le batch et retourne un résumé (nombre de questions, erreurs, latences).
+
+    Args:
+        input_path: Fichier JSONL de questions
+        output_path: Fichier JSONL de réponses (ajout en fin de fichier)
+        concurrency: Nombre de questions traitées simultanément
+        user_id: Identifiant pour les guardrails
+        resume: Reprend après les IDs déjà présents dans la sortie
+        engine: Moteur à utiliser (créé si absent)
+    """
+    from rag_engine import ImprovedFusionRAGQuery
+    if engine is None:
+        engine = ImprovedFusionRAGQuery()
+
+    # Les résultats Pinecone sont partagés entre les questions du batch
+    engine.enable_search_cache(Config.BATCH_SEARCH_CACHE_SIZE)
+
+    # Le rate limiting par utilisateur ne s'applique pas à une évaluation en lot: seul le
+    # user_id du batch est exempté, pendant ses requêtes (les limites des autres restent en place)
+    from guardrails import get_guardrails
+    guardrails = get_guardrails()
+
+    if resume:
+        _truncate_partial_line(output_path)
+        skip = completed_ids(output_path)
+        if skip:
+            logger.info(f"♻️  Reprise: {len(skip)} question(s) déjà traitée(s)")
+    else:
+        skip = set()
+        open(output_path, "w").close()
+
+    write_lock = threading.Lock()
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+
+    def run_one(item: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            with guardrails.rate_limit_exemption(user_id):
+                answer, metadata = engine.query(item["question"], user_id=user_id, namespace=item.get("namespace"))
+            record = {
+                "id": item["id"],
+                "question": item["question"],
+                "answer": answer,
+                "metadata": metadata,
+                "timings_ms": metadata.get("timings_ms", {}),
+            }
+        except Exception as e:
+            logger.error(f"❌ Question {item['id']}: {e}", exc_info=True)
+            record = {"id": item["id"], "question": item["question"], "error": str(e)}
+        record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        # Champs d'origine conservés (ex: réponse attendue pour l'évaluation)
+        for key, value in item.items():
+            record.setdefault(key, value)
+
+        line = json.dumps(record, ensure_ascii=False)
+        with write_lock:
+            with open(output_path, "a", encoding="utf-8") as out:
+                out.write(line + "\n")
+            latencies.append(record["latency_ms"])
+            outcome = "error" if "error" in record else ImprovedFusionRAGQuery._query_outcome(record["metadata"])
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        return record
+
+    wall_start = time.perf_counter()
+    submitted = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="rag-batch") as executor:
+        pending = set()
+        try:
+            for item in read_questions(input_path):
+                if item["id"] in skip:
+                    continue
+                # Au plus `concurrency` questions en vol: l'entrée est lue en flux
+                if len(pending) >= concurrency:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.add(executor.submit(run_one, item))
+                submitted += 1
+                if submitted % 25 == 0:
+                    logger.info(f"📦 {submitted} question(s) soumise(s), {len(latencies)} terminée(s)")
+            wait(pending)
+        except KeyboardInterrupt:
+            logger.warning("⏹️  Interruption: les questions terminées sont conservées, relancez pour reprendre")
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    wall_s = time.perf_counter() - wall_start
+    ordered = sorted(latencies)
+    summary = {
+        "processed": len(latencies),
+        "skipped": len(skip),
+        "outcomes": outcomes,
+        "wall_seconds": round(wall_s, 1),
+        "latency_ms_p50": ordered[len(ordered) // 2] if ordered else 0.0,
+        "latency_ms_p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else 0.0,
+        "caches": engine.cache_stats(),
+    }
+    logger.info(f"✅ Batch terminé: {json.dumps(summary, ensure_ascii=False)}")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Exécute un fichier JSONL de questions à travers le moteur RAG")
+    parser.add_argument("input", help="Questions (JSONL: {\"id\", \"question\"})")
+    parser.add_argument("output", help="Réponses (JSONL, sert de checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=Config.BATCH_CONCURRENCY)
+    parser.add_argument("--user-id", default="batch")
+    parser.add_argument("--restart", action="store_true", help="Ignore le checkpoint et réécrit la sortie")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    Config.validate()
+
+    summary = run_batch(
+        args.input, args.output,
+        concurrency=args.concurrency,
+        user_id=args.user_id,
+        resume=not args.restart,
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Débit de l'extraction d'entités juridiques: ancienne implémentation (deux
+regex d'articles + une recherche par code et par concept, puis une regex
+d'article par étape) contre l'analyse en une passe de legal_entities.py,
+sans puis avec mémorisation.
+
+Chaque « requête » simule les étapes qui analysent le même texte: entités
+(expansion), article (expansion), article (recherche Pinecone), entités
+(reranker), article (session). "single_pass_cold" mesure une analyse sans
+cache; "single_pass_memoized" le cas courant, où les étapes suivantes
+retrouvent l'analyse mémorisée.
+
+Usage:
+    python benchmarks/bench_legal_entities.py
+    python benchmarks/bench_legal_entities.py --repeat 20000
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from legal_entities import parse_legal_entities, scan  # noqa: E402
+
+DEFAULT_SCENARIOS = os.path.join(BENCH_DIR, "scenarios.json")
+
+EXTRA_QUESTIONS = [
+    "Les articles 1457 à 1460 C.c.Q. s'appliquent-ils aux dommages matériels?",
+    "art. 2925 : quel délai de prescription pour un recours en responsabilité?",
+    "Le bailleur peut-il reprendre le logement selon le Code civil du Québec?",
+    "Quelle est la procédure de l'article 141 du Code de procédure civile?",
+    "La Charte des droits et libertés protège-t-elle contre la discrimination au travail?",
+    "Comment contester une servitude de passage sur mon terrain?",
+]
+
+_ARTICLE_PATTERNS = [
+    r'(?:article|art\.?)\s*(\d+(?:\.\d+)?)',
+    r'(?:articles|art\.?)\s*(\d+)\s*(?:à|et)\s*(\d+)'
+]
+_CODES = [
+    "Code civil du Québec", "C.c.Q.", "CCQ",
+    "Code de procédure civile", "C.p.c.", "CPC",
+    "Code criminel", "C.cr.",
+    "Charte des droits et libertés"
+]
+_CONCEPTS = [
+    "contrat", "responsabilité", "divorce", "testament",
+    "succession", "bail", "hypothèque", "servitude",
+    "prescription", "délai", "recours", "dommages"
+]
+
+
+def legacy_entities(text: str) -> List[str]:
+    """Copie de l'ancienne implémentation de extract_legal_entities (référence)."""
+    entities = []
+    for pattern in _ARTICLE_PATTERNS:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            entities.append(f"article {match.group(1)}")
+    for code in _CODES:
+        if code.lower() in text.lower():
+            entities.append(code)
+    for concept in _CONCEPTS:
+        if concept in text.lower():
+            entities.append(concept)
+    return entities
+
+
+def legacy_article(text: str) -> Optional[str]:
+    match = re.search(r'(?:article|art\.?)\s*(\d+)', text, re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def legacy_pipeline(text: str):
+    legacy_entities(text)
+    legacy_article(text)
+    legacy_article(text)
+    legacy_entities(text)
+    legacy_article(text)
+
+
+def scan_pipeline(text: str):
+    # Analyse à froid (cache vide): un balayage, réutilisé par toutes les étapes
+    parsed = scan(text)
+    parsed.as_strings()
+    parsed.first_article
+    parsed.first_article
+    parsed.codes
+    parsed.first_article
+
+
+def memoized_pipeline(text: str):
+    parse_legal_entities(text).as_strings()
+    parse_legal_entities(text).first_article
+    parse_legal_entities(text).first_article
+    parse_legal_entities(text).codes
+    parse_legal_entities(text).first_article
+
+
+def measure(fn: Callable[[str], None], questions: List[str], repeat: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for question in questions:
+            fn(question)
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(questions)
+    return {"queries_per_s": round(calls / elapsed), "us_per_query": round(elapsed / calls * 1e6, 2)}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Débit de l'extraction d'entités juridiques")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help="Fichier JSON de scénarios (questions)")
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    with open(args.scenarios, encoding="utf-8") as f:
+        questions = json.load(f)["questions"] + EXTRA_QUESTIONS
+
+    results = {
+        "questions": len(questions),
+        "legacy": measure(legacy_pipeline, questions, args.repeat),
+        "single_pass_cold": measure(scan_pipeline, questions, args.repeat),
+        "single_pass_memoized": measure(memoized_pipeline, questions, args.repeat),
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Recherche en deux passes de l'index local (vecteurs tronqués puis re-notation
+en dimension complète) comparée à la recherche en une passe actuelle.
+
+Le corpus synthétique a une variance décroissante par dimension (--decay),
+comme les embeddings text-embedding-3 dont les premières dimensions portent
+l'essentiel de l'information. Pour chaque mode: recall@k par rapport à la
+force brute float32, latence par requête et octets balayés.
+
+Usage:
+    python benchmarks/bench_two_stage.py
+    python benchmarks/bench_two_stage.py --count 200000 --dims 128,256,512 --shortlist 200
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from bench_local_index import run_mode, synthetic_corpus  # noqa: E402
+from local_index import NONE, INT8, LocalVectorIndex, build_index  # noqa: E402
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Recherche en deux passes contre recherche en une passe")
+    parser.add_argument("--count", type=int, default=50000, help="Vecteurs dans le corpus")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--decay", type=float, default=0.5, help="Décroissance de la variance par dimension")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--dims", default="128,256,512", help="Dimensions du premier passage")
+    parser.add_argument("--shortlist", type=int, default=100, help="Candidats re-notés en dimension complète")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_corpus(args.count, args.dim, args.clusters, rng, args.decay)
+    picks = rng.choice(args.count, args.queries, replace=False)
+    noise = rng.standard_normal((args.queries, args.dim)).astype(np.float32) / np.sqrt(args.dim)
+    queries = vectors[picks] + 0.5 * noise
+
+    out_dir = tempfile.mkdtemp(prefix="two_stage_bench_")
+    try:
+        build_index(
+            out_dir, [f"v{i}" for i in range(args.count)], vectors,
+            [{} for _ in range(args.count)], pq_subvectors=0,
+        )
+        del vectors
+
+        exact = LocalVectorIndex(out_dir, NONE)
+        truth = [{row for row, _ in exact.search(q, args.top_k)} for q in queries]
+
+        modes = {
+            "single_stage_float32": LocalVectorIndex(out_dir, NONE),
+            "single_stage_int8": LocalVectorIndex(out_dir, INT8, args.shortlist),
+        }
+        for dim in (int(d) for d in args.dims.split(",")):
+            started = time.perf_counter()
+            index = LocalVectorIndex(out_dir, NONE, args.shortlist, first_pass_dim=dim)
+            print(f"vecteurs tronqués à {dim} dimensions dérivés en {time.perf_counter() - started:.1f} s", file=sys.stderr)
+            modes[f"two_stage_d{dim}"] = index
+            modes[f"first_pass_only_d{dim}"] = LocalVectorIndex(out_dir, NONE, args.top_k, first_pass_dim=dim)
+
+        results = {
+            "count": args.count,
+            "dim": args.dim,
+            "decay": args.decay,
+            "queries": args.queries,
+            "shortlist": args.shortlist,
+            "modes": {name: run_mode(index, queries, truth, args.top_k) for name, index in modes.items()},
+        }
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
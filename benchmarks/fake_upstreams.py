@@ -0,0 +1,348 @@
+"""
+Serveurs locaux imitant Groq, OpenAI (embeddings), Pinecone et Tavily.
+
+Chaque serveur applique un profil de latence et d'erreurs configurable, ce qui
+permet de mesurer le pipeline RAG sans appeler les vrais services.
+"""
+
+import json
+import math
+import time
+import base64
+import random
+import struct
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 1536
+
+SAMPLE_SOURCES = [
+    ("Code civil du Québec", "1457"),
+    ("Code civil du Québec", "1458"),
+    ("Code civil du Québec", "516"),
+    ("Code civil du Québec", "1851"),
+    ("Code civil du Québec", "2925"),
+    ("Code de procédure civile", "141"),
+    ("Code criminel", "265"),
+    ("Charte des droits et libertés de la personne", "10"),
+]
+
+
+@dataclass
+class LatencyProfile:
+    """Distribution de latence et taux d'erreur d'un serveur factice."""
+
+    distribution: str = "lognormal"  # constant | uniform | lognormal
+    median_ms: float = 100.0
+    spread: float = 0.4  # sigma (lognormal) ou demi-largeur relative (uniform)
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyProfile":
+        return cls(**data)
+
+    def sample_seconds(self) -> float:
+        if self.distribution == "constant":
+            ms = self.median_ms
+        elif self.distribution == "uniform":
+            ms = random.uniform(self.median_ms * (1 - self.spread), self.median_ms * (1 + self.spread))
+        else:
+            ms = random.lognormvariate(math.log(max(self.median_ms, 0.001)), self.spread)
+        return max(ms, 0.0) / 1000.0
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+@lru_cache(maxsize=4096)
+def fake_vector(seed: str, dim: int = EMBEDDING_DIM) -> Tuple[float, ...]:
+    """Vecteur unitaire déterministe dérivé d'une chaîne."""
+    rng = random.Random(hashlib.sha256(seed.encode("utf-8")).digest())
+    values = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return tuple(v / norm for v in values)
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    """Gestionnaire commun: latence simulée, erreurs, puis réponse JSON."""
+
+    protocol_version = "HTTP/1.1"
+    routes: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+    profile: LatencyProfile = LatencyProfile()
+    counters: Dict[str, int] = {}
+    counters_lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            payload = json.loads(raw) if raw else {}
+        except ValueError:
+            payload = {}
+
+        time.sleep(self.profile.sample_seconds())
+
+        with self.counters_lock:
+            self.counters["requests"] = self.counters.get("requests", 0) + 1
+
+        if self.profile.should_fail():
+            with self.counters_lock:
+                self.counters["errors"] = self.counters.get("errors", 0) + 1
+            self._send_json(self.profile.error_status, {"error": {"message": "erreur simulée"}})
+            return
+
+        handler = self.routes.get(self.path.split("?")[0])
+        if handler is None:
+            self._send_json(404, {"error": {"message": f"route inconnue: {self.path}"}})
+            return
+
+        result = handler(payload)
+        if isinstance(result, _SSE):
+            self._send_sse(result.events)
+        else:
+            self._send_json(200, result)
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_sse(self, events: List[Dict[str, Any]]):
+        chunks = [f"data: {json.dumps(e)}\n\n" for e in events] + ["data: [DONE]\n\n"]
+        data = "".join(chunks).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _SSE:
+    def __init__(self, events: List[Dict[str, Any]]):
+        self.events = events
+
+
+# --- Groq (API compatible OpenAI) ---
+
+EXPANSION_ANSWER = "\n".join([
+    "responsabilité civile extracontractuelle conditions Québec",
+    "faute préjudice lien de causalité Code civil",
+    "obligation de réparer dommage causé à autrui",
+    "article 1457 C.c.Q. devoir de ne pas nuire",
+    "recours en dommages-intérêts responsabilité",
+])
+
+SYNTHESIS_ANSWER = (
+    "**Réponse directe:** Selon l'Article 1457 du Code civil du Québec, toute personne "
+    "doit respecter les règles de conduite qui lui incombent.\n\n**Détails:**\n"
+    + "Le texte prévoit la réparation du préjudice causé par la faute. " * 12
+    + "\n\n**Sources:**\n- Code civil du Québec, art. 1457"
+)
+
+
+def _chat_completion(payload: Dict[str, Any]) -> Any:
+    messages = payload.get("messages", [])
+    prompt = " ".join(str(m.get("content", "")) for m in messages)
+    model = payload.get("model", "fake-model")
+
+    if "classificateur" in prompt:
+        content = "OUI"
+    elif "requêtes de recherche alternatives" in prompt:
+        content = EXPANSION_ANSWER
+    else:
+        content = SYNTHESIS_ANSWER
+
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(content) // 4)
+
+    if payload.get("stream"):
+        words = content.split(" ")
+        events = [
+            {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": w + (" " if i < len(words) - 1 else "")}, "finish_reason": None}],
+            }
+            for i, w in enumerate(words)
+        ]
+        events.append({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        })
+        return _SSE(events)
+
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+# --- OpenAI embeddings ---
+
+def _embeddings(payload: Dict[str, Any]) -> Dict[str, Any]:
+    inputs = payload.get("input", [])
+    # Le client LangChain envoie des listes de tokens; une entrée unique peut être une chaîne
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    dim = int(payload.get("dimensions") or EMBEDDING_DIM)
+    as_base64 = payload.get("encoding_format") == "base64"
+
+    data = []
+    for i, item in enumerate(inputs):
+        vector = fake_vector(json.dumps(item), dim)
+        if as_base64:
+            embedding: Any = base64.b64encode(struct.pack(f"<{dim}f", *vector)).decode("ascii")
+        else:
+            embedding = list(vector)
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+    return {
+        "object": "list",
+        "data": data,
+        "model": payload.get("model", "text-embedding-3-small"),
+        "usage": {"prompt_tokens": 8 * len(inputs), "total_tokens": 8 * len(inputs)},
+    }
+
+
+# --- Pinecone (plan de données REST) ---
+
+def _pinecone_query(payload: Dict[str, Any]) -> Dict[str, Any]:
+    top_k = int(payload.get("topK", 10))
+    include_values = bool(payload.get("includeValues"))
+    vector = payload.get("vector") or []
+    rng = random.Random(hashlib.sha256(json.dumps(vector[:8]).encode("utf-8")).digest())
+
+    article_filter = ((payload.get("filter") or {}).get("article_num") or {}).get("$eq")
+    candidates = [s for s in SAMPLE_SOURCES if not article_filter or s[1] == article_filter] or SAMPLE_SOURCES
+
+    matches = []
+    for rank in range(top_k):
+        source, article = candidates[rank % len(candidates)]
+        chunk_id = f"{source[:8]}-{article}-{rng.randint(0, 50)}"
+        text = (
+            f"Art. {article}. Toute personne a le devoir de respecter les règles de conduite "
+            f"qui, suivant les circonstances, les usages ou la loi, s'imposent à elle. " * 3
+        )
+        match = {
+            "id": chunk_id,
+            "score": round(0.9 - rank * 0.02 + rng.uniform(-0.01, 0.01), 4),
+            "values": list(fake_vector(chunk_id)) if include_values else [],
+            "metadata": {"text": text, "source": source, "article": f"Art. {article}", "article_num": article},
+        }
+        matches.append(match)
+
+    return {"matches": matches, "namespace": payload.get("namespace", ""), "usage": {"readUnits": 5}}
+
+
+# --- Tavily ---
+
+def _tavily_search(payload: Dict[str, Any]) -> Dict[str, Any]:
+    query = payload.get("query", "")
+    max_results = int(payload.get("max_results", 3))
+    return {
+        "query": query,
+        "response_time": 0.1,
+        "results": [
+            {
+                "url": f"https://example.qc.ca/droit/{i}",
+                "title": f"Résultat {i} pour {query[:40]}",
+                "content": "Information juridique générale sur le droit québécois. " * 8,
+                "score": 0.8 - i * 0.1,
+            }
+            for i in range(max_results)
+        ],
+    }
+
+
+UPSTREAM_ROUTES: Dict[str, Dict[str, Callable[[Dict[str, Any]], Any]]] = {
+    "groq": {"/openai/v1/chat/completions": _chat_completion},
+    "openai": {"/v1/embeddings": _embeddings},
+    "pinecone": {"/query": _pinecone_query},
+    "tavily": {"/search": _tavily_search},
+}
+
+
+class FakeUpstream:
+    """Serveur factice pour un service amont, exécuté dans un thread."""
+
+    def __init__(self, name: str, profile: LatencyProfile, port: int = 0):
+        self.name = name
+        self.counters: Dict[str, int] = {}
+        handler = type(
+            f"{name.capitalize()}Handler",
+            (_FakeHandler,),
+            {"routes": UPSTREAM_ROUTES[name], "profile": profile, "counters": self.counters, "counters_lock": threading.Lock()},
+        )
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUpstream":
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"fake-{self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_fake_upstreams(profiles: Dict[str, LatencyProfile]) -> Dict[str, FakeUpstream]:
+    """Démarre un serveur factice par service amont."""
+    return {name: FakeUpstream(name, profiles.get(name, LatencyProfile())).start() for name in UPSTREAM_ROUTES}
+
+
+def upstream_env(upstreams: Dict[str, FakeUpstream]) -> Dict[str, str]:
+    """Variables d'environnement qui redirigent la config vers les serveurs factices."""
+    return {
+        "GROQ_API_HOST": upstreams["groq"].url,
+        "OPENAI_BASE_URL": f"{upstreams['openai'].url}/v1",
+        "PINECONE_HOST": upstreams["pinecone"].url,
+        "TAVILY_BASE_URL": upstreams["tavily"].url,
+        "OPENAI_API_KEY": "sk-fake",
+        "GROQ_API_KEY": "gsk-fake",
+        "PINECONE_API_KEY": "pc-fake",
+        "PINECONE_INDEX_NAME": "fake-index",
+        "TAVILY_API_KEY": "tvly-fake",
+        "HTTP2_ENABLED": "false",
+    }
+
+
+def counters(upstreams: Dict[str, FakeUpstream]) -> Dict[str, Tuple[int, int]]:
+    """Retourne (requêtes, erreurs) servies par chaque serveur factice."""
+    return {
+        name: (u.counters.get("requests", 0), u.counters.get("errors", 0))
+        for name, u in upstreams.items()
+    }
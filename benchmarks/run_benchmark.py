@@ -0,0 +1,229 @@
+"""
+Banc d'essai de charge de bout en bout du pipeline RAG.
+
+Démarre des serveurs factices (Groq, OpenAI, Pinecone, Tavily), exécute des
+scénarios d'utilisateurs concurrents sur ImprovedFusionRAGQuery.query et
+SecurityGuardrails.full_validation, puis enregistre les résultats en JSON.
+
+Usage:
+    python benchmarks/run_benchmark.py
+    python benchmarks/run_benchmark.py --scenarios benchmarks/scenarios.json
+    python benchmarks/run_benchmark.py --baseline benchmarks/results/<fichier>.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import logging
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from fake_upstreams import LatencyProfile, start_fake_upstreams, upstream_env, counters  # noqa: E402
+
+DEFAULT_SCENARIOS = os.path.join(BENCH_DIR, "scenarios.json")
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentile par rang le plus proche (0 si vide)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 0.50), 1),
+        "p95": round(percentile(values, 0.95), 1),
+        "p99": round(percentile(values, 0.99), 1),
+        "mean": round(sum(values) / len(values), 1) if values else 0.0,
+        "max": round(max(values), 1) if values else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+def run_scenario(scenario: Dict[str, Any], questions: List[str], engine, guardrails) -> Dict[str, Any]:
+    """Exécute un scénario d'utilisateurs concurrents et agrège les mesures."""
+    from config import Config
+    from metrics import trace_request
+
+    target = scenario.get("target", "query")
+    users = int(scenario.get("users", 1))
+    per_user = int(scenario.get("requests_per_user", 1))
+
+    # Surcharges de config propres au scénario (restaurées à la fin)
+    overrides = scenario.get("config", {})
+    previous = {key: getattr(Config, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(Config, key, value)
+
+    latencies: List[float] = []
+    stage_samples: Dict[str, List[float]] = {}
+    failures = 0
+    lock = threading.Lock()
+
+    def user_loop(user_index: int):
+        nonlocal failures
+        user_id = f"bench-{scenario['name']}-{user_index}"
+        for i in range(per_user):
+            question = questions[(user_index * per_user + i) % len(questions)]
+            start = time.perf_counter()
+            if target == "guardrails":
+                with trace_request() as trace:
+                    ok, _ = guardrails.full_validation(question, user_id)
+                stages = trace.timings_ms()
+            else:
+                _, metadata = engine.query(question, user_id=user_id)
+                ok = not (metadata.get("error") or metadata.get("blocked"))
+                stages = metadata.get("timings_ms", {})
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            with lock:
+                latencies.append(elapsed_ms)
+                for stage, ms in stages.items():
+                    stage_samples.setdefault(stage, []).append(ms)
+                if not ok:
+                    failures += 1
+
+    wall_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            list(executor.map(user_loop, range(users)))
+    finally:
+        for key, value in previous.items():
+            setattr(Config, key, value)
+    wall_s = time.perf_counter() - wall_start
+
+    total = len(latencies)
+    return {
+        "name": scenario["name"],
+        "target": target,
+        "users": users,
+        "requests": total,
+        "failures": failures,
+        "error_rate": round(failures / total, 4) if total else 0.0,
+        "wall_seconds": round(wall_s, 3),
+        "throughput_rps": round(total / wall_s, 3) if wall_s else 0.0,
+        "latency_ms": summarize(latencies),
+        "stages_ms": {stage: summarize(samples) for stage, samples in sorted(stage_samples.items())},
+        "config": overrides,
+    }
+
+
+def print_report(results: List[Dict[str, Any]]):
+    for r in results:
+        lat = r["latency_ms"]
+        print(f"\n=== {r['name']} ({r['target']}, {r['users']} utilisateurs, {r['requests']} requêtes) ===")
+        print(f"Débit: {r['throughput_rps']} req/s | erreurs: {r['failures']} ({r['error_rate']:.1%})")
+        print(f"Latence ms: p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}")
+        for stage, s in r["stages_ms"].items():
+            print(f"   {stage:<16} p50={s['p50']:>8} p95={s['p95']:>8} p99={s['p99']:>8}")
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    """Affiche l'écart avec un résultat précédent (ex: commit de référence)."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["name"]: r for r in json.load(f)["scenarios"]}
+
+    def delta(new: float, old: float) -> str:
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old:+.1%}"
+
+    print(f"\n=== Comparaison avec {os.path.basename(baseline_path)} ===")
+    for r in results:
+        old = baseline.get(r["name"])
+        if not old:
+            print(f"{r['name']}: absent de la référence")
+            continue
+        print(
+            f"{r['name']}: p50 {delta(r['latency_ms']['p50'], old['latency_ms']['p50'])}, "
+            f"p95 {delta(r['latency_ms']['p95'], old['latency_ms']['p95'])}, "
+            f"débit {delta(r['throughput_rps'], old['throughput_rps'])}"
+        )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Banc d'essai de charge du moteur RAG")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help="Fichier JSON de scénarios")
+    parser.add_argument("--only", nargs="*", help="Noms des scénarios à exécuter")
+    parser.add_argument("--output", help="Fichier JSON de sortie (défaut: benchmarks/results/)")
+    parser.add_argument("--baseline", help="Résultat JSON précédent à comparer")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les logs du moteur")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    with open(args.scenarios, encoding="utf-8") as f:
+        spec = json.load(f)
+
+    profiles = {name: LatencyProfile.from_dict(p) for name, p in spec.get("upstreams", {}).items()}
+    upstreams = start_fake_upstreams(profiles)
+
+    # La config est lue à l'import: on redirige vers les serveurs factices avant
+    os.environ.update(upstream_env(upstreams))
+    from rag_engine import ImprovedFusionRAGQuery
+    from guardrails import get_guardrails
+
+    engine = ImprovedFusionRAGQuery()
+    guardrails = get_guardrails()
+    # Le rate limiting n'est pas l'objet du banc d'essai
+    guardrails.MAX_QUERIES_PER_MINUTE = 10 ** 9
+    guardrails.MAX_QUERIES_PER_HOUR = 10 ** 9
+
+    questions = spec["questions"]
+    scenarios = [s for s in spec["scenarios"] if not args.only or s["name"] in args.only]
+
+    # Échauffement: connexions, tokenizer, imports paresseux
+    engine.query(questions[0], user_id="bench-warmup")
+
+    results = []
+    for scenario in scenarios:
+        print(f"▶ {scenario['name']}...", flush=True)
+        results.append(run_scenario(scenario, questions, engine, guardrails))
+
+    report = {
+        "git_revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "upstreams": spec.get("upstreams", {}),
+        "upstream_requests": counters(upstreams),
+        "scenarios": results,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(DEFAULT_RESULTS_DIR, f"{stamp}-{report['git_revision']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print_report(results)
+    if args.baseline:
+        compare(results, args.baseline)
+    print(f"\nRésultats enregistrés dans {output}")
+
+    for upstream in upstreams.values():
+        upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Caches LRU partagés du processus (embeddings, résultats de recherche),
+éventuellement partitionnés par namespace.
+
+Complètent la coalescence (singleflight.py), qui ne partage que les appels
+simultanés: ici, un résultat déjà calculé est réutilisé par les requêtes
+suivantes, jusqu'à éviction ou expiration (TTL).
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from metrics import record_cache
+
+
+class LRUCache:
+    """Cache LRU thread-safe avec TTL optionnel (taille 0 = désactivé)."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float = 0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[1] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+        record_cache(self.name, entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def resize(self, maxsize: int, ttl: Optional[float] = None):
+        """Change la taille (et le TTL), en évinçant si nécessaire."""
+        with self._lock:
+            self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self._data) > max(maxsize, 0):
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl}
+
+
+class PartitionedCache:
+    """
+    Un LRUCache par partition (ex: namespace), chacun avec sa propre capacité:
+    les entrées d'une partition très active n'évincent pas celles des autres.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float = 0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._partitions: Dict[str, LRUCache] = {}
+        self._lock = threading.Lock()
+
+    def partition(self, partition: str) -> LRUCache:
+        cache = self._partitions.get(partition)
+        if cache is None:
+            with self._lock:
+                cache = self._partitions.setdefault(partition, LRUCache(self.name, self.maxsize, self.ttl))
+        return cache
+
+    def get(self, partition: str, key: Hashable) -> Optional[Any]:
+        return self.partition(partition).get(key)
+
+    def put(self, partition: str, key: Hashable, value: Any):
+        self.partition(partition).put(key, value)
+
+    def resize(self, maxsize: int, ttl: Optional[float] = None):
+        """Change la taille de chaque partition (existante ou future)."""
+        with self._lock:
+            self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            partitions = list(self._partitions.values())
+        for cache in partitions:
+            cache.resize(maxsize, ttl)
+
+    def clear(self):
+        with self._lock:
+            partitions = list(self._partitions.values())
+        for cache in partitions:
+            cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            partitions = dict(self._partitions)
+        return {
+            "size": sum(cache.stats()["size"] for cache in partitions.values()),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "partitions": {name or "default": cache.stats()["size"] for name, cache in partitions.items()},
+        }
@@ -0,0 +1,171 @@
+"""
+Historique de conversation compact pour st.session_state.
+
+- Les derniers messages restent en clair (accès direct pour l'affichage);
+- les plus anciens sont compressés (zlib) dans un tampon circulaire borné;
+- au-delà du plafond, ils sont déversés sur disque (JSONL gzip) si un
+  répertoire est configuré, sinon oubliés. Le fichier d'une session est
+  supprimé avec son historique (clear, ou fin de la session Streamlit); ceux
+  laissés par un processus arrêté sont balayés après CHAT_HISTORY_SPILL_TTL.
+
+Seuls les champs de métadonnées utiles à l'affichage sont conservés.
+"""
+
+import os
+import glob
+import gzip
+import json
+import time
+import uuid
+import zlib
+import logging
+import weakref
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Métadonnées conservées (badges de sources); le reste (durées, etc.) est écarté
+KEPT_METADATA = ("used_pinecone", "used_web", "chunks_found", "blocked", "error", "shed", "degradations")
+
+
+def _compact_metadata(metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if metadata is None:
+        return None
+    return {k: metadata[k] for k in KEPT_METADATA if k in metadata}
+
+
+# Répertoires de déversement déjà balayés par ce processus
+_swept_dirs: Set[str] = set()
+_sweep_lock = threading.Lock()
+
+
+def _remove_spill_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"❌ Erreur suppression de l'historique déversé: {e}")
+
+
+def sweep_spill_dir(directory: str, ttl: float):
+    """Supprime les fichiers déversés non modifiés depuis ttl secondes (sessions abandonnées)."""
+    cutoff = time.time() - ttl
+    removed = 0
+    for path in glob.glob(os.path.join(directory, "chat-*.jsonl.gz")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            # Supprimé entre-temps par un autre processus
+            continue
+    if removed:
+        logger.info(f"🧹 {removed} historique(s) déversé(s) expiré(s) supprimé(s) de {directory}")
+
+
+class ChatHistory:
+    """Historique borné: messages récents en clair, anciens compressés puis déversés."""
+
+    def __init__(
+        self,
+        hot_size: Optional[int] = None,
+        max_messages: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ):
+        self.hot_size = hot_size or Config.CHAT_HISTORY_HOT
+        self.max_messages = max(max_messages or Config.CHAT_HISTORY_MAX, self.hot_size)
+        self.spill_dir = Config.CHAT_HISTORY_SPILL_DIR if spill_dir is None else spill_dir
+        self._hot: Deque[Dict[str, Any]] = deque()
+        self._cold: Deque[bytes] = deque()
+        self._spilled = 0
+        self._spill_path: Optional[str] = None
+        self._spill_cleanup: Optional[weakref.finalize] = None
+        self._lock = threading.Lock()
+
+    def append(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        message: Dict[str, Any] = {"role": role, "content": content}
+        compact = _compact_metadata(metadata)
+        if compact is not None:
+            message["metadata"] = compact
+
+        with self._lock:
+            self._hot.append(message)
+            while len(self._hot) > self.hot_size:
+                old = self._hot.popleft()
+                self._cold.append(zlib.compress(json.dumps(old, ensure_ascii=False).encode("utf-8")))
+            while len(self._hot) + len(self._cold) > self.max_messages:
+                self._spill(self._cold.popleft())
+
+    def _spill(self, blob: bytes):
+        self._spilled += 1
+        if not self.spill_dir:
+            return
+        try:
+            if self._spill_path is None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                with _sweep_lock:
+                    if self.spill_dir not in _swept_dirs:
+                        _swept_dirs.add(self.spill_dir)
+                        sweep_spill_dir(self.spill_dir, Config.CHAT_HISTORY_SPILL_TTL)
+                self._spill_path = os.path.join(self.spill_dir, f"chat-{uuid.uuid4().hex}.jsonl.gz")
+                # Supprimé quand l'historique est libéré (fin de la session Streamlit)
+                self._spill_cleanup = weakref.finalize(self, _remove_spill_file, self._spill_path)
+            with gzip.open(self._spill_path, "at", encoding="utf-8") as f:
+                f.write(zlib.decompress(blob).decode("utf-8") + "\n")
+        except OSError as e:
+            logger.error(f"❌ Erreur déversement de l'historique: {e}")
+
+    def __len__(self) -> int:
+        """Nombre total de messages de la conversation (y compris déversés)."""
+        with self._lock:
+            return self._spilled + len(self._cold) + len(self._hot)
+
+    def available(self) -> int:
+        """Nombre de messages consultables en mémoire (clairs + compressés)."""
+        with self._lock:
+            return len(self._cold) + len(self._hot)
+
+    def page(self, page: int, page_size: int) -> List[Dict[str, Any]]:
+        """
+        Page de messages en mémoire, dans l'ordre chronologique.
+        La page 0 contient les plus récents; les pages suivantes remontent le temps.
+        """
+        with self._lock:
+            total = len(self._cold) + len(self._hot)
+            end = total - page * page_size
+            start = max(0, end - page_size)
+            if end <= 0:
+                return []
+            cold_count = len(self._cold)
+            messages = []
+            for i in range(start, end):
+                if i < cold_count:
+                    messages.append(json.loads(zlib.decompress(self._cold[i]).decode("utf-8")))
+                else:
+                    messages.append(self._hot[i - cold_count])
+            return messages
+
+    def clear(self):
+        with self._lock:
+            self._hot.clear()
+            self._cold.clear()
+            self._spilled = 0
+            if self._spill_cleanup is not None:
+                self._spill_cleanup()
+                self._spill_cleanup = None
+            self._spill_path = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hot": len(self._hot),
+                "compressed": len(self._cold),
+                "compressed_bytes": sum(len(b) for b in self._cold),
+                "spilled": self._spilled,
+                "spill_file": self._spill_path,
+            }
@@ -23,6 +23,12 @@ class Config:
     PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
     PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "us-east-1")
     PINECONE_NAMESPACE = os.getenv("PINECONE_NAMESPACE")
+    # Autres namespaces servis par ce déploiement, choisis par requête (voir tenants.py)
+    NAMESPACES = os.getenv("NAMESPACES", "")
+    # Quotas par namespace (0 = illimité), surchargés par "namespace:simultanées:par_minute,..."
+    NAMESPACE_MAX_CONCURRENCY = int(os.getenv("NAMESPACE_MAX_CONCURRENCY", "0"))
+    NAMESPACE_QUERIES_PER_MINUTE = int(os.getenv("NAMESPACE_QUERIES_PER_MINUTE", "0"))
+    NAMESPACE_LIMITS = os.getenv("NAMESPACE_LIMITS", "")
 
     # Modèles
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
@@ -33,9 +39,176 @@ class Config:
     MIN_SIMILARITY_SCORE = float(os.getenv("MIN_SIMILARITY_SCORE", "0.55"))
     MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "12000"))
     MIN_CONTEXT_LENGTH = int(os.getenv("MIN_CONTEXT_LENGTH", "100"))
+    IO_THREADS = int(os.getenv("IO_THREADS", "32"))
+    # Caches LRU partagés (0 = désactivé); TTL en secondes pour les résultats Pinecone
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "0"))
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "3600"))
+    PINECONE_TOP_K = int(os.getenv("PINECONE_TOP_K", "20"))
 
-    # URLs
-    GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+    # Index vectoriel ("pinecone" ou "local": vecteurs en memmap partagés entre workers, voir local_index.py)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+    LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+    # Représentation balayée ("none", "int8", "pq") et nombre de candidats re-notés en float32
+    LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "int8")
+    LOCAL_INDEX_RESCORE = int(os.getenv("LOCAL_INDEX_RESCORE", "100"))
+    # Recherche en deux passes: dimension tronquée du premier passage (ex: 256), 0 = une seule passe
+    LOCAL_INDEX_FIRST_PASS_DIM = int(os.getenv("LOCAL_INDEX_FIRST_PASS_DIM", "0"))
+
+    # Reclassement des chunks avant construction du contexte ("none", "features", "cross-encoder")
+    RERANKER = os.getenv("RERANKER", "none")
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "8"))
+    RERANK_BUDGET_MS = int(os.getenv("RERANK_BUDGET_MS", "300"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+
+    # Suppression des quasi-doublons dans le contexte ("none", "simhash", "mmr")
+    CONTEXT_DEDUP = os.getenv("CONTEXT_DEDUP", "simhash")
+    DEDUP_MAX_HAMMING = int(os.getenv("DEDUP_MAX_HAMMING", "6"))
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+    MMR_MAX_SIMILARITY = float(os.getenv("MMR_MAX_SIMILARITY", "0.97"))
+
+    # Format du contexte de synthèse ("compact": table des sources [S1] sans scores, "verbose": historique)
+    CONTEXT_FORMAT = os.getenv("CONTEXT_FORMAT", "compact")
+
+    # Contexte de recherche par session (questions de suivi)
+    SESSION_CONTEXT = os.getenv("SESSION_CONTEXT", "true").lower() == "true"
+    SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "5"))
+    # 0 = de quoi garder toutes les recherches des derniers tours (PINECONE_TOP_K × 10 requêtes × SESSION_MAX_TURNS)
+    SESSION_MAX_CHUNKS = int(os.getenv("SESSION_MAX_CHUNKS", "0"))
+    SESSION_MAX_EMBEDDINGS = int(os.getenv("SESSION_MAX_EMBEDDINGS", "32"))
+
+    # Réponses pré-calculées des questions fréquentes (voir answer_store.py)
+    ANSWER_STORE = os.getenv("ANSWER_STORE", "false").lower() == "true"
+    ANSWER_STORE_PATH = os.getenv("ANSWER_STORE_PATH", "answer_store.json")
+    ANSWER_STORE_MIN_SIMILARITY = float(os.getenv("ANSWER_STORE_MIN_SIMILARITY", "0.95"))
+    ANSWER_STORE_TOP_N = int(os.getenv("ANSWER_STORE_TOP_N", "50"))
+    # Version du corpus, à changer après une réindexation (sinon déduite de l'index)
+    CORPUS_VERSION = os.getenv("CORPUS_VERSION", "")
+
+    # Journal structuré des requêtes (JSONL asynchrone, échantillonné, voir query_log.py)
+    QUERY_LOG = os.getenv("QUERY_LOG", "false").lower() == "true"
+    QUERY_LOG_DIR = os.getenv("QUERY_LOG_DIR", "logs")
+    QUERY_LOG_SAMPLE_RATE = float(os.getenv("QUERY_LOG_SAMPLE_RATE", "1.0"))
+    QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+    QUERY_LOG_BACKUP_COUNT = int(os.getenv("QUERY_LOG_BACKUP_COUNT", "10"))
+    QUERY_LOG_QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+    # Sel du hachage des identifiants utilisateurs; texte des questions journalisé seulement si activé
+    QUERY_LOG_SALT = os.getenv("QUERY_LOG_SALT", "")
+    QUERY_LOG_QUESTION_TEXT = os.getenv("QUERY_LOG_QUESTION_TEXT", "false").lower() == "true"
+
+    # Profilage par échantillonnage de query() et des guardrails (voir profiling.py)
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    # Profilage à la demande via le champ "profile" de l'API
+    PROFILE_ON_DEMAND = os.getenv("PROFILE_ON_DEMAND", "false").lower() == "true"
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_ALL_THREADS = os.getenv("PROFILE_ALL_THREADS", "false").lower() == "true"
+    PROFILE_ALLOCATIONS = os.getenv("PROFILE_ALLOCATIONS", "true").lower() == "true"
+    PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "25"))
+    # Profils gardés dans PROFILE_DIR (les plus anciens sont supprimés; 0 = tous)
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+    # Routage par complexité (voir model_router.py): petit modèle pour les questions simples
+    MODEL_ROUTING = os.getenv("MODEL_ROUTING", "false").lower() == "true"
+    SMALL_EXPANDER_MODEL = os.getenv("SMALL_EXPANDER_MODEL", "llama-3.1-8b-instant")
+    SMALL_SYNTHESIZER_MODEL = os.getenv("SMALL_SYNTHESIZER_MODEL", "llama-3.1-8b-instant")
+    # Score de complexité (0-1) à partir duquel le grand modèle est utilisé
+    ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "0.3"))
+    # Meilleur score de similarité en deçà duquel la recherche est jugée peu fiable: par défaut un
+    # peu au-dessus du seuil de pertinence (les scores text-embedding-3 dépassent rarement 0.7)
+    ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", str(round(MIN_SIMILARITY_SCORE + 0.1, 2))))
+    # Taille de contexte (caractères) au-delà de laquelle la synthèse est jugée complexe
+    ROUTER_MAX_SIMPLE_CONTEXT = int(os.getenv("ROUTER_MAX_SIMPLE_CONTEXT", "8000"))
+    # Prix par million de tokens (modèle:entrée:sortie, séparés par des virgules) pour le coût par niveau
+    MODEL_PRICES = os.getenv(
+        "MODEL_PRICES", "llama-3.3-70b-versatile:0.59:0.79,llama-3.1-8b-instant:0.05:0.08"
+    )
+
+    # Service d'exécution des requêtes (hors du thread de script Streamlit)
+    EXEC_WORKERS = int(os.getenv("EXEC_WORKERS", "4"))
+    EXEC_MAX_QUEUE = int(os.getenv("EXEC_MAX_QUEUE", "16"))
+    EXEC_JOB_TTL = int(os.getenv("EXEC_JOB_TTL", "600"))
+    EXEC_POLL_INTERVAL = float(os.getenv("EXEC_POLL_INTERVAL", "1.0"))
+
+    # Historique de conversation (messages en clair, plafond total, pagination, déversement disque)
+    CHAT_HISTORY_HOT = int(os.getenv("CHAT_HISTORY_HOT", "20"))
+    CHAT_HISTORY_MAX = int(os.getenv("CHAT_HISTORY_MAX", "200"))
+    CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "10"))
+    CHAT_HISTORY_SPILL_DIR = os.getenv("CHAT_HISTORY_SPILL_DIR", "")
+    # Âge (s) au-delà duquel un fichier déversé sans session est supprimé
+    CHAT_HISTORY_SPILL_TTL = int(os.getenv("CHAT_HISTORY_SPILL_TTL", "86400"))
+
+    # API HTTP (api_server.py)
+    API_HOST = os.getenv("API_HOST", "0.0.0.0")
+    API_PORT = int(os.getenv("API_PORT", "8000"))
+    API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+    API_KEY = os.getenv("API_KEY", "")
+    API_MAX_SESSIONS = int(os.getenv("API_MAX_SESSIONS", "1000"))
+
+    # Mode batch (batch_runner.py)
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_SEARCH_CACHE_SIZE = int(os.getenv("BATCH_SEARCH_CACHE_SIZE", "4096"))
+
+    # Disjoncteurs par service amont et requêtes couvertes (voir resilience.py)
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # 0 = désactivé
+    BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+    HEDGE_EMBEDDING_DELAY_MS = int(os.getenv("HEDGE_EMBEDDING_DELAY_MS", "0"))  # 0 = désactivé
+    HEDGE_PINECONE_DELAY_MS = int(os.getenv("HEDGE_PINECONE_DELAY_MS", "0"))
+
+    # Délai de bout en bout d'une requête et budgets par étape (voir deadline.py)
+    QUERY_DEADLINE_MS = int(os.getenv("QUERY_DEADLINE_MS", "25000"))
+    DEADLINE_GUARDRAILS_MS = int(os.getenv("DEADLINE_GUARDRAILS_MS", "3000"))
+    DEADLINE_EXPANSION_MS = int(os.getenv("DEADLINE_EXPANSION_MS", "4000"))
+    DEADLINE_RETRIEVAL_MS = int(os.getenv("DEADLINE_RETRIEVAL_MS", "5000"))
+    DEADLINE_WEB_MS = int(os.getenv("DEADLINE_WEB_MS", "6000"))
+    DEADLINE_SYNTHESIS_MS = int(os.getenv("DEADLINE_SYNTHESIS_MS", "10000"))
+
+    # Recherche adaptative: arrêt anticipé des recherches parallèles
+    ADAPTIVE_RETRIEVAL = os.getenv("ADAPTIVE_RETRIEVAL", "false").lower() == "true"
+    # Score à partir duquel un extrait compte pour le budget (même calibrage que ROUTER_MIN_CONFIDENCE)
+    ADAPTIVE_MIN_SCORE = float(os.getenv("ADAPTIVE_MIN_SCORE", str(round(MIN_SIMILARITY_SCORE + 0.1, 2))))
+    ADAPTIVE_DEADLINE_MS = int(os.getenv("ADAPTIVE_DEADLINE_MS", "2500"))
+
+    # URLs (surchargeables pour pointer vers des serveurs locaux, ex: benchmarks)
+    GROQ_API_HOST = os.getenv("GROQ_API_HOST", "https://api.groq.com")
+    GROQ_BASE_URL = f"{GROQ_API_HOST}/openai/v1"
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    TAVILY_BASE_URL = os.getenv("TAVILY_BASE_URL", "https://api.tavily.com")
+    PINECONE_HOST = os.getenv("PINECONE_HOST")
+
+    # Pool de connexions HTTP partagé (voir http_pool.py)
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+    HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+    HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+
+    # Métriques (voir metrics.py)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    METRICS_FILE = os.getenv("METRICS_FILE", "")
+    METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))
+    METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+
+    # Guardrails (voir guardrails.py): longueurs, limites par utilisateur, modèle de validation
+    GUARDRAIL_MAX_QUERY_LENGTH = int(os.getenv("GUARDRAIL_MAX_QUERY_LENGTH", "2000"))
+    GUARDRAIL_MAX_WORD_COUNT = int(os.getenv("GUARDRAIL_MAX_WORD_COUNT", "300"))
+    GUARDRAIL_MIN_QUERY_LENGTH = int(os.getenv("GUARDRAIL_MIN_QUERY_LENGTH", "3"))
+    GUARDRAIL_MAX_QUERIES_PER_MINUTE = int(os.getenv("GUARDRAIL_MAX_QUERIES_PER_MINUTE", "10"))
+    GUARDRAIL_MAX_QUERIES_PER_HOUR = int(os.getenv("GUARDRAIL_MAX_QUERIES_PER_HOUR", "50"))
+    # Score de risque à partir duquel une requête est bloquée comme injection
+    GUARDRAIL_RISK_THRESHOLD = int(os.getenv("GUARDRAIL_RISK_THRESHOLD", "5"))
+    GUARDRAIL_MODEL = os.getenv("GUARDRAIL_MODEL", "llama-3.1-8b-instant")
+
+    # Rechargement à chaud (voir config_reload.py): surcharges lues dans CONFIG_FILE
+    CONFIG_RELOAD = os.getenv("CONFIG_RELOAD", "false").lower() == "true"
+    CONFIG_FILE = os.getenv("CONFIG_FILE", "config_overrides.env")
+    CONFIG_RELOAD_INTERVAL = float(os.getenv("CONFIG_RELOAD_INTERVAL", "2"))
 
     # Protection de l'application
     ENABLE_PASSWORD_PROTECTION = os.getenv("ENABLE_PASSWORD_PROTECTION", "false").lower() == "true"
@@ -73,6 +246,9 @@ class Config:
             "TAVILY_API_KEY": cls.TAVILY_API_KEY,
             "PINECONE_INDEX_NAME": cls.PINECONE_INDEX_NAME,
         }
+        if cls.VECTOR_BACKEND.lower() == "local":
+            # L'index local remplace Pinecone: ses clés ne sont plus nécessaires
+            del required_keys["PINECONE_API_KEY"], required_keys["PINECONE_INDEX_NAME"]
 
         missing = [key for key, value in required_keys.items() if not value]
 
@@ -0,0 +1,224 @@
+"""
+Rechargement à chaud de la configuration, sans redémarrer le processus.
+
+Les surcharges sont lues dans CONFIG_FILE (format .env: CLE=valeur), surveillé
+toutes les CONFIG_RELOAD_INTERVAL secondes. À chaque modification:
+1. les surcharges sont appliquées aux variables d'environnement (une clé
+   retirée du fichier retrouve sa valeur d'origine);
+2. config.py est réévalué dans un module à part et validé: en cas d'erreur
+   (valeur non numérique, clé requise vide), la version en cours est gardée;
+3. les paramètres modifiés sont basculés ensemble sur Config et la version
+   de la configuration est incrémentée;
+4. les composants qui en dépendent sont reconstruits (on_config_change):
+   modèles, index, reranker, guardrails, quotas des namespaces... Si une
+   reconstruction échoue, les anciennes valeurs sont restaurées.
+
+Les paramètres lus une fois pour toutes au démarrage (pools de threads et de
+connexions, ports, workers) ne sont pas rechargés: leur modification est
+signalée et prise en compte au prochain redémarrage (à mettre dans .env).
+Une requête en cours voit les nouvelles valeurs à partir de l'étape suivante.
+"""
+
+import os
+import time
+import logging
+import threading
+import weakref
+import importlib.util
+from inspect import ismethod
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from dotenv import dotenv_values
+
+import config
+from config import Config
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RELOADS = REGISTRY.counter("rag_config_reloads_total", "Rechargements de la configuration par issue")
+
+# Lus au démarrage seulement (pools, serveurs, journal, surveillance elle-même)
+RESTART_REQUIRED = frozenset({
+    "IO_THREADS",
+    "EXEC_WORKERS", "EXEC_MAX_QUEUE", "EXEC_JOB_TTL", "EXEC_POLL_INTERVAL",
+    "API_HOST", "API_PORT", "API_WORKERS", "API_MAX_SESSIONS",
+    "HTTP2_ENABLED", "HTTP_MAX_CONNECTIONS", "HTTP_MAX_KEEPALIVE_CONNECTIONS", "HTTP_KEEPALIVE_EXPIRY",
+    # Fixés dans les clients HTTP partagés et dans les clients LLM qui les utilisent
+    "HTTP_CONNECT_TIMEOUT", "HTTP_READ_TIMEOUT", "HTTP_POOL_TIMEOUT",
+    # Traçage configuré une fois (Config.setup_langsmith)
+    "LANGCHAIN_TRACING_V2", "LANGCHAIN_API_KEY", "LANGCHAIN_PROJECT",
+    "METRICS_PORT", "METRICS_FILE", "METRICS_FILE_INTERVAL", "METRICS_WINDOW",
+    "QUERY_LOG", "QUERY_LOG_DIR", "QUERY_LOG_MAX_BYTES", "QUERY_LOG_BACKUP_COUNT", "QUERY_LOG_QUEUE_SIZE",
+    "CONFIG_RELOAD", "CONFIG_FILE", "CONFIG_RELOAD_INTERVAL",
+})
+
+Hook = Callable[[Set[str]], None]
+
+_lock = threading.RLock()
+_version = 0
+# Surcharges appliquées et valeurs d'origine des variables qu'elles remplacent (None = absente)
+_overrides: Dict[str, str] = {}
+_base_env: Dict[str, Optional[str]] = {}
+_hooks: List[Tuple[FrozenSet[str], Callable[[], Optional[Hook]]]] = []
+_watcher: Optional[threading.Thread] = None
+
+
+def config_version() -> int:
+    """Version de la configuration (0 = celle du démarrage, +1 à chaque rechargement appliqué)."""
+    return _version
+
+
+def on_config_change(keys: Iterable[str], callback: Hook):
+    """
+    Appelle callback(clés modifiées parmi keys) après chaque rechargement qui
+    touche l'une de ces clés, dans l'ordre d'enregistrement. Une méthode liée
+    est référencée faiblement (l'objet peut être libéré).
+    """
+    ref = weakref.WeakMethod(callback) if ismethod(callback) else (lambda: callback)
+    with _lock:
+        _hooks.append((frozenset(keys), ref))
+
+
+def read_overrides(path: str) -> Dict[str, str]:
+    """Surcharges du fichier (vide s'il n'existe pas)."""
+    if not os.path.exists(path):
+        return {}
+    return {key: value for key, value in dotenv_values(path).items() if value is not None}
+
+
+def _apply_env(overrides: Dict[str, str]):
+    global _overrides
+    for key in [key for key in _base_env if key not in overrides]:
+        original = _base_env.pop(key)
+        if original is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = original
+    for key, value in overrides.items():
+        if key not in _base_env:
+            _base_env[key] = os.environ.get(key)
+        os.environ[key] = value
+    _overrides = dict(overrides)
+
+
+def _evaluate() -> type:
+    """Réévalue config.py avec l'environnement courant, sans toucher au module importé."""
+    spec = importlib.util.spec_from_file_location("_config_candidate", config.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.Config.validate()
+    return module.Config
+
+
+def settings(cls: type) -> Dict[str, Any]:
+    return {key: value for key, value in vars(cls).items() if key.isupper()}
+
+
+def _swap(values: Dict[str, Any]):
+    for key, value in values.items():
+        setattr(Config, key, value)
+
+
+def _run_hooks(changed: Set[str]):
+    with _lock:
+        hooks = list(_hooks)
+    for keys, ref in hooks:
+        callback = ref()
+        if callback is not None and keys & changed:
+            callback(set(keys & changed))
+
+
+def reload_config() -> Dict[str, Any]:
+    """
+    Relit CONFIG_FILE et applique les paramètres modifiés.
+
+    Returns:
+        Dict: version, clés appliquées ("changed"), clés ignorées jusqu'au
+        redémarrage ("restart_required") et erreur éventuelle ("error").
+    """
+    global _version
+    with _lock:
+        previous = dict(_overrides)
+        result: Dict[str, Any] = {"version": _version, "changed": [], "restart_required": [], "error": None}
+        try:
+            _apply_env(read_overrides(Config.CONFIG_FILE))
+            candidate = settings(_evaluate())
+        except Exception as e:
+            _apply_env(previous)
+            RELOADS.inc(outcome="invalid")
+            logger.error(f"❌ Configuration {Config.CONFIG_FILE} rejetée, version {_version} conservée: {e}")
+            result["error"] = str(e)
+            return result
+
+        changes = {key: value for key, value in candidate.items() if getattr(Config, key, None) != value}
+        result["restart_required"] = sorted(changes.keys() & RESTART_REQUIRED)
+        if result["restart_required"]:
+            logger.warning(f"⚠️  Paramètres pris en compte au prochain redémarrage: {', '.join(result['restart_required'])}")
+        applied = {key: value for key, value in changes.items() if key not in RESTART_REQUIRED}
+        if not applied:
+            RELOADS.inc(outcome="unchanged")
+            return result
+
+        old = {key: getattr(Config, key, None) for key in applied}
+        _swap(applied)
+        try:
+            _run_hooks(set(applied))
+        except Exception as e:
+            logger.error(f"❌ Reconstruction impossible, retour à la version {_version}: {e}")
+            _swap(old)
+            _apply_env(previous)
+            try:
+                _run_hooks(set(applied))
+            except Exception as e2:
+                logger.error(f"❌ Restauration incomplète des composants: {e2}")
+            RELOADS.inc(outcome="rolled_back")
+            result["error"] = str(e)
+            return result
+
+        _version += 1
+        RELOADS.inc(outcome="applied")
+        logger.info(f"🔄 Configuration v{_version}: {', '.join(sorted(applied))}")
+        result.update(version=_version, changed=sorted(applied))
+        return result
+
+
+def _signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _watch(path: str, interval: float, seen: Optional[Tuple[int, int]]):
+    while True:
+        time.sleep(interval)
+        current = _signature(path)
+        if current != seen:
+            seen = current
+            try:
+                reload_config()
+            except Exception as e:
+                logger.error(f"❌ Rechargement de la configuration: {e}")
+
+
+def start_config_watcher():
+    """
+    Applique CONFIG_FILE puis le surveille dans un thread dédié (une fois par
+    processus; sans effet si CONFIG_RELOAD est désactivé).
+    """
+    global _watcher
+    if not Config.CONFIG_RELOAD:
+        return
+    with _lock:
+        if _watcher is not None:
+            return
+        seen = _signature(Config.CONFIG_FILE)
+        reload_config()
+        _watcher = threading.Thread(
+            target=_watch, args=(Config.CONFIG_FILE, Config.CONFIG_RELOAD_INTERVAL, seen),
+            name="rag-config-watcher", daemon=True,
+        )
+        _watcher.start()
+    logger.info(f"✅ Rechargement à chaud: {Config.CONFIG_FILE} (toutes les {Config.CONFIG_RELOAD_INTERVAL:g}s)")
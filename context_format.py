@@ -0,0 +1,122 @@
+"""
+Représentation du contexte Pinecone transmis au LLM de synthèse.
+
+- "verbose" (historique): en-tête Source / Article / Score / Texte par extrait;
+- "compact": table des sources avec identifiants courts ([S1], [S2]...),
+  extraits précédés de leur identifiant et de leur article, sans scores,
+  texte nettoyé (espaces normalisés, lignes de gabarit retirées).
+
+En mode compact, le modèle cite les identifiants; CitationMapper les
+remplace par le nom complet des sources dans la réponse, y compris au fil du
+streaming.
+"""
+
+import re
+from typing import Dict, List
+
+# Séparateur des extraits dans les contextes transmis au LLM (format verbeux, web)
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+VERBOSE = "verbose"
+COMPACT = "compact"
+
+# Lignes de gabarit des textes de loi: pagination, mises à jour, mentions d'éditeur, filets
+_BOILERPLATE_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:page[ \t]*)?\d+[ \t]*(?:/|de|sur)[ \t]*\d+"
+    r"|(?:©|\(c\))[^\n]*"
+    r"|(?:à jour au|dernière (?:mise à jour|version))[^\n]*"
+    r"|(?:éditeur officiel du québec|table des matières)[^\n]*"
+    r"|[-_=*·.]{3,}"
+    r")[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_SPACES_RE = re.compile(r"[ \t ]+")
+_BLANK_LINES_RE = re.compile(r"\s*\n\s*")
+
+# Citation d'une ou plusieurs sources: [S1], [S1, art. 1457], [S1; S3]
+_CITATION_RE = re.compile(r"\[(S\d+(?:\s*[,;/]\s*S\d+)*)\s*((?:[,·:–-]\s*)?[^\[\]\n]{0,40})\]")
+_CITATION_ID_RE = re.compile(r"S\d+")
+# Au-delà, un « [ » ouvert n'est plus retenu en attente d'une citation
+MAX_CITATION_CHARS = 64
+
+
+def clean_legal_text(text: str) -> str:
+    """Retire les lignes de gabarit et normalise les espaces (une ligne par paragraphe)."""
+    text = _BOILERPLATE_RE.sub("", text)
+    text = _SPACES_RE.sub(" ", text)
+    return _BLANK_LINES_RE.sub("\n", text).strip()
+
+
+def _article_label(article: str) -> str:
+    article = str(article or "").strip()
+    if not article or article.upper() == "N/A":
+        return ""
+    return f"art. {article}" if article[0].isdigit() else article
+
+
+def source_ids(chunks_info: List[Dict]) -> Dict[str, str]:
+    """Identifiant court de chaque source, dans l'ordre de première apparition."""
+    ids: Dict[str, str] = {}
+    for info in chunks_info:
+        if info['source'] not in ids:
+            ids[info['source']] = f"S{len(ids) + 1}"
+    return ids
+
+
+def format_entry(info: Dict, fmt: str, source_id: str = "S0") -> str:
+    """Texte d'un extrait dans le format demandé (aussi utilisé pour mesurer son coût)."""
+    if fmt == COMPACT:
+        label = " ".join(part for part in (source_id, _article_label(info['article'])) if part)
+        return f"[{label}] {clean_legal_text(info['text'])}"
+    return f"""Source: {info['source']}
+Article/Section: {info['article']}
+Score de pertinence: {info['score']:.2f}
+Texte: {info['text']}"""
+
+
+def render_context(chunks_info: List[Dict], fmt: str) -> str:
+    """Rend le contexte complet à partir des extraits retenus."""
+    if not chunks_info:
+        return ""
+    if fmt != COMPACT:
+        return CONTEXT_SEPARATOR.join(format_entry(info, fmt) for info in chunks_info)
+
+    ids = source_ids(chunks_info)
+    table = "\n".join(f"[{source_id}] {source}" for source, source_id in ids.items())
+    extracts = "\n\n".join(format_entry(info, fmt, ids[info['source']]) for info in chunks_info)
+    return f"Sources:\n{table}\n\n{extracts}"
+
+
+class CitationMapper:
+    """Remplace les identifiants [S1] par le nom des sources, sur un texte entier ou en flux."""
+
+    def __init__(self, chunks_info: List[Dict]):
+        self.sources = {source_id: source for source, source_id in source_ids(chunks_info).items()}
+        self._pending = ""
+
+    def _replace(self, match: "re.Match") -> str:
+        ids = _CITATION_ID_RE.findall(match.group(1))
+        if any(source_id not in self.sources for source_id in ids):
+            return match.group(0)
+        names = "; ".join(dict.fromkeys(self.sources[source_id] for source_id in ids))
+        detail = match.group(2).strip(" ,·:–-")
+        return f"[{names}, {detail}]" if detail else f"[{names}]"
+
+    def map(self, text: str) -> str:
+        return _CITATION_RE.sub(self._replace, text)
+
+    def feed(self, token: str) -> str:
+        """Texte prêt à émettre; une citation entamée est retenue jusqu'à sa fermeture."""
+        text = self._pending + token
+        cut = text.rfind("[")
+        if cut != -1 and "]" not in text[cut:] and len(text) - cut < MAX_CITATION_CHARS:
+            self._pending, text = text[cut:], text[:cut]
+        else:
+            self._pending = ""
+        return self.map(text)
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return self.map(text)
+
@@ -0,0 +1,152 @@
+"""
+Délai de bout en bout d'une requête et budgets par étape.
+
+query() ouvre un délai (QUERY_DEADLINE_MS) propagé par contextvar, comme la
+trace de metrics.py. Il court depuis la soumission de la requête: l'attente
+dans la file d'exécution est décomptée. Chaque étape coûteuse s'exécute sous un sous-délai:
+son budget, borné par le temps restant moins la réserve des étapes
+suivantes. Les clients HTTP partagés (http_pool) plafonnent leurs timeouts
+et leurs réessais au temps restant du délai actif.
+
+Quand le temps manque, le pipeline se dégrade par paliers (expansion LLM
+sautée, recherche web sautée, contexte réduit) plutôt que de dépasser le
+SLA; chaque dégradation est notée dans les métadonnées de la réponse.
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEGRADATIONS = REGISTRY.counter("rag_degradations_total", "Étapes dégradées faute de temps")
+
+# Part minimale de son budget dont une étape optionnelle doit disposer pour être tentée
+MIN_BUDGET_FRACTION = 0.5
+
+
+def expires_after(timeout_ms: float) -> float:
+    """Échéance (time.monotonic) dans timeout_ms."""
+    return time.monotonic() + timeout_ms / 1000
+
+
+class Deadline:
+    """Échéance d'une requête (ou d'une étape) et dégradations appliquées."""
+
+    def __init__(self, expires_at: float, degradations: Optional[List[str]] = None):
+        self.expires_at = expires_at
+        # Partagée entre le délai de la requête et ceux de ses étapes
+        self.degradations: List[str] = degradations if degradations is not None else []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def after(cls, timeout_ms: float) -> "Deadline":
+        return cls(expires_after(timeout_ms))
+
+    def remaining(self) -> float:
+        """Temps restant en secondes (0 si écoulé)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, budget_ms: float, reserve_ms: float = 0) -> float:
+        """Temps accordé à une étape (s): son budget, borné par le restant moins la réserve."""
+        return max(0.0, min(budget_ms / 1000, self.remaining() - reserve_ms / 1000))
+
+    def allows(self, budget_ms: float, reserve_ms: float = 0) -> bool:
+        """Vrai si une étape optionnelle dispose d'assez de temps pour être tentée."""
+        return self.budget(budget_ms, reserve_ms) >= budget_ms / 1000 * MIN_BUDGET_FRACTION
+
+    def child(self, budget_ms: float, reserve_ms: float = 0, essential: bool = False) -> "Deadline":
+        """
+        Sous-délai d'une étape, qui partage la liste des dégradations. Une étape
+        essentielle garde au moins MIN_BUDGET_FRACTION de son budget, pris sur la réserve.
+        """
+        budget = self.budget(budget_ms, reserve_ms)
+        if essential:
+            budget = max(budget, min(self.remaining(), budget_ms / 1000 * MIN_BUDGET_FRACTION))
+        return Deadline(time.monotonic() + budget, self.degradations)
+
+    def degrade(self, name: str, reason: str):
+        with self._lock:
+            if name in self.degradations:
+                return
+            self.degradations.append(name)
+        DEGRADATIONS.inc(stage=name)
+        logger.warning(f"⏱️  Dégradation '{name}': {reason} ({self.remaining() * 1000:.0f} ms restantes)")
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "rag_request_deadline", default=None
+)
+
+
+@contextmanager
+def request_deadline(timeout_ms: float, expires_at: Optional[float] = None) -> Iterator[Deadline]:
+    """
+    Active le délai de la requête courante (propagé aux threads via copy_context).
+    expires_at (time.monotonic) fixe l'échéance, ex: depuis la soumission en file.
+    """
+    deadline = Deadline(expires_at) if expires_at is not None else Deadline.after(timeout_ms)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+@contextmanager
+def stage_deadline(
+    budget_ms: float, reserve_ms: float = 0, essential: bool = False
+) -> Iterator[Optional[Deadline]]:
+    """Restreint le délai actif au budget d'une étape (sans effet hors requête)."""
+    parent = _current_deadline.get()
+    if parent is None:
+        yield None
+        return
+    deadline = parent.child(budget_ms, reserve_ms, essential)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Retourne le délai actif, ou None hors requête."""
+    return _current_deadline.get()
+
+
+def time_left() -> Optional[float]:
+    """Temps restant du délai actif (s), None si aucun délai."""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def allows(budget_ms: float, reserve_ms: float = 0) -> bool:
+    """Vrai si l'étape peut être tentée (toujours vrai hors requête)."""
+    deadline = _current_deadline.get()
+    return deadline is None or deadline.allows(budget_ms, reserve_ms)
+
+
+def degrade(name: str, reason: str):
+    """Note une dégradation sur la requête courante (ignoré hors requête)."""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.degrade(name, reason)
+
+
+def degradations() -> List[str]:
+    deadline = _current_deadline.get()
+    return list(deadline.degradations) if deadline is not None else []
+
+
+def is_timeout(error: BaseException) -> bool:
+    """Reconnaît un dépassement de délai, quel que soit le client (httpx, openai, requests)."""
+    return isinstance(error, TimeoutError) or any("Timeout" in cls.__name__ for cls in type(error).__mro__)
@@ -0,0 +1,167 @@
+"""
+Suppression des quasi-doublons dans le contexte (chunks qui se recouvrent,
+même article repris d'une édition à l'autre sous des IDs différents).
+
+Deux modes:
+- "simhash": empreinte SimHash 64 bits sur des shingles de mots, mise en
+  cache par ID de chunk; deux chunks à faible distance de Hamming sont
+  considérés comme doublons;
+- "mmr": pertinence marginale maximale sur les vecteurs renvoyés par
+  Pinecone (include_values), qui écarte aussi les vecteurs quasi identiques.
+"""
+
+import re
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from config import Config
+from metrics import REGISTRY, current_trace
+from config_reload import on_config_change
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Taille des shingles (mots consécutifs) utilisés pour l'empreinte
+SHINGLE_SIZE = 3
+FINGERPRINT_BITS = 64
+
+DUPLICATES = REGISTRY.counter(
+    "rag_context_duplicates_total", "Chunks écartés du contexte comme quasi-doublons"
+)
+
+
+def _shingles(text: str) -> List[str]:
+    words = _WORD_RE.findall(unicodedata.normalize("NFC", text).casefold())
+    if len(words) <= SHINGLE_SIZE:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+
+def simhash(text: str) -> int:
+    """Empreinte SimHash 64 bits d'un texte."""
+    weights = [0] * FINGERPRINT_BITS
+    for shingle in _shingles(text):
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateFilter:
+    """Détecte les quasi-doublons par SimHash, avec empreintes en cache par ID de chunk."""
+
+    def __init__(self, max_distance: int = 6, cache_size: int = 10000):
+        self.max_distance = max_distance
+        self.cache_size = cache_size
+        self._fingerprints: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fingerprint(self, chunk: Dict[str, Any]) -> int:
+        chunk_id = chunk['id']
+        with self._lock:
+            fp = self._fingerprints.get(chunk_id)
+            if fp is not None:
+                self._fingerprints.move_to_end(chunk_id)
+                return fp
+
+        fp = simhash(chunk.get('metadata', {}).get('text', ''))
+        with self._lock:
+            self._fingerprints[chunk_id] = fp
+            if len(self._fingerprints) > self.cache_size:
+                self._fingerprints.popitem(last=False)
+        return fp
+
+    def admit(self, chunk: Dict[str, Any], kept: List[int]) -> bool:
+        """
+        Retourne False si le chunk double un chunk déjà retenu; sinon ajoute
+        son empreinte à `kept` et retourne True.
+        """
+        fp = self.fingerprint(chunk)
+        if any(hamming(fp, other) <= self.max_distance for other in kept):
+            return False
+        kept.append(fp)
+        return True
+
+
+def mmr_order(
+    chunks: Sequence[Dict[str, Any]],
+    relevance: Sequence[float],
+    lambda_mult: float,
+    max_similarity: float,
+) -> Iterator[Tuple[Dict[str, Any], bool]]:
+    """
+    Parcourt les chunks dans l'ordre MMR et indique pour chacun s'il est un
+    quasi-doublon (cosinus ≥ max_similarity avec un chunk déjà sélectionné).
+    Les chunks sans vecteur gardent leur ordre d'origine, après les autres.
+    Évalué paresseusement: le coût est proportionnel aux chunks consommés.
+    """
+    import numpy as np
+
+    with_values = [i for i, c in enumerate(chunks) if c.get('values')]
+    without_values = [i for i, c in enumerate(chunks) if not c.get('values')]
+
+    if with_values:
+        vectors = np.asarray([chunks[i]['values'] for i in with_values], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        rel = np.asarray([relevance[i] for i in with_values], dtype=np.float32)
+        # Similarité max de chaque candidat avec la sélection courante
+        max_sim = np.full(len(with_values), -1.0, dtype=np.float32)
+        remaining = np.ones(len(with_values), dtype=bool)
+
+        for _ in range(len(with_values)):
+            penalty = np.where(max_sim > -1.0, max_sim, 0.0)
+            mmr = lambda_mult * rel - (1 - lambda_mult) * penalty
+            mmr[~remaining] = -np.inf
+            best = int(np.argmax(mmr))
+            remaining[best] = False
+
+            duplicate = bool(max_sim[best] >= max_similarity)
+            yield chunks[with_values[best]], duplicate
+            if not duplicate:
+                max_sim = np.maximum(max_sim, vectors @ vectors[best])
+
+    for i in without_values:
+        yield chunks[i], False
+
+
+def record_duplicates(count: int, mode: str):
+    if not count:
+        return
+    DUPLICATES.inc(count, mode=mode)
+    trace = current_trace()
+    if trace is not None:
+        trace.incr("context_duplicates", count)
+
+
+_filter: Optional[NearDuplicateFilter] = None
+
+
+def get_duplicate_filter() -> NearDuplicateFilter:
+    """Filtre SimHash partagé (le cache d'empreintes survit aux requêtes)."""
+    global _filter
+    if _filter is None:
+        _filter = NearDuplicateFilter(max_distance=Config.DEDUP_MAX_HAMMING)
+    return _filter
+
+
+def _reload_filter(changed: Set[str]):
+    # Les empreintes en cache ne dépendent pas du seuil: seul le seuil change
+    if _filter is not None:
+        _filter.max_distance = Config.DEDUP_MAX_HAMMING
+
+
+on_config_change({"DEDUP_MAX_HAMMING"}, _reload_filter)
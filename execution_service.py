@@ -0,0 +1,221 @@
+"""
+Service d'exécution des requêtes hors du thread de script Streamlit.
+
+Pool de threads borné + file d'attente bornée, partagés par toutes les
+sessions du processus. Chaque soumission retourne un Job que l'UI interroge
+(statut, position dans la file, résultat). Quand la file est pleine, la
+soumission est refusée (délestage) avec QueueFullError. Un travail dont
+l'échéance est passée quand un worker le prend n'est pas exécuté
+(DeadlineExpiredError): personne n'attend plus sa réponse.
+"""
+
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+JOBS = REGISTRY.counter("rag_exec_jobs_total", "Travaux soumis au service d'exécution par issue")
+QUEUE_WAIT = REGISTRY.summary("rag_exec_queue_wait_seconds", "Attente en file avant exécution")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+OVERLOAD_MESSAGE = (
+    "🚦 Le service est actuellement très sollicité. "
+    "Veuillez réessayer votre question dans quelques instants."
+)
+
+
+class QueueFullError(Exception):
+    """La file d'attente est pleine: la requête est délestée."""
+
+
+class DeadlineExpiredError(Exception):
+    """Le délai du travail s'est écoulé dans la file: il est délesté sans être exécuté."""
+
+
+class Job:
+    """Travail soumis par une session, interrogé par l'UI."""
+
+    def __init__(self, session_id: str, expires_at: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.expires_at = expires_at  # échéance (time.monotonic), None = sans délai
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.future: Optional[Future] = None  # pour asyncio.wrap_future côté API
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ExecutionService:
+    """Pool de workers borné avec file d'attente bornée et délestage."""
+
+    def __init__(self, max_workers: int, max_queue: int, job_ttl: float):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-exec")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._queue: List[str] = []  # IDs en attente, dans l'ordre d'arrivée
+        self._running = 0
+
+    def submit(
+        self, session_id: str, fn: Callable[..., Any], *args, expires_at: Optional[float] = None, **kwargs
+    ) -> Job:
+        """
+        Soumet un travail pour une session. expires_at (time.monotonic) est
+        l'échéance de la requête: passée, le travail est délesté à sa sortie de file.
+
+        Raises:
+            QueueFullError: si la file d'attente est pleine
+        """
+        with self._lock:
+            self._purge_expired()
+            if len(self._queue) + self._running >= self.max_workers + self.max_queue:
+                JOBS.inc(outcome="rejected")
+                logger.warning(
+                    f"🚦 File pleine ({len(self._queue)} en attente, {self._running} en cours), requête délestée"
+                )
+                raise QueueFullError(OVERLOAD_MESSAGE)
+
+            job = Job(session_id, expires_at)
+            self._jobs[job.id] = job
+            self._queue.append(job.id)
+            JOBS.inc(outcome="accepted")
+
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs):
+        with self._lock:
+            self._queue.remove(job.id)
+            self._running += 1
+        job.started_at = time.time()
+        job.status = RUNNING
+        QUEUE_WAIT.observe(job.started_at - job.submitted_at)
+
+        try:
+            if job.expires_at is not None and time.monotonic() >= job.expires_at:
+                raise DeadlineExpiredError(OVERLOAD_MESSAGE)
+            job.result = fn(*args, **kwargs)
+            job.status = DONE
+            JOBS.inc(outcome="completed")
+        except DeadlineExpiredError as e:
+            logger.warning(f"🚦 Travail {job.id[:8]} délesté: délai écoulé après {job.started_at - job.submitted_at:.1f}s en file")
+            job.error = e
+            job.status = FAILED
+            JOBS.inc(outcome="expired")
+        except BaseException as e:
+            logger.error(f"❌ Erreur travail {job.id[:8]}: {e}", exc_info=True)
+            job.error = e
+            job.status = FAILED
+            JOBS.inc(outcome="failed")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._running -= 1
+            job._done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def release(self, job_id: str):
+        """Oublie un travail dont le résultat a été consommé."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def position(self, job_id: str) -> int:
+        """Position dans la file (1 = prochain), 0 si le travail n'est plus en attente."""
+        with self._lock:
+            try:
+                return self._queue.index(job_id) + 1
+            except ValueError:
+                return 0
+
+    def _purge_expired(self):
+        # Travaux terminés jamais relus (session fermée): libérés après job_ttl
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "queued": len(self._queue),
+                "running": self._running,
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "tracked_jobs": len(self._jobs),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_service: Optional[ExecutionService] = None
+_service_lock = threading.Lock()
+
+
+def get_execution_service() -> ExecutionService:
+    """Retourne le service d'exécution partagé du processus."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ExecutionService(
+                max_workers=Config.EXEC_WORKERS,
+                max_queue=Config.EXEC_MAX_QUEUE,
+                job_ttl=Config.EXEC_JOB_TTL,
+            )
+            logger.info(f"✅ Service d'exécution: {Config.EXEC_WORKERS} workers, file de {Config.EXEC_MAX_QUEUE}")
+        return _service
+
+
+def _collect_exec_metrics() -> List[str]:
+    """Expose la profondeur de file et les travaux en cours."""
+    if _service is None:
+        return []
+    stats = _service.stats()
+    return [
+        "# TYPE rag_exec_queue_depth gauge",
+        f"rag_exec_queue_depth {stats['queued']}",
+        "# TYPE rag_exec_running gauge",
+        f"rag_exec_running {stats['running']}",
+    ]
+
+
+REGISTRY.register_collector(_collect_exec_metrics)
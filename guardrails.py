@@ -5,12 +5,20 @@ Protection contre les prompt injections, abus, et requêtes malicieuses.
 
 import re
 import logging
-from typing import Tuple, Optional, List, Dict
+import threading
+from typing import Tuple, Optional, List, Dict, Iterable, Iterator, Set
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 
 from langchain_groq import ChatGroq
 from config import Config
+from http_pool import get_http_client, http_timeout
+from deadline import degrade, is_timeout
+from metrics import span, LLMMetricsCallback
+from profiling import profiled
+from config_reload import on_config_change
+from tenants import per_process
 
 logger = logging.getLogger(__name__)
 
@@ -76,31 +84,63 @@ class SecurityGuardrails:
         "script": 3,
     }
 
-    # Longueurs maximales
-    MAX_QUERY_LENGTH = 2000  # caractères
-    MAX_WORD_COUNT = 300
-    MIN_QUERY_LENGTH = 3
-
-    # Rate limiting
-    MAX_QUERIES_PER_MINUTE = 10
-    MAX_QUERIES_PER_HOUR = 50
+    # Seuils (longueurs en caractères, rate limiting, score de risque), rechargeables à chaud
+    SETTINGS = {
+        "GUARDRAIL_MAX_QUERY_LENGTH": "MAX_QUERY_LENGTH",
+        "GUARDRAIL_MAX_WORD_COUNT": "MAX_WORD_COUNT",
+        "GUARDRAIL_MIN_QUERY_LENGTH": "MIN_QUERY_LENGTH",
+        "GUARDRAIL_MAX_QUERIES_PER_MINUTE": "MAX_QUERIES_PER_MINUTE",
+        "GUARDRAIL_MAX_QUERIES_PER_HOUR": "MAX_QUERIES_PER_HOUR",
+        "GUARDRAIL_RISK_THRESHOLD": "RISK_THRESHOLD",
+    }
+    # Paramètres du LLM de validation
+    LLM_SETTINGS = frozenset({"GUARDRAIL_MODEL", "GROQ_API_KEY", "GROQ_API_HOST"})
 
     def __init__(self):
         """Initialise le système de guardrails."""
         self.compiled_patterns = [re.compile(p) for p in self.INJECTION_PATTERNS]
+        self.apply_settings(self.SETTINGS)
 
         # Rate limiting storage (en mémoire)
         self.query_history: Dict[str, List[datetime]] = defaultdict(list)
+        # user_id internes exemptés le temps d'un traitement (batch, construction du magasin)
+        self._exempt_users: Counter = Counter()
+        self._exempt_lock = threading.Lock()
+
+        self._init_llm()
+        self.llm_callbacks = [LLMMetricsCallback("guardrail")]
+
+        logger.info("✅ Guardrails de sécurité initialisés")
 
-        # LLM pour validation de contexte juridique
+    # Limites réparties entre les processus de l'API (voir tenants.per_process)
+    RATE_LIMITS = frozenset({"GUARDRAIL_MAX_QUERIES_PER_MINUTE", "GUARDRAIL_MAX_QUERIES_PER_HOUR"})
+
+    def apply_settings(self, keys: Iterable[str]):
+        """Recopie depuis Config les seuils donnés (les autres sont gardés)."""
+        for key in keys:
+            if key in self.SETTINGS:
+                value = getattr(Config, key)
+                setattr(self, self.SETTINGS[key], per_process(value) if key in self.RATE_LIMITS else value)
+
+    def _init_llm(self):
+        """LLM pour validation de contexte juridique."""
         self.llm = ChatGroq(
-            model="llama-3.1-8b-instant",
+            model=Config.GUARDRAIL_MODEL,
             api_key=Config.GROQ_API_KEY,
+            base_url=Config.GROQ_API_HOST,
             temperature=0,
-            max_tokens=50
+            max_tokens=50,
+            http_client=get_http_client(Config.GROQ_BASE_URL),
+            request_timeout=http_timeout(),
+            max_retries=0
         )
 
-        logger.info("✅ Guardrails de sécurité initialisés")
+    def reload(self, changed: Set[str]):
+        """Applique une nouvelle configuration (voir config_reload.py)."""
+        self.apply_settings(changed)
+        if changed & self.LLM_SETTINGS:
+            self._init_llm()
+        logger.info(f"🔄 Guardrails mis à jour: {', '.join(sorted(changed))}")
 
     def sanitize_input(self, text: str) -> str:
         """
@@ -192,7 +232,7 @@ class SecurityGuardrails:
                 reasons.append(f"Répétition excessive détectée")
 
         # Seuils de décision
-        is_malicious = risk_score >= 5
+        is_malicious = risk_score >= self.RISK_THRESHOLD
         reason = " | ".join(reasons) if reasons else None
 
         if is_malicious:
@@ -228,6 +268,22 @@ class SecurityGuardrails:
 
         return True, None
 
+    @contextmanager
+    def rate_limit_exemption(self, user_id: str) -> Iterator[None]:
+        """
+        Exempte un user_id du rate limiting le temps du bloc (ex: un batch dans
+        le processus de l'API), sans toucher aux limites des autres utilisateurs.
+        """
+        with self._exempt_lock:
+            self._exempt_users[user_id] += 1
+        try:
+            yield
+        finally:
+            with self._exempt_lock:
+                self._exempt_users[user_id] -= 1
+                if self._exempt_users[user_id] <= 0:
+                    del self._exempt_users[user_id]
+
     def check_rate_limit(self, user_id: str = "default") -> Tuple[bool, Optional[str]]:
         """
         Vérifie le rate limiting pour prévenir les abus.
@@ -238,6 +294,9 @@ class SecurityGuardrails:
         Returns:
             Tuple[bool, Optional[str]]: (est_autorisé, message_erreur)
         """
+        if user_id in self._exempt_users:
+            return True, None
+
         now = datetime.now()
 
         # Nettoie l'historique ancien (> 1 heure)
@@ -305,7 +364,8 @@ Question: "{query}"
 Réponse (OUI ou NON):"""
 
             # Appelle le LLM
-            response = self.llm.invoke(validation_prompt)
+            with span("guardrail_llm"):
+                response = self.llm.invoke(validation_prompt, config={"callbacks": self.llm_callbacks})
             answer = response.content.strip().upper()
 
             # Analyse la réponse
@@ -318,9 +378,12 @@ Réponse (OUI ou NON):"""
 
         except Exception as e:
             logger.error(f"⚠️ Erreur validation LLM: {e}. Fallback vers validation permissive.")
+            if is_timeout(e):
+                degrade("guardrails", "validation LLM non terminée dans son budget")
             # En cas d'erreur, on accepte (fail-open) pour ne pas bloquer les utilisateurs
             return True, None
 
+    @profiled("guardrails")
     def full_validation(self, query: str, user_id: str = "default") -> Tuple[bool, Optional[str]]:
         """
         Validation complète multi-couches d'une requête.
@@ -376,3 +439,11 @@ def get_guardrails() -> SecurityGuardrails:
     if _guardrails_instance is None:
         _guardrails_instance = SecurityGuardrails()
     return _guardrails_instance
+
+
+def _reload_guardrails(changed: Set[str]):
+    if _guardrails_instance is not None:
+        _guardrails_instance.reload(changed)
+
+
+on_config_change(set(SecurityGuardrails.SETTINGS) | SecurityGuardrails.LLM_SETTINGS, _reload_guardrails)
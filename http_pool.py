@@ -0,0 +1,425 @@
+"""
+Pool de connexions HTTP partagé entre tous les clients sortants.
+
+Un seul pool keep-alive (HTTP/2 si disponible) par hôte amont, injecté dans
+les clients OpenAI, Groq, LangChain et Tavily. Les limites, timeouts et le
+backoff des réessais sont définis dans Config.
+"""
+
+import time
+import random
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+from metrics import REGISTRY
+from deadline import time_left
+from resilience import CircuitBreaker, CircuitOpenError, get_breaker, upstream_name
+from config_reload import on_config_change
+
+logger = logging.getLogger(__name__)
+
+# Codes HTTP pour lesquels un réessai est pertinent
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Erreurs réseau pour lesquelles un réessai est pertinent
+RETRYABLE_EXCEPTIONS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.RemoteProtocolError,
+    httpx.PoolTimeout,
+)
+
+
+def _http2_available() -> bool:
+    """Vérifie que le support HTTP/2 (paquet h2) est installé."""
+    if not Config.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("⚠️  Paquet 'h2' absent, pool HTTP en HTTP/1.1 uniquement")
+        return False
+
+
+def http_timeout() -> httpx.Timeout:
+    """Retourne les timeouts configurés pour les clients sortants."""
+    return httpx.Timeout(
+        connect=Config.HTTP_CONNECT_TIMEOUT,
+        read=Config.HTTP_READ_TIMEOUT,
+        write=Config.HTTP_READ_TIMEOUT,
+        pool=Config.HTTP_POOL_TIMEOUT,
+    )
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Calcule le délai avant le prochain essai (backoff exponentiel avec jitter)."""
+    if retry_after:
+        try:
+            return min(float(retry_after), Config.HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = Config.HTTP_BACKOFF_BASE * (2 ** attempt)
+    return min(delay, Config.HTTP_BACKOFF_MAX) * random.uniform(0.5, 1.0)
+
+
+def _cap_timeouts(request: httpx.Request):
+    """Plafonne les timeouts d'une requête au temps restant du délai actif (deadline.py)."""
+    left = time_left()
+    if left is None:
+        return
+    if left <= 0:
+        request.extensions["deadline_capped"] = True
+        raise httpx.ReadTimeout("Délai de la requête écoulé", request=request)
+    timeouts = request.extensions.get("timeout") or http_timeout().as_dict()
+    request.extensions["timeout"] = {
+        key: left if value is None else min(value, left) for key, value in timeouts.items()
+    }
+    if any(value is None or value > left for value in timeouts.values()):
+        # Un timeout dû au délai de la requête n'est pas imputé au service (disjoncteur)
+        request.extensions["deadline_capped"] = True
+
+
+def _retry_fits(delay: float) -> bool:
+    """Un réessai n'est tenté que s'il peut aboutir avant la fin du délai actif."""
+    left = time_left()
+    return left is None or delay < left
+
+
+class PoolStats:
+    """Compteurs d'utilisation d'un pool de connexions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests_total = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.retries_total = 0
+        self.errors_total = 0
+
+    def start(self):
+        with self._lock:
+            self.requests_total += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self, failed: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors_total += 1
+
+    def retry(self):
+        with self._lock:
+            self.retries_total += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests_total": self.requests_total,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "retries_total": self.retries_total,
+                "errors_total": self.errors_total,
+            }
+
+
+class RetryingTransport(httpx.BaseTransport):
+    """Transport httpx avec pool keep-alive, réessais, disjoncteur et métriques."""
+
+    def __init__(self, stats: PoolStats, http2: bool, breaker: CircuitBreaker):
+        self.stats = stats
+        self.breaker = breaker
+        self._transport = httpx.HTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        # Service en panne: échec immédiat plutôt qu'une attente jusqu'au timeout
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+        try:
+            response = self._send_with_retries(request)
+        except httpx.TimeoutException:
+            if request.extensions.get("deadline_capped"):
+                self.breaker.record_neutral()
+            else:
+                self.breaker.record_failure()
+            raise
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_neutral()
+            raise
+        if response.status_code >= 500 or response.status_code == 408:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _send_with_retries(self, request: httpx.Request) -> httpx.Response:
+        # Seuls les corps déjà en mémoire peuvent être renvoyés sans risque
+        can_retry = isinstance(request.stream, httpx.ByteStream)
+        max_retries = Config.HTTP_MAX_RETRIES if can_retry else 0
+
+        attempt = 0
+        while True:
+            _cap_timeouts(request)
+            self.stats.start()
+            try:
+                response = self._transport.handle_request(request)
+            except RETRYABLE_EXCEPTIONS as e:
+                self.stats.finish(failed=True)
+                delay = backoff_delay(attempt)
+                if attempt >= max_retries or not _retry_fits(delay):
+                    raise
+                logger.warning(f"⚠️  {request.url.host}: {type(e).__name__}, nouvel essai dans {delay:.2f}s")
+            except Exception:
+                self.stats.finish(failed=True)
+                raise
+            else:
+                self.stats.finish(failed=response.status_code >= 500)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= max_retries:
+                    return response
+                delay = backoff_delay(attempt, response.headers.get("retry-after"))
+                if not _retry_fits(delay):
+                    return response
+                response.close()
+                logger.warning(f"⚠️  {request.url.host}: HTTP {response.status_code}, nouvel essai dans {delay:.2f}s")
+
+            self.stats.retry()
+            attempt += 1
+            time.sleep(delay)
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Retourne l'état des connexions du pool httpcore sous-jacent."""
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        return {
+            "connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "max_connections": Config.HTTP_MAX_CONNECTIONS,
+        }
+
+    def close(self):
+        self._transport.close()
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """Adaptateur requests qui alimente les métriques du pool et le disjoncteur."""
+
+    def __init__(self, stats: PoolStats, breaker: CircuitBreaker, **kwargs):
+        self.stats = stats
+        self.breaker = breaker
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+        left = time_left()
+        try:
+            response = self._send_within_deadline(request, left, **kwargs)
+        except requests.exceptions.Timeout:
+            # Timeout dû au délai de la requête: non imputé au service
+            if left is not None and left < Config.HTTP_READ_TIMEOUT:
+                self.breaker.record_neutral()
+            else:
+                self.breaker.record_failure()
+            raise
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_neutral()
+            raise
+        if response.status_code >= 500 or response.status_code == 408:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _send_within_deadline(self, request, left: Optional[float], **kwargs):
+        if left is not None:
+            if left <= 0:
+                raise requests.exceptions.Timeout("Délai de la requête écoulé", request=request)
+            timeout = kwargs.get("timeout")
+            if isinstance(timeout, tuple):
+                kwargs["timeout"] = tuple(left if t is None else min(t, left) for t in timeout)
+            else:
+                kwargs["timeout"] = left if timeout is None else min(timeout, left)
+        self.stats.start()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            self.stats.finish(failed=True)
+            raise
+        self.stats.finish(failed=response.status_code >= 500)
+        return response
+
+
+def _retry_policy() -> Retry:
+    """Relances des sessions requests (les clients httpx lisent Config à chaque requête)."""
+    return Retry(
+        total=Config.HTTP_MAX_RETRIES,
+        backoff_factor=Config.HTTP_BACKOFF_BASE,
+        backoff_max=Config.HTTP_BACKOFF_MAX,
+        status_forcelist=RETRYABLE_STATUS_CODES,
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+
+
+class HTTPPoolManager:
+    """Registre des pools HTTP partagés, un par hôte amont."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, httpx.Client] = {}
+        self._sessions: Dict[str, requests.Session] = {}
+        self._stats: Dict[str, PoolStats] = {}
+        self._http2 = _http2_available()
+
+    def _stats_for(self, host: str) -> PoolStats:
+        if host not in self._stats:
+            self._stats[host] = PoolStats()
+        return self._stats[host]
+
+    def get_client(self, base_url: str) -> httpx.Client:
+        """Retourne le client httpx partagé pour l'hôte de base_url."""
+        host = urlsplit(base_url).netloc
+        with self._lock:
+            client = self._clients.get(host)
+            if client is None:
+                transport = RetryingTransport(
+                    self._stats_for(host), http2=self._http2, breaker=get_breaker(upstream_name(base_url))
+                )
+                client = httpx.Client(transport=transport, timeout=http_timeout())
+                self._clients[host] = client
+                logger.info(f"🔌 Pool HTTP créé pour {host} (HTTP/2: {self._http2}, max {Config.HTTP_MAX_CONNECTIONS} connexions)")
+            return client
+
+    def get_session(self, base_url: str) -> requests.Session:
+        """Retourne la session requests partagée pour l'hôte de base_url."""
+        host = urlsplit(base_url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                adapter = CountingHTTPAdapter(
+                    self._stats_for(host),
+                    get_breaker(upstream_name(base_url)),
+                    pool_connections=1,
+                    pool_maxsize=Config.HTTP_MAX_CONNECTIONS,
+                    max_retries=_retry_policy(),
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+                logger.info(f"🔌 Session HTTP créée pour {host} (max {Config.HTTP_MAX_CONNECTIONS} connexions)")
+            return session
+
+    def reload_retry_policy(self):
+        """Applique HTTP_MAX_RETRIES et HTTP_BACKOFF_* aux sessions existantes."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            for adapter in session.adapters.values():
+                adapter.max_retries = _retry_policy()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Retourne les métriques d'utilisation de chaque pool."""
+        with self._lock:
+            result = {host: stats.as_dict() for host, stats in self._stats.items()}
+            for host, client in self._clients.items():
+                transport = client._transport
+                if isinstance(transport, RetryingTransport):
+                    result[host].update(transport.connection_stats())
+            return result
+
+    def close(self):
+        """Ferme toutes les connexions ouvertes."""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            for session in self._sessions.values():
+                session.close()
+            self._clients.clear()
+            self._sessions.clear()
+
+
+# Instance globale singleton
+_pool_manager = None
+_pool_manager_lock = threading.Lock()
+
+
+def get_pool_manager() -> HTTPPoolManager:
+    """Retourne l'instance singleton du gestionnaire de pools."""
+    global _pool_manager
+    if _pool_manager is None:
+        with _pool_manager_lock:
+            if _pool_manager is None:
+                _pool_manager = HTTPPoolManager()
+    return _pool_manager
+
+
+def get_http_client(base_url: str) -> httpx.Client:
+    """Raccourci: client httpx partagé pour un hôte amont."""
+    return get_pool_manager().get_client(base_url)
+
+
+def get_requests_session(base_url: str) -> requests.Session:
+    """Raccourci: session requests partagée pour un hôte amont."""
+    return get_pool_manager().get_session(base_url)
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Raccourci: métriques d'utilisation des pools HTTP."""
+    return get_pool_manager().stats()
+
+
+def pinecone_index_kwargs() -> Dict[str, Any]:
+    """Paramètres de pool pour l'index Pinecone (qui gère son propre pool urllib3)."""
+    return {"connection_pool_maxsize": Config.HTTP_MAX_CONNECTIONS}
+
+
+# Compteurs monotones de PoolStats; les autres statistiques (en cours, connexions) sont des jauges
+POOL_COUNTERS = frozenset({"requests_total", "retries_total", "errors_total"})
+
+
+def _collect_pool_metrics() -> List[str]:
+    """Expose l'utilisation des pools HTTP (compteurs de requêtes, jauges d'occupation) pour Prometheus."""
+    by_name: Dict[str, List[str]] = {}
+    for host, stats in get_pool_stats().items():
+        for name, value in stats.items():
+            by_name.setdefault(name, []).append(f'rag_http_pool_{name}{{host="{host}"}} {value}')
+
+    lines = []
+    for name, samples in by_name.items():
+        lines.append(f"# TYPE rag_http_pool_{name} {'counter' if name in POOL_COUNTERS else 'gauge'}")
+        lines.extend(samples)
+    return lines
+
+
+REGISTRY.register_collector(_collect_pool_metrics)
+
+
+def _reload_retry_policy(changed: Set[str]):
+    if _pool_manager is not None:
+        _pool_manager.reload_retry_policy()
+
+
+on_config_change({"HTTP_MAX_RETRIES", "HTTP_BACKOFF_BASE", "HTTP_BACKOFF_MAX"}, _reload_retry_policy)
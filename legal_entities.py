@@ -0,0 +1,172 @@
+"""
+Extraction des entités juridiques d'un texte en une seule passe.
+
+Une seule expression compilée (alternative de groupes nommés) reconnaît les
+plages d'articles, les articles, les codes et les concepts juridiques lors
+d'un unique balayage du texte. Le résultat est structuré (type, valeur
+normalisée, position) et mémorisé par texte: l'expansion de requêtes, la
+recherche Pinecone, le reranker et le contexte de session réutilisent la
+même analyse d'une requête.
+"""
+
+import re
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARTICLE = "article"
+RANGE = "range"
+CODE = "code"
+CONCEPT = "concept"
+
+# Graphie (minuscules) → (nom affiché, famille): toutes les graphies d'un code pointent vers une clé
+CODES: Dict[str, Tuple[str, str]] = {
+    "code civil du québec": ("Code civil du Québec", "ccq"),
+    "c.c.q.": ("C.c.Q.", "ccq"),
+    "ccq": ("CCQ", "ccq"),
+    "code de procédure civile": ("Code de procédure civile", "cpc"),
+    "c.p.c.": ("C.p.c.", "cpc"),
+    "cpc": ("CPC", "cpc"),
+    "code criminel": ("Code criminel", "ccr"),
+    "c.cr.": ("C.cr.", "ccr"),
+    "charte des droits et libertés": ("Charte des droits et libertés", "charte"),
+}
+
+CONCEPTS = (
+    "contrat", "responsabilité", "divorce", "testament",
+    "succession", "bail", "hypothèque", "servitude",
+    "prescription", "délai", "recours", "dommages",
+)
+
+# Au-delà, une plage n'est pas dépliée article par article
+MAX_RANGE_EXPANSION = 50
+
+_ARTICLE_WORD = r"(?:articles?|art\.?)\s*"
+
+
+def _alternatives(words) -> str:
+    # Les graphies les plus longues d'abord, pour que l'alternative la préfère
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+# Toute entité commence en début de mot par l'une de ces lettres: les autres
+# positions sont écartées avant d'essayer les alternatives
+_FIRST_LETTERS = "".join(sorted({w[0] for w in (*CODES, *CONCEPTS, "art")}))
+
+_ENTITY_PATTERN = (
+    rf"\b(?=[{_FIRST_LETTERS}])(?:"
+    rf"(?P<range>{_ARTICLE_WORD}(?P<first>\d+)\s*(?:à|au|-)\s*(?P<last>\d+))"
+    rf"|(?P<article>{_ARTICLE_WORD}(?P<num>\d+(?:\.\d+)?))"
+    rf"|(?P<code>(?:{_alternatives(CODES)})(?!\w))"
+    # Les concepts sont des débuts de mots (contrats, délais, bailleur...)
+    rf"|(?P<concept>{_alternatives(CONCEPTS)})"
+    r")"
+)
+
+# Motifs en minuscules: le texte est mis en minuscules une fois, sauf si cela
+# change sa longueur (positions décalées), auquel cas la variante IGNORECASE sert
+_ENTITY_RE = re.compile(_ENTITY_PATTERN)
+_ENTITY_RE_IGNORECASE = re.compile(_ENTITY_PATTERN, re.IGNORECASE)
+
+_CODE_RE = re.compile(rf"(?<!\w)(?:{_alternatives(CODES)})(?!\w)", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class LegalEntity:
+    """Entité reconnue: type, valeur normalisée, texte d'origine et position."""
+
+    kind: str
+    value: str  # numéro d'article, "premier-dernier", famille de code ou concept
+    text: str
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class ParsedText:
+    """Analyse d'un texte, partagée entre les étapes du pipeline (immuable)."""
+
+    text: str
+    entities: Tuple[LegalEntity, ...]
+
+    def of_kind(self, kind: str) -> List[LegalEntity]:
+        return [e for e in self.entities if e.kind == kind]
+
+    @property
+    def first_article(self) -> Optional[str]:
+        """Premier article cité seul (les plages ne comptent pas), ex: "1457"."""
+        for entity in self.entities:
+            if entity.kind == ARTICLE:
+                return entity.value
+        return None
+
+    @property
+    def article_numbers(self) -> List[str]:
+        """Articles cités, plages dépliées (bornes seules au-delà de MAX_RANGE_EXPANSION)."""
+        numbers: List[str] = []
+        for entity in self.entities:
+            if entity.kind == ARTICLE:
+                numbers.append(entity.value)
+            elif entity.kind == RANGE:
+                first, last = (int(n) for n in entity.value.split("-"))
+                if 0 <= last - first <= MAX_RANGE_EXPANSION:
+                    numbers.extend(str(n) for n in range(first, last + 1))
+                else:
+                    numbers.extend((str(first), str(last)))
+        return list(dict.fromkeys(numbers))
+
+    @property
+    def codes(self) -> List[str]:
+        """Familles de codes citées (ccq, cpc, ccr, charte)."""
+        return list(dict.fromkeys(e.value for e in self.entities if e.kind == CODE))
+
+    def as_strings(self) -> List[str]:
+        """Format historique de extract_legal_entities: "article N", noms de codes, concepts."""
+        strings: List[str] = []
+        for entity in self.entities:
+            if entity.kind == ARTICLE:
+                strings.append(f"article {entity.value}")
+            elif entity.kind == RANGE:
+                first, last = entity.value.split("-")
+                strings.extend((f"article {first}", f"article {last}"))
+        strings.extend(CODES[e.text.lower()][0] for e in self.entities if e.kind == CODE)
+        strings.extend(e.value for e in self.entities if e.kind == CONCEPT)
+        return list(dict.fromkeys(strings))
+
+
+def _entity(match: "re.Match", text: str) -> LegalEntity:
+    kind = match.lastgroup
+    start, end = match.span(kind)
+    if kind == RANGE:
+        value = f"{match.group('first')}-{match.group('last')}"
+    elif kind == ARTICLE:
+        value = match.group("num")
+    elif kind == CODE:
+        value = CODES[match.group(kind).lower()][1]
+    else:
+        value = match.group(kind).lower()
+    return LegalEntity(kind, value, text[start:end], start, end)
+
+
+def scan(text: str) -> ParsedText:
+    """Analyse un texte en un seul balayage, sans mémorisation (ex: texte de chunk)."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        matches = _ENTITY_RE.finditer(lowered)
+    else:
+        matches = _ENTITY_RE_IGNORECASE.finditer(text)
+    return ParsedText(text, tuple(_entity(m, text) for m in matches))
+
+
+@lru_cache(maxsize=4096)
+def parse_legal_entities(text: str) -> ParsedText:
+    """Analyse mémorisée d'une question ou d'une requête (une seule analyse par texte)."""
+    return scan(text)
+
+
+def code_families(text: str) -> List[str]:
+    """Familles de codes citées dans un texte (non mémorisé, pour les chunks)."""
+    return list(dict.fromkeys(CODES[m.group(0).lower()][1] for m in _CODE_RE.finditer(text)))
@@ -0,0 +1,437 @@
+"""
+Index vectoriel local du corpus, en alternative à Pinecone.
+
+Les vecteurs sont stockés dans des fichiers .npy ouverts en memmap: les pages
+sont partagées par tous les workers via le cache du système au lieu d'être
+copiées dans chaque processus. La recherche balaie une représentation
+compacte, puis les meilleurs candidats sont re-notés exactement sur les
+vecteurs float32:
+
+- "none": produit scalaire exact sur les vecteurs float32 (référence);
+- "int8": quantification scalaire par dimension (4x moins d'octets balayés);
+- "pq": quantification par produit (m sous-vecteurs codés sur un octet,
+  ex: 96 octets par vecteur au lieu de 6144 en 1536 dimensions).
+
+Recherche en deux passes (first_pass_dim > 0, remplace la quantification):
+le premier passage balaie les vecteurs tronqués à leurs premières
+dimensions puis renormalisés (les embeddings text-embedding-3 concentrent
+l'essentiel de l'information en tête), le second re-note la liste courte en
+dimension complète. Les vecteurs tronqués sont dérivés de vectors.npy à la
+première ouverture (et de nouveau si l'index a été reconstruit depuis).
+
+LocalVectorIndex.query reprend la signature et le format de réponse de
+Index.query de Pinecone (top_k, filter, include_metadata, include_values).
+
+Construction (export de l'index Pinecone configuré):
+    python local_index.py --out local_index
+    python local_index.py --out local_index --pq-subvectors 0   # sans PQ
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+NONE = "none"
+INT8 = "int8"
+PQ = "pq"
+QUANTIZATIONS = (NONE, INT8, PQ)
+
+MANIFEST = "manifest.json"
+RECORDS = "records.jsonl"
+VECTORS = "vectors.npy"
+INT8_CODES = "int8_codes.npy"
+INT8_SCALES = "int8_scales.npy"
+PQ_CODES = "pq_codes.npy"
+PQ_CODEBOOKS = "pq_codebooks.npy"
+TRUNCATED_VECTORS = "vectors_d{dim}.npy"
+
+# Lignes traitées par bloc lors d'un balayage: borne la mémoire temporaire d'une requête
+# et garde le bloc converti en float32 dans le cache du processeur
+SCAN_BLOCK_ROWS = 4096
+PQ_CENTROIDS = 256
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions des k meilleurs scores, par score décroissant."""
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+# ---------------------------------------------------------------------------
+# Quantification
+# ---------------------------------------------------------------------------
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantification scalaire par dimension: code int8 et pas de quantification."""
+    scales = np.abs(vectors).max(axis=0) / 127
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin |x - c|² = argmax (2 x·c - |c|²)
+    return np.argmax(data @ centroids.T * 2 - (centroids ** 2).sum(axis=1), axis=1)
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = data[rng.choice(len(data), min(k, len(data)), replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroids(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=len(centroids))
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    if len(centroids) < k:
+        # Corpus minuscule: centroïdes inutilisés, jamais choisis à l'encodage
+        centroids = np.vstack([centroids, np.repeat(centroids[:1], k - len(centroids), axis=0)])
+    return centroids
+
+
+def train_pq(
+    vectors: np.ndarray, subvectors: int, iterations: int = 10, sample: int = 20000, seed: int = 0
+) -> np.ndarray:
+    """Entraîne les dictionnaires PQ (k-means par sous-espace): tableau (m, 256, dim / m)."""
+    dim = vectors.shape[1]
+    if dim % subvectors:
+        raise ValueError(f"La dimension {dim} n'est pas divisible par {subvectors} sous-vecteurs")
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), min(sample, len(vectors)), replace=False)
+    training = np.asarray(vectors[np.sort(rows)], dtype=np.float32)
+    width = dim // subvectors
+    return np.stack([
+        _kmeans(training[:, j * width:(j + 1) * width], PQ_CENTROIDS, iterations, rng)
+        for j in range(subvectors)
+    ]).astype(np.float32)
+
+
+def encode_pq(vectors: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """Code PQ de chaque vecteur: indice du centroïde le plus proche par sous-espace (uint8)."""
+    subvectors, _, width = codebooks.shape
+    codes = np.empty((len(vectors), subvectors), dtype=np.uint8)
+    for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+        for j in range(subvectors):
+            codes[start:start + len(block), j] = _nearest_centroids(block[:, j * width:(j + 1) * width], codebooks[j])
+    return codes
+
+
+def truncate_vectors(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Premières dimensions de chaque vecteur, renormalisées (embeddings « Matryoshka »)."""
+    return _normalize(np.asarray(vectors[..., :dim], dtype=np.float32))
+
+
+def _open_truncated(path: str, vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Ouvre (en memmap) les vecteurs tronqués à dim, en les écrivant au premier usage."""
+    target = os.path.join(path, TRUNCATED_VECTORS.format(dim=dim))
+    if os.path.exists(target):
+        existing = np.load(target, mmap_mode="r")
+        # Un fichier plus ancien que vectors.npy a été dérivé d'un index reconstruit depuis
+        if existing.shape == (len(vectors), dim) and os.path.getmtime(target) >= os.path.getmtime(os.path.join(path, VECTORS)):
+            return existing
+        del existing
+        logger.warning(f"⚠️  {target} ne correspond plus à {VECTORS}: vecteurs tronqués regénérés")
+
+    truncated = np.lib.format.open_memmap(
+        f"{target}.{os.getpid()}.tmp", mode="w+", dtype=np.float32, shape=(len(vectors), dim)
+    )
+    for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+        truncated[start:start + SCAN_BLOCK_ROWS] = truncate_vectors(vectors[start:start + SCAN_BLOCK_ROWS], dim)
+    truncated.flush()
+    del truncated
+    # Remplacement atomique: plusieurs workers peuvent le dériver en même temps
+    os.replace(f"{target}.{os.getpid()}.tmp", target)
+    logger.info(f"✅ Vecteurs tronqués à {dim} dimensions écrits dans {target}")
+    return np.load(target, mmap_mode="r")
+
+
+# ---------------------------------------------------------------------------
+# Construction
+# ---------------------------------------------------------------------------
+
+def build_index(
+    out_dir: str,
+    ids: Sequence[str],
+    vectors: np.ndarray,
+    metadata: Sequence[Dict[str, Any]],
+    pq_subvectors: int = 96,
+    pq_iterations: int = 10,
+) -> Dict[str, Any]:
+    """Écrit un index local (float32 normalisés, codes int8 et, si pq_subvectors > 0, codes PQ)."""
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    if len(ids) != len(vectors) or len(metadata) != len(vectors):
+        raise ValueError("ids, vecteurs et métadonnées doivent avoir la même longueur")
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    # Les vecteurs tronqués dérivés d'un index précédent ne correspondent plus
+    for stale in glob.glob(os.path.join(out_dir, TRUNCATED_VECTORS.format(dim="*"))):
+        os.remove(stale)
+
+    np.save(os.path.join(out_dir, VECTORS), vectors)
+    codes, scales = quantize_int8(vectors)
+    np.save(os.path.join(out_dir, INT8_CODES), codes)
+    np.save(os.path.join(out_dir, INT8_SCALES), scales)
+    if pq_subvectors > 0:
+        codebooks = train_pq(vectors, pq_subvectors, pq_iterations)
+        np.save(os.path.join(out_dir, PQ_CODEBOOKS), codebooks)
+        np.save(os.path.join(out_dir, PQ_CODES), encode_pq(vectors, codebooks))
+
+    with open(os.path.join(out_dir, RECORDS), "w", encoding="utf-8") as f:
+        for vector_id, meta in zip(ids, metadata):
+            f.write(json.dumps({"id": vector_id, "metadata": meta}, ensure_ascii=False) + "\n")
+
+    manifest = {
+        "count": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "model": Config.EMBEDDING_MODEL,
+        "pq_subvectors": pq_subvectors if pq_subvectors > 0 else None,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"✅ Index local écrit dans {out_dir}: {len(vectors)} vecteurs en {time.perf_counter() - started:.1f} s")
+    return manifest
+
+
+def export_from_pinecone(out_dir: str, namespace: str = "", pq_subvectors: int = 96, batch_size: int = 100):
+    """Exporte l'index Pinecone configuré (list + fetch, index serverless) vers un index local."""
+    from pinecone import Pinecone
+
+    pc = Pinecone(api_key=Config.PINECONE_API_KEY)
+    index = pc.Index(host=Config.PINECONE_HOST) if Config.PINECONE_HOST else pc.Index(Config.PINECONE_INDEX_NAME)
+
+    ids: List[str] = []
+    vectors: List[List[float]] = []
+    metadata: List[Dict[str, Any]] = []
+    for id_page in index.list(namespace=namespace):
+        for start in range(0, len(id_page), batch_size):
+            fetched = index.fetch(ids=list(id_page[start:start + batch_size]), namespace=namespace)
+            for vector_id, vector in fetched.vectors.items():
+                ids.append(vector_id)
+                vectors.append(vector.values)
+                metadata.append(dict(vector.metadata or {}))
+        logger.info(f"   {len(ids)} vecteurs exportés...")
+    return build_index(out_dir, ids, np.asarray(vectors, dtype=np.float32), metadata, pq_subvectors)
+
+
+# ---------------------------------------------------------------------------
+# Recherche
+# ---------------------------------------------------------------------------
+
+class LocalVectorIndex:
+    """Index local en memmap, interrogeable comme un index Pinecone."""
+
+    def __init__(self, path: str, quantization: str = INT8, rescore: int = 100, first_pass_dim: int = 0):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantification inconnue: {quantization} (attendu: {', '.join(QUANTIZATIONS)})")
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest["model"] != Config.EMBEDDING_MODEL:
+            logger.warning(f"⚠️  Index local construit avec {self.manifest['model']}, requêtes encodées avec {Config.EMBEDDING_MODEL}")
+
+        self.path = path
+        self.quantization = quantization
+        self.rescore = rescore
+        self.vectors = np.load(os.path.join(path, VECTORS), mmap_mode="r")
+        self.codes: Optional[np.ndarray] = None
+        self.first_pass: Optional[np.ndarray] = None
+        if first_pass_dim > 0:
+            if first_pass_dim >= self.manifest["dim"]:
+                raise ValueError(f"Dimension du premier passage ({first_pass_dim}) ≥ dimension de l'index ({self.manifest['dim']})")
+            self.first_pass = _open_truncated(path, self.vectors, first_pass_dim)
+        elif quantization == INT8:
+            self.codes = np.load(os.path.join(path, INT8_CODES), mmap_mode="r")
+            self.scales = np.load(os.path.join(path, INT8_SCALES))
+        elif quantization == PQ:
+            if not self.manifest.get("pq_subvectors"):
+                raise ValueError(f"L'index local {path} a été construit sans PQ")
+            self.codes = np.load(os.path.join(path, PQ_CODES), mmap_mode="r")
+            self.codebooks = np.load(os.path.join(path, PQ_CODEBOOKS))
+
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        with open(os.path.join(path, RECORDS), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.metadata.append(record["metadata"])
+
+        # Champ de métadonnées → valeur → lignes (construit au premier filtre sur ce champ)
+        self._field_rows: Dict[str, Dict[Any, np.ndarray]] = {}
+        self._field_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def mode(self) -> str:
+        """Représentation balayée: quantification, ou "two_stage_d<dim>" en deux passes."""
+        return f"two_stage_d{self.first_pass.shape[1]}" if self.first_pass is not None else self.quantization
+
+    @property
+    def exact(self) -> bool:
+        """Vrai si le balayage donne déjà les scores exacts (pas de re-notation)."""
+        return self.first_pass is None and self.quantization == NONE
+
+    def memory_stats(self) -> Dict[str, int]:
+        """Octets balayés par requête et octets des vecteurs float32 (re-notation)."""
+        scanned = next(a for a in (self.first_pass, self.codes, self.vectors) if a is not None)
+        return {"scan_bytes": int(scanned.nbytes), "float32_bytes": int(self.vectors.nbytes)}
+
+    # -- Filtres ------------------------------------------------------------
+
+    def _rows_for(self, field: str) -> Dict[Any, np.ndarray]:
+        with self._field_lock:
+            rows = self._field_rows.get(field)
+            if rows is None:
+                grouped: Dict[Any, List[int]] = {}
+                for row, meta in enumerate(self.metadata):
+                    value = meta.get(field)
+                    # Comme Pinecone, un champ liste correspond à chacune de ses valeurs
+                    for item in (value if isinstance(value, list) else [value]):
+                        if item is not None:
+                            grouped.setdefault(item, []).append(row)
+                rows = self._field_rows[field] = {
+                    value: np.asarray(members, dtype=np.int64) for value, members in grouped.items()
+                }
+            return rows
+
+    def _filter_rows(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Lignes satisfaisant un filtre Pinecone ($eq, $in, égalité simple), None si aucun filtre."""
+        if not filter:
+            return None
+        selected: Optional[np.ndarray] = None
+        for field, condition in filter.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            by_value = self._rows_for(field)
+            for op, operand in condition.items():
+                if op == "$eq":
+                    values = [operand]
+                elif op == "$in":
+                    values = list(operand)
+                else:
+                    raise ValueError(f"Opérateur de filtre non pris en charge par l'index local: {op}")
+                parts = [by_value[v] for v in values if v in by_value]
+                rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+                selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+        return selected
+
+    # -- Scores -------------------------------------------------------------
+
+    def _block_scores(self, query: np.ndarray, start: int, stop: int, rows: Optional[np.ndarray]) -> np.ndarray:
+        take = slice(start, stop) if rows is None else rows[start:stop]
+        if self.first_pass is not None:
+            return self.first_pass[take] @ query
+        if self.quantization == INT8:
+            # Le pas de quantification est reporté sur la requête: un seul produit matrice-vecteur
+            return self.codes[take].astype(np.float32) @ (query * self.scales)
+        if self.quantization == PQ:
+            subvectors, _, width = self.codebooks.shape
+            # Table des produits scalaires requête/centroïdes, puis somme des entrées désignées par les codes
+            table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(subvectors, width))
+            return table[np.arange(subvectors), self.codes[take]].sum(axis=1)
+        return self.vectors[take] @ query
+
+    def _scan(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        total = len(self) if rows is None else len(rows)
+        return np.concatenate([
+            self._block_scores(query, start, min(start + SCAN_BLOCK_ROWS, total), rows)
+            for start in range(0, total, SCAN_BLOCK_ROWS)
+        ]) if total else np.empty(0, dtype=np.float32)
+
+    def search(
+        self, vector: Sequence[float], top_k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[int, float]]:
+        """(ligne, score cosinus) des top_k vecteurs les plus proches."""
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        rows = self._filter_rows(filter)
+        if self.first_pass is not None:
+            scores = self._scan(truncate_vectors(query, self.first_pass.shape[1]), rows)
+        else:
+            scores = self._scan(query, rows)
+
+        candidates = _top_rows(scores, top_k if self.exact else max(top_k, self.rescore))
+        candidate_rows = candidates if rows is None else rows[candidates]
+        if self.exact:
+            return [(int(r), float(s)) for r, s in zip(candidate_rows, scores[candidates])]
+
+        # Re-notation exacte des candidats (lecture des seules lignes utiles du memmap, dans l'ordre)
+        candidate_rows = np.sort(candidate_rows)
+        exact = self.vectors[candidate_rows] @ query
+        best = _top_rows(exact, top_k)
+        return [(int(candidate_rows[i]), float(exact[i])) for i in best]
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        namespace: str = "",
+        **_: Any,
+    ) -> Dict[str, Any]:
+        """Même interface et même format de réponse que Index.query de Pinecone."""
+        matches = []
+        for row, score in self.search(vector, top_k, filter):
+            match: Dict[str, Any] = {"id": self.ids[row], "score": score}
+            if include_metadata:
+                match["metadata"] = self.metadata[row]
+            if include_values:
+                match["values"] = self.vectors[row].tolist()
+            matches.append(match)
+        return {"matches": matches, "namespace": namespace}
+
+
+def open_local_index() -> LocalVectorIndex:
+    """Ouvre l'index local configuré (LOCAL_INDEX_DIR, LOCAL_INDEX_QUANTIZATION, LOCAL_INDEX_FIRST_PASS_DIM)."""
+    index = LocalVectorIndex(
+        Config.LOCAL_INDEX_DIR, Config.LOCAL_INDEX_QUANTIZATION.lower(), Config.LOCAL_INDEX_RESCORE,
+        Config.LOCAL_INDEX_FIRST_PASS_DIM,
+    )
+    stats = index.memory_stats()
+    logger.info(
+        f"✅ Index local chargé - {len(index)} vecteurs, mode {index.mode}, "
+        f"{stats['scan_bytes'] / 1e6:.1f} Mo balayés par requête (float32: {stats['float32_bytes'] / 1e6:.1f} Mo)"
+    )
+    return index
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Exporte l'index Pinecone vers un index vectoriel local")
+    parser.add_argument("--out", default=Config.LOCAL_INDEX_DIR, help="Répertoire de l'index local")
+    parser.add_argument("--namespace", default=Config.PINECONE_NAMESPACE)
+    parser.add_argument("--pq-subvectors", type=int, default=96, help="Sous-vecteurs PQ (0 = pas de PQ)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    manifest = export_from_pinecone(args.out, args.namespace, args.pq_subvectors)
+    print(json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+Métriques légères (latence par étape, compteurs) exportées au format Prometheus.
+
+Les durées sont gardées dans une fenêtre glissante par série; les quantiles
+(p50/p95/p99) ne sont calculés qu'à l'export, ce qui garde le coût sur le
+chemin de la requête à un append sous verrou.
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = [
+        f'{k}="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in pairs
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    """Compteur monotone avec étiquettes."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, value: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Summary:
+    """Distribution de durées avec quantiles sur une fenêtre glissante."""
+
+    def __init__(self, name: str, help_text: str, window: int):
+        self.name = name
+        self.help = help_text
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[LabelKey, Deque[float]] = {}
+        self._count: Dict[LabelKey, int] = {}
+        self._sum: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+                self._count[key] = 0
+                self._sum[key] = 0.0
+            samples.append(value)
+            self._count[key] += 1
+            self._sum[key] += value
+
+    def quantiles(self, **labels) -> Dict[float, float]:
+        with self._lock:
+            samples = sorted(self._samples.get(_label_key(labels), ()))
+        return _compute_quantiles(samples)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} summary"]
+        with self._lock:
+            snapshot = [
+                (key, sorted(samples), self._count[key], self._sum[key])
+                for key, samples in self._samples.items()
+            ]
+        for key, samples, count, total in sorted(snapshot, key=lambda item: item[0]):
+            for q, v in _compute_quantiles(samples).items():
+                lines.append(f"{self.name}{_format_labels(key, {'quantile': str(q)})} {v:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:.6f}")
+        return lines
+
+
+def _compute_quantiles(sorted_samples: List[float]) -> Dict[float, float]:
+    if not sorted_samples:
+        return {}
+    n = len(sorted_samples)
+    return {q: sorted_samples[min(n - 1, int(q * n))] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    """Registre des métriques du processus."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def summary(self, name: str, help_text: str) -> Summary:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Summary(name, help_text, Config.METRICS_WINDOW)
+            return self._metrics[name]
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        """Ajoute une fonction qui produit des lignes Prometheus à l'export."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                logger.error(f"❌ Erreur collecteur de métriques: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.summary("rag_stage_duration_seconds", "Durée de chaque étape du pipeline RAG")
+QUERIES = REGISTRY.counter("rag_queries_total", "Requêtes traitées par résultat")
+LLM_CALLS = REGISTRY.counter("rag_llm_calls_total", "Appels LLM par modèle")
+LLM_TOKENS = REGISTRY.counter("rag_llm_tokens_total", "Tokens LLM consommés par modèle et type")
+CACHE_REQUESTS = REGISTRY.counter("rag_cache_requests_total", "Consultations de cache par cache et résultat")
+SEARCHES = REGISTRY.counter("rag_retrieval_searches_total", "Recherches vectorielles lancées par issue")
+
+
+def wall_time(intervals: List[Tuple[float, float]]) -> float:
+    """Durée couverte par des intervalles (début, fin), chevauchements comptés une fois."""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class RequestTrace:
+    """
+    Durées, compteurs et attributs d'une requête. La durée d'une étape est son
+    temps réel: des appels parallèles (ex: embeddings et Pinecone des requêtes
+    d'expansion) ne sont comptés qu'une fois sur leur période commune.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings: Dict[str, List[Tuple[float, float]]] = {}
+        self.counters: Dict[str, float] = {}
+        self.attributes: Dict[str, Any] = {}
+
+    def add_timing(self, stage: str, start: float, end: float):
+        with self._lock:
+            self.timings.setdefault(stage, []).append((start, end))
+
+    def incr(self, name: str, value: float = 1.0):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def annotate(self, name: str, value: Any):
+        """Attache une valeur à la requête (ex: requêtes générées), pour le journal structuré."""
+        with self._lock:
+            self.attributes[name] = value
+
+    def timings_ms(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: round(wall_time(intervals) * 1000, 1) for stage, intervals in self.timings.items()}
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "rag_request_trace", default=None
+)
+
+
+@contextmanager
+def trace_request() -> Iterator[RequestTrace]:
+    """Active une trace pour la requête courante (propagée à asyncio.to_thread)."""
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    """Retourne la trace active, ou None hors requête."""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Mesure la durée d'une étape du pipeline."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        STAGE_LATENCY.observe(end - start, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_timing(stage, start, end)
+
+
+def record_cache(cache: str, hit: bool):
+    """Enregistre un accès cache (hit ou miss)."""
+    outcome = "hit" if hit else "miss"
+    CACHE_REQUESTS.inc(cache=cache, outcome=outcome)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.incr(f"cache_{cache}_{outcome}")
+
+
+def llm_usage(response) -> Tuple[str, Dict[str, Any]]:
+    """Modèle et tokens consommés d'une réponse LLM (LLMResult LangChain)."""
+    llm_output = response.llm_output or {}
+    model = llm_output.get("model_name", "inconnu")
+    usage = dict(llm_output.get("token_usage") or {})
+
+    if not usage:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                metadata = getattr(message, "usage_metadata", None) or {}
+                usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + metadata.get("input_tokens", 0)
+                usage["completion_tokens"] = usage.get("completion_tokens", 0) + metadata.get("output_tokens", 0)
+
+    # Tokens servis depuis le cache de préfixe du fournisseur, si rapporté
+    details = usage.get("prompt_tokens_details") or {}
+    if details.get("cached_tokens"):
+        usage["cached_prompt_tokens"] = details["cached_tokens"]
+    return model, usage
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Callback LangChain qui compte les appels et tokens LLM."""
+
+    def __init__(self, role: str):
+        self.role = role
+
+    def on_llm_end(self, response, **kwargs):
+        model, usage = llm_usage(response)
+        LLM_CALLS.inc(model=model, role=self.role)
+        trace = _current_trace.get()
+        for kind in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens"):
+            tokens = usage.get(kind) or 0
+            if tokens:
+                LLM_TOKENS.inc(tokens, model=model, role=self.role, kind=kind)
+                if trace is not None:
+                    trace.incr(kind, tokens)
+        if trace is not None:
+            trace.incr("llm_calls")
+
+
+def render_prometheus() -> str:
+    """Retourne toutes les métriques au format texte Prometheus."""
+    return REGISTRY.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _write_metrics_file(path: str, interval: float):
+    while True:
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(render_prometheus())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"❌ Erreur écriture métriques: {e}")
+        time.sleep(interval)
+
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def start_metrics_exporter() -> bool:
+    """Démarre l'export (endpoint HTTP et/ou fichier) une seule fois par processus."""
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return False
+        _exporter_started = True
+
+    if Config.METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", Config.METRICS_PORT), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"📈 Métriques Prometheus sur http://0.0.0.0:{Config.METRICS_PORT}/metrics")
+        except OSError as e:
+            logger.error(f"❌ Impossible d'ouvrir le port de métriques {Config.METRICS_PORT}: {e}")
+
+    if Config.METRICS_FILE:
+        threading.Thread(
+            target=_write_metrics_file,
+            args=(Config.METRICS_FILE, Config.METRICS_FILE_INTERVAL),
+            name="metrics-file",
+            daemon=True,
+        ).start()
+        logger.info(f"📈 Métriques Prometheus écrites dans {Config.METRICS_FILE}")
+
+    return True
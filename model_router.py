@@ -0,0 +1,196 @@
+"""
+Routage des appels LLM par complexité de la question.
+
+Chaque appel d'expansion et de synthèse reçoit un score de complexité (0-1)
+calculé sans appel supplémentaire:
+- question: articles et codes cités (analyse de legal_entities), nombre de
+  concepts, longueur, marqueurs de raisonnement (comparaison, exceptions...);
+- synthèse seulement: confiance de la recherche (meilleur score de
+  similarité), taille du contexte, recours au web.
+
+Sous ROUTER_THRESHOLD, l'appel va au petit modèle (ex: lecture d'un article
+précis bien retrouvé); au-delà, au grand modèle. Chaque décision est comptée
+et journalisée avec sa latence et son coût estimé (MODEL_PRICES) par niveau.
+Sans MODEL_ROUTING, tout va au grand modèle (décisions et coûts mesurés quand
+même, comme référence).
+"""
+
+import re
+import time
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import Config
+from legal_entities import CONCEPT, parse_legal_entities
+from metrics import REGISTRY, current_trace, llm_usage
+
+logger = logging.getLogger(__name__)
+
+SMALL = "small"
+LARGE = "large"
+
+EXPANSION = "expansion"
+SYNTHESIS = "synthesis"
+
+DECISIONS = REGISTRY.counter("rag_router_decisions_total", "Décisions de routage par étape et niveau de modèle")
+TIER_LATENCY = REGISTRY.summary("rag_router_llm_duration_seconds", "Durée des appels LLM par étape et niveau de modèle")
+TIER_COST = REGISTRY.counter("rag_router_cost_usd_total", "Coût estimé des appels LLM (USD) par étape et niveau")
+
+# Questions qui demandent un raisonnement (plutôt qu'une simple lecture de texte);
+# hypothèse/hypothétique mais pas hypothèque, et pas les notions ordinaires comme "recours"
+_REASONING_RE = re.compile(
+    r"(?i)\b(différen\w*|distingu\w*|compar\w*|versus|vs|exceptions?|déroga\w*|stratégi\w*|"
+    r"conflits?|cumul\w*|hypoth[eè]s\w*|hypothétique\w*|conséquences?|jurisprudence|interprét\w*|et\s+si|que\s+se\s+passe)\b"
+)
+
+# Poids des critères de complexité (somme bornée à 1)
+_WEIGHTS = {
+    "plusieurs articles": 0.3,
+    "plusieurs codes": 0.2,
+    "raisonnement": 0.35,
+    "question longue": 0.2,
+    "nombreux concepts": 0.15,
+    "aucun article cité": 0.15,
+    "confiance faible": 0.3,
+    "contexte web": 0.35,
+    "contexte volumineux": 0.15,
+}
+
+LONG_QUESTION_WORDS = 30
+MANY_CONCEPTS = 3
+
+
+def parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """"modèle:entrée:sortie,..." (USD par million de tokens) → {modèle: (entrée, sortie)}."""
+    prices = {}
+    for item in spec.split(","):
+        parts = item.strip().rsplit(":", 2)
+        if len(parts) == 3:
+            try:
+                prices[parts[0]] = (float(parts[1]), float(parts[2]))
+            except ValueError:
+                logger.warning(f"⚠️  Prix de modèle invalide ignoré: {item}")
+    return prices
+
+
+def question_reasons(question: str) -> List[str]:
+    """Critères de complexité tirés de la question seule."""
+    parsed = parse_legal_entities(question)
+    reasons = []
+    if len(parsed.article_numbers) > 1:
+        reasons.append("plusieurs articles")
+    elif not parsed.article_numbers:
+        reasons.append("aucun article cité")
+    if len(parsed.codes) > 1:
+        reasons.append("plusieurs codes")
+    if len(parsed.of_kind(CONCEPT)) >= MANY_CONCEPTS:
+        reasons.append("nombreux concepts")
+    if len(question.split()) > LONG_QUESTION_WORDS:
+        reasons.append("question longue")
+    if _REASONING_RE.search(question):
+        reasons.append("raisonnement")
+    return reasons
+
+
+def retrieval_reasons(chunks_info: List[Dict[str, Any]], context_chars: int, used_web: bool) -> List[str]:
+    """Critères de complexité tirés du contexte retrouvé."""
+    reasons = []
+    top_score = max((info.get("score", 0) for info in chunks_info), default=0)
+    if top_score < Config.ROUTER_MIN_CONFIDENCE:
+        reasons.append("confiance faible")
+    if used_web:
+        reasons.append("contexte web")
+    if context_chars > Config.ROUTER_MAX_SIMPLE_CONTEXT:
+        reasons.append("contexte volumineux")
+    return reasons
+
+
+def complexity(reasons: List[str]) -> float:
+    return min(1.0, sum(_WEIGHTS[reason] for reason in reasons))
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    """Niveau de modèle retenu pour un appel, avec le score et les critères qui l'expliquent."""
+
+    stage: str
+    tier: str
+    model: str
+    score: float
+    reasons: Tuple[str, ...]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"tier": self.tier, "model": self.model, "score": round(self.score, 2), "reasons": list(self.reasons)}
+
+
+class TierCostCallback(BaseCallbackHandler):
+    """Callback LangChain qui comptabilise le coût estimé d'un appel routé."""
+
+    def __init__(self, decision: RoutingDecision, prices: Dict[str, Tuple[float, float]]):
+        self.decision = decision
+        self.prices = prices
+
+    def on_llm_end(self, response, **kwargs):
+        model, usage = llm_usage(response)
+        price_in, price_out = self.prices.get(model, self.prices.get(self.decision.model, (0.0, 0.0)))
+        cost = ((usage.get("prompt_tokens") or 0) * price_in + (usage.get("completion_tokens") or 0) * price_out) / 1e6
+        if cost:
+            TIER_COST.inc(cost, stage=self.decision.stage, tier=self.decision.tier)
+            trace = current_trace()
+            if trace is not None:
+                trace.incr("llm_cost_usd", cost)
+
+
+class ModelRouter:
+    """Choisit, pour chaque étape, le petit ou le grand modèle selon la complexité."""
+
+    def __init__(self, large: Dict[str, Any], small: Optional[Dict[str, Any]] = None):
+        # {étape: modèle de chat}; sans petits modèles, tout va au grand
+        self.models = {LARGE: large, SMALL: small or {}}
+        self.prices = parse_prices(Config.MODEL_PRICES)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.models[SMALL])
+
+    def _decide(self, stage: str, reasons: List[str]) -> RoutingDecision:
+        score = complexity(reasons)
+        tier = SMALL if self.enabled and stage in self.models[SMALL] and score < Config.ROUTER_THRESHOLD else LARGE
+        model = getattr(self.models[tier][stage], "model_name", "inconnu")
+        decision = RoutingDecision(stage, tier, model, score, tuple(reasons))
+        DECISIONS.inc(stage=stage, tier=tier)
+        logger.info(f"🧭 Routage {stage}: {tier} ({model}), complexité {score:.2f} ({', '.join(reasons) or 'simple'})")
+
+        trace = current_trace()
+        if trace is not None:
+            routing = trace.attributes.get("routing") or {}
+            routing[stage] = decision.as_dict()
+            trace.annotate("routing", routing)
+        return decision
+
+    def route_expansion(self, question: str) -> RoutingDecision:
+        return self._decide(EXPANSION, question_reasons(question))
+
+    def route_synthesis(
+        self, question: str, chunks_info: List[Dict[str, Any]], context_chars: int, used_web: bool
+    ) -> RoutingDecision:
+        return self._decide(SYNTHESIS, question_reasons(question) + retrieval_reasons(chunks_info, context_chars, used_web))
+
+    def llm(self, decision: RoutingDecision):
+        return self.models[decision.tier][decision.stage]
+
+    def callbacks(self, decision: RoutingDecision) -> List[BaseCallbackHandler]:
+        return [TierCostCallback(decision, self.prices)]
+
+    @contextmanager
+    def track(self, decision: RoutingDecision) -> Iterator[None]:
+        """Mesure la durée de l'appel routé (flux complet en streaming)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            TIER_LATENCY.observe(time.perf_counter() - start, stage=decision.stage, tier=decision.tier)
@@ -0,0 +1,321 @@
+"""
+Profilage par échantillonnage du chemin critique (query() et guardrails).
+
+Un thread échantillonne la pile du thread de la requête toutes les
+PROFILE_INTERVAL_MS (sys._current_frames) et agrège les piles au format
+"folded" (une ligne "f1;f2;f3 N" par pile), lisible par flamegraph.pl,
+speedscope ou inferno. Les piles sont prises en temps réel (attentes réseau
+comprises); le résumé donne aussi le temps CPU du thread. En parallèle,
+tracemalloc compare deux instantanés pour trouver les lignes qui allouent le
+plus (copies de chaînes, JSON, etc.).
+
+Déclenchement: une fraction des requêtes (PROFILE_SAMPLE_RATE), ou une
+requête précise (query(..., profile=True), champ "profile" de l'API si
+PROFILE_ON_DEMAND). Un profil imbriqué (guardrails pendant un query()
+profilé) est inclus dans le profil englobant. Hors profilage, le coût se
+limite à un tirage aléatoire.
+
+Chaque profil écrit PROFILE_DIR/<nom>-<horodatage>-<pid>-<n>.folded et un
+résumé .json (durée, échantillons, fonctions les plus coûteuses, allocations).
+Seuls les PROFILE_MAX_FILES profils les plus récents sont gardés.
+
+Usage:
+    python profiling.py merge profiles/query-*.folded > query.folded
+    python profiling.py top profiles/query-*.folded --limit 30
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+import contextvars
+import tracemalloc
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import Config
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PROFILES = REGISTRY.counter("rag_profiles_total", "Profils d'exécution écrits par section")
+
+# Instantanés tracemalloc: ces modules ne sont pas du code applicatif
+_ALLOCATION_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_active_profile: contextvars.ContextVar[bool] = contextvars.ContextVar("rag_active_profile", default=False)
+_sequence = itertools.count(1)
+_labels: Dict[CodeType, str] = {}
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def fold_stack(frame: Optional[FrameType]) -> str:
+    """Pile d'appels au format folded (de la racine vers la fonction en cours)."""
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Échantillonne la pile d'un thread (ou de tous) à intervalle fixe, dans un thread dédié."""
+
+    def __init__(self, thread_id: int, interval: float, all_threads: bool = False):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.all_threads = all_threads
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rag-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.all_threads:
+                for ident, frame in frames.items():
+                    if ident != own_id:
+                        self.stacks[f"{names.get(ident, ident)};{fold_stack(frame)}"] += 1
+            elif self.thread_id in frames:
+                self.stacks[fold_stack(frames[self.thread_id])] += 1
+            self.samples += 1
+
+
+class _AllocationTracker:
+    """tracemalloc est global au processus: démarré au premier profil, arrêté au dernier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = 0
+        self._owned = False
+
+    def acquire(self):
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owned = True
+            self._users += 1
+            tracemalloc.reset_peak()
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._owned:
+                tracemalloc.stop()
+                self._owned = False
+
+
+_allocations = _AllocationTracker()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_ALLOCATION_FILTERS)
+
+
+def top_allocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int) -> List[Dict[str, Any]]:
+    """Lignes dont la mémoire vivante a le plus augmenté entre deux instantanés."""
+    rows = []
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        rows.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff,
+        })
+    return rows
+
+
+def top_functions(stacks: Dict[str, int], limit: int) -> List[Dict[str, Any]]:
+    """Fonctions en cours d'exécution (temps propre) les plus fréquentes dans les échantillons."""
+    self_time: Counter = Counter()
+    for stack, count in stacks.items():
+        self_time[stack.rsplit(";", 1)[-1]] += count
+    total = sum(self_time.values()) or 1
+    return [{"function": name, "samples": n, "share": round(n / total, 3)} for name, n in self_time.most_common(limit)]
+
+
+class Profile:
+    """Profil d'une section (piles échantillonnées et allocations), écrit à sa sortie."""
+
+    def __init__(self, name: str, trigger: str):
+        self.name = name
+        self.trigger = trigger
+        self.path: Optional[str] = None
+        self.summary: Dict[str, Any] = {}
+        self._sampler = StackSampler(threading.get_ident(), Config.PROFILE_INTERVAL_MS / 1000, Config.PROFILE_ALL_THREADS)
+        self._before: Optional[tracemalloc.Snapshot] = None
+        self._started = 0.0
+        self._cpu_started = 0.0
+
+    def start(self):
+        if Config.PROFILE_ALLOCATIONS:
+            _allocations.acquire()
+            self._before = _snapshot()
+        self._started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+        self._sampler.start()
+
+    def stop(self):
+        duration_ms = (time.perf_counter() - self._started) * 1000
+        cpu_ms = (time.thread_time() - self._cpu_started) * 1000
+        self._sampler.stop()
+        self.summary = {
+            "name": self.name,
+            "trigger": self.trigger,
+            "pid": os.getpid(),
+            "duration_ms": round(duration_ms, 1),
+            # Temps CPU du thread de la requête (le reste: attentes réseau, verrous, threads de recherche)
+            "cpu_ms": round(cpu_ms, 1),
+            "interval_ms": Config.PROFILE_INTERVAL_MS,
+            "samples": self._sampler.samples,
+            "top_functions": top_functions(self._sampler.stacks, 15),
+        }
+        if self._before is not None:
+            try:
+                # Allocations de tout le processus: celles de requêtes concurrentes s'y mêlent
+                self.summary["allocations"] = top_allocations(self._before, _snapshot(), Config.PROFILE_TOP_ALLOCATIONS)
+                self.summary["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            finally:
+                _allocations.release()
+        self._write()
+
+    def _write(self):
+        try:
+            os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            base = os.path.join(Config.PROFILE_DIR, f"{self.name}-{stamp}-{os.getpid()}-{next(_sequence)}")
+            with open(f"{base}.folded", "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in self._sampler.stacks.items())
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(self.summary, f, ensure_ascii=False, indent=2)
+            self.path = f"{base}.folded"
+            PROFILES.inc(name=self.name)
+            prune_profiles(Config.PROFILE_DIR, Config.PROFILE_MAX_FILES)
+            hottest = self.summary["top_functions"][0]["function"] if self.summary["top_functions"] else "-"
+            logger.info(
+                f"🔬 Profil {self.name} ({self.trigger}): {self.summary['duration_ms']:.0f}ms "
+                f"(CPU {self.summary['cpu_ms']:.0f}ms), "
+                f"{self.summary['samples']} échantillons, plus coûteuse: {hottest} → {self.path}"
+            )
+        except OSError as e:
+            logger.error(f"❌ Profil {self.name}: écriture impossible ({e})")
+
+
+def prune_profiles(directory: str, max_profiles: int):
+    """Supprime les profils (.folded et leur résumé .json) au-delà des max_profiles plus récents."""
+    if max_profiles <= 0:
+        return
+    profiles = sorted(glob.glob(os.path.join(directory, "*.folded")), key=os.path.getmtime)
+    for path in profiles[:max(0, len(profiles) - max_profiles)]:
+        for stale in (path, f"{path[:-len('.folded')]}.json"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                # Déjà supprimé par un autre worker
+                pass
+
+
+def should_profile(force: bool = False) -> Optional[str]:
+    """Déclencheur du profil ("request" ou "sampled"), None si la section n'est pas profilée."""
+    if force:
+        return "request"
+    if Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+@contextmanager
+def profile_block(name: str, force: bool = False) -> Iterator[Optional[Profile]]:
+    """
+    Profile la section si elle est tirée (ou forcée) et qu'aucun profil n'est
+    déjà actif dans ce contexte. Le Profile n'a son chemin (path) qu'à la sortie.
+    """
+    trigger = None if _active_profile.get() else should_profile(force)
+    if trigger is None:
+        yield None
+        return
+    profile = Profile(name, trigger)
+    token = _active_profile.set(True)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _active_profile.reset(token)
+
+
+def profiled(name: str) -> Callable:
+    """Décorateur: profile_block(name) autour de chaque appel."""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profile_block(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Agrégation hors ligne
+# ---------------------------------------------------------------------------
+
+def read_folded(paths: List[str]) -> Counter:
+    """Additionne les piles de plusieurs fichiers .folded."""
+    stacks: Counter = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Agrège les profils d'exécution (format folded)")
+    parser.add_argument("command", choices=("merge", "top"))
+    parser.add_argument("paths", nargs="+", help="Fichiers .folded")
+    parser.add_argument("--limit", type=int, default=20, help="Nombre de fonctions affichées (top)")
+    args = parser.parse_args(argv)
+
+    stacks = read_folded(args.paths)
+    if args.command == "merge":
+        sys.stdout.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    else:
+        print(json.dumps(top_functions(stacks, args.limit), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
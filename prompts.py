@@ -0,0 +1,223 @@
+"""
+Prompts du moteur RAG, découpés en message système stable + contenu variable.
+
+La partie fixe (règles, exemples, format) est envoyée à l'identique à chaque
+appel, ce qui permet au fournisseur (ou à un serveur local) de réutiliser son
+cache de préfixe/KV. Le nombre de tokens de cette partie est calculé une seule
+fois au démarrage.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from config import Config
+from metrics import REGISTRY, current_trace
+
+logger = logging.getLogger(__name__)
+
+# Ratio moyen caractères/token pour estimer la partie variable sans la tokeniser
+CHARS_PER_TOKEN = 4
+
+PROMPT_TOKENS = REGISTRY.counter(
+    "rag_prompt_tokens_total", "Tokens d'entrée estimés par prompt et partie (fixe/variable)"
+)
+
+EXPANSION_SYSTEM = """Tu es un expert en recherche juridique québécoise.
+
+Génère 5 requêtes de recherche alternatives pour trouver l'information dans une base de données juridique.
+
+**RÈGLES IMPORTANTES:**
+1. Utilise des termes juridiques précis du Québec
+2. Inclus des variations avec numéros d'articles si pertinent
+3. Reformule avec synonymes juridiques
+4. Pense aux codes pertinents (C.c.Q., C.p.c., Code criminel, etc.)
+5. Considère les concepts juridiques connexes
+
+**EXEMPLES DE BONNES REQUÊTES:**
+- Question: "Comment divorcer au Québec?"
+  Requêtes:
+  1. divorce procédure Québec conditions
+  2. dissolution mariage Code civil Québec
+  3. séparation légale conjoints articles 516-521 CCQ
+  4. rupture union matrimoniale formalités
+  5. fin mariage divorce contentieux
+
+**Génère UNIQUEMENT 5 requêtes, une par ligne, sans numérotation.**"""
+
+EXPANSION_USER = """**Question de l'utilisateur:** {question}"""
+
+SYNTHESIS_SYSTEM = f"""Tu es un assistant juridique expert spécialisé dans le droit québécois.
+
+**MISSION:** Répondre aux questions juridiques en te basant STRICTEMENT sur les documents fournis.
+
+**CONTEXTE DE LA QUESTION:**
+- Région: Québec, Canada (PAS la France, PAS les USA)
+- Sources: Base de données juridique interne + Web (si nécessaire)
+
+**RÈGLES STRICTES (GUARDRAILS):**
+
+1. **PRIORITÉ AUX SOURCES:**
+   - TOUJOURS privilégier le CONTEXTE VÉRIFIÉ (base de données interne)
+   - N'utiliser le CONTEXTE WEB que si le contexte vérifié est insuffisant
+   - Si tu utilises le web, MENTIONNE-LE clairement: "Selon une source web..."
+
+2. **CITATIONS OBLIGATOIRES:**
+   - TOUJOURS citer les sources avec précision
+   - Format: "Selon l'Article X du [Nom du document]..."
+   - Mentionne les numéros d'articles, de lois, de codes
+
+3. **RÉPONSE STRUCTURÉE:**
+   - Commence par un résumé direct (1-2 phrases)
+   - Développe avec les détails pertinents
+   - Cite les articles et sources spécifiques
+   - Termine par le disclaimer obligatoire
+
+4. **QUALITÉ DE LA RÉPONSE:**
+   - Sois précis et factuel
+   - N'invente RIEN
+   - Si l'info n'est pas dans le contexte: "Désolé, je n'ai pas trouvé l'information pertinente dans les documents fournis."
+   - Ne fournis AUCUN conseil juridique personnel
+
+5. **HORS-SUJET:**
+   - Réponds UNIQUEMENT aux questions juridiques
+   - Pour toute autre question: "Je ne peux aider qu'avec des questions juridiques."
+
+**FORMAT DE RÉPONSE ATTENDU:**
+
+**Réponse directe:** [1-2 phrases résumant la réponse]
+
+**Détails:**
+[Développement avec citations précises]
+
+**Sources:**
+- [Source 1 avec article/section]
+- [Source 2 avec article/section]
+
+{Config.LEGAL_DISCLAIMER}
+
+Le message de l'utilisateur contient le CONTEXTE VÉRIFIÉ, le CONTEXTE WEB et la QUESTION. Réponds en respectant TOUTES les règles."""
+
+# Contexte compact: les extraits portent l'identifiant de leur source ([S1]),
+# remplacé par le nom complet dans la réponse (context_format.CitationMapper)
+SYNTHESIS_SYSTEM_COMPACT = SYNTHESIS_SYSTEM.replace(
+    """   - Format: "Selon l'Article X du [Nom du document]..."
+""",
+    """   - Le CONTEXTE VÉRIFIÉ commence par une table des sources: chaque extrait est précédé de l'identifiant de sa source ([S1], [S2]...)
+   - Format: "Selon l'Article X [S1]..." (cite l'identifiant entre crochets, il sera remplacé par le nom du document)
+""",
+).replace(
+    """- [Source 1 avec article/section]
+- [Source 2 avec article/section]""",
+    """- [S1] article/section
+- [S2] article/section""",
+)
+
+SYNTHESIS_USER = """**CONTEXTE VÉRIFIÉ (Base de données juridique interne):**
+{context_pinecone}
+
+---
+
+**CONTEXTE WEB (Internet - utiliser avec prudence):**
+{context_web}
+
+---
+
+**QUESTION DE L'UTILISATEUR:**
+{question}"""
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    """Tokenizer tiktoken si disponible (approximation pour les modèles Llama)."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"⚠️  tiktoken indisponible ({e}), estimation des tokens par caractères")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Compte les tokens d'un texte (tiktoken, ou estimation par caractères)."""
+    encoder = _encoder()
+    if encoder is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(encoder.encode(text))
+
+
+@dataclass(frozen=True)
+class PromptScaffold:
+    """Prompt précompilé: partie système fixe + gabarit utilisateur, avec tokens comptés."""
+
+    name: str
+    system_text: str
+    user_template: str
+    system_tokens: int
+    user_fixed_tokens: int
+    template: ChatPromptTemplate
+    version: str
+
+    @property
+    def fixed_tokens(self) -> int:
+        """Tokens invariants d'un appel à l'autre (hors variables)."""
+        return self.system_tokens + self.user_fixed_tokens
+
+    def estimate_input_tokens(self, **variables: str) -> int:
+        """Estime les tokens d'entrée sans rendre le gabarit."""
+        variable_chars = sum(len(v) for v in variables.values())
+        return self.fixed_tokens + variable_chars // CHARS_PER_TOKEN
+
+    def record_usage(self, **variables: str) -> int:
+        """
+        Enregistre la part fixe (réutilisable par le cache de préfixe) et la
+        part variable estimée d'un appel; retourne les tokens du préfixe.
+        """
+        variable_tokens = sum(len(v) for v in variables.values()) // CHARS_PER_TOKEN
+        PROMPT_TOKENS.inc(self.system_tokens, prompt=self.name, part="cacheable_prefix")
+        PROMPT_TOKENS.inc(self.user_fixed_tokens + variable_tokens, prompt=self.name, part="variable")
+        trace = current_trace()
+        if trace is not None:
+            trace.incr("prompt_cacheable_tokens", self.system_tokens)
+            trace.incr("prompt_variable_tokens", self.user_fixed_tokens + variable_tokens)
+        return self.system_tokens
+
+
+def _build_scaffold(name: str, system_text: str, user_template: str) -> PromptScaffold:
+    template = ChatPromptTemplate.from_messages([
+        SystemMessage(content=system_text),
+        ("human", user_template),
+    ])
+    # Partie fixe du gabarit utilisateur: le texte sans ses variables
+    user_fixed = user_template.format(**{v: "" for v in template.input_variables})
+    version = hashlib.sha256(f"{system_text}\n{user_template}".encode("utf-8")).hexdigest()[:12]
+    return PromptScaffold(
+        name=name,
+        system_text=system_text,
+        user_template=user_template,
+        system_tokens=count_tokens(system_text),
+        user_fixed_tokens=count_tokens(user_fixed),
+        template=template,
+        version=version,
+    )
+
+
+def build_prompt_scaffolds() -> Dict[str, PromptScaffold]:
+    """Construit les prompts du moteur et compte leurs tokens fixes une seule fois."""
+    compact = Config.CONTEXT_FORMAT.lower() == "compact"
+    synthesis_system = SYNTHESIS_SYSTEM_COMPACT if compact else SYNTHESIS_SYSTEM
+    scaffolds = {
+        "expansion": _build_scaffold("expansion", EXPANSION_SYSTEM, EXPANSION_USER),
+        "synthesis": _build_scaffold("synthesis", synthesis_system, SYNTHESIS_USER),
+    }
+    for scaffold in scaffolds.values():
+        logger.info(
+            f"🧮 Prompt {scaffold.name}: {scaffold.system_tokens} tokens système (préfixe cacheable), "
+            f"{scaffold.user_fixed_tokens} tokens fixes côté utilisateur, version {scaffold.version}"
+        )
+    return scaffolds
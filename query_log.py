@@ -0,0 +1,238 @@
+"""
+Journal structuré des requêtes (JSONL), pour l'analyse de performance hors ligne.
+
+Chaque query() échantillonnée produit un événement: identifiant utilisateur
+haché, caractéristiques de la question, requêtes générées, chunks retenus
+(ID et score), durées par étape, tokens, routage et coût des appels LLM,
+issues des caches et dégradations.
+Les requêtes bloquées ou en erreur sont toujours journalisées.
+
+Le chemin de la requête ne fait que construire un petit dict et le déposer
+dans une file bornée; un thread d'écriture sérialise et écrit par lots, et
+fait tourner le fichier au-delà de QUERY_LOG_MAX_BYTES. File pleine:
+l'événement est abandonné (compté) plutôt que de ralentir la requête.
+
+async_handler() applique le même principe au journal texte (app.log):
+QueueHandler côté application, écriture disque dans un thread dédié.
+"""
+
+import os
+import json
+import glob
+import time
+import queue
+import atexit
+import random
+import hashlib
+import logging
+import threading
+import logging.handlers
+from typing import Any, Dict, List, Optional, Set
+
+from config import Config
+from legal_entities import CONCEPT, parse_legal_entities
+from metrics import REGISTRY, RequestTrace
+from config_reload import on_config_change
+
+logger = logging.getLogger(__name__)
+
+EVENTS = REGISTRY.counter("rag_query_log_events_total", "Événements du journal structuré par issue")
+
+# Événements écrits par lot, au plus tous les FLUSH_INTERVAL secondes
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 1.0
+# Un fichier courant par processus (workers uvicorn, Streamlit), tourné avec horodatage
+CURRENT_FILE = "queries-{pid}.jsonl"
+ROTATED_FILE = "queries-{pid}-{stamp}.jsonl"
+
+
+def hash_user(user_id: str) -> str:
+    """Identifiant utilisateur pseudonymisé (stable pour un même sel)."""
+    return hashlib.sha256(f"{Config.QUERY_LOG_SALT}:{user_id}".encode("utf-8")).hexdigest()[:16]
+
+
+def question_features(question: str) -> Dict[str, Any]:
+    parsed = parse_legal_entities(question)
+    return {
+        "chars": len(question),
+        "words": len(question.split()),
+        "articles": parsed.article_numbers,
+        "codes": parsed.codes,
+        "concepts": len(parsed.of_kind(CONCEPT)),
+    }
+
+
+def build_event(
+    question: str, user_id: str, outcome: str, metadata: Dict[str, Any], trace: RequestTrace
+) -> Dict[str, Any]:
+    """Événement d'une requête terminée, à partir de ses métadonnées et de sa trace."""
+    counters = dict(trace.counters)
+    event = {
+        "ts": round(time.time(), 3),
+        "user": hash_user(user_id),
+        "question": question_features(question),
+        "outcome": outcome,
+        "namespace": metadata.get("namespace", ""),
+        "config_version": metadata.get("config_version", 0),
+        "follow_up": metadata.get("follow_up", False),
+        "coalesced": metadata.get("coalesced", False),
+        "answer_store": metadata.get("answer_store", False),
+        "used_pinecone": metadata.get("used_pinecone", False),
+        "used_web": metadata.get("used_web", False),
+        "queries": trace.attributes.get("queries", []),
+        "chunks": trace.attributes.get("chunks", []),
+        "timings_ms": metadata.get("timings_ms", {}),
+        "tokens": {k: int(counters[k]) for k in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens") if k in counters},
+        "routing": trace.attributes.get("routing", {}),
+        "cost_usd": round(counters.get("llm_cost_usd", 0.0), 6),
+        "caches": {k[len("cache_"):]: int(v) for k, v in counters.items() if k.startswith("cache_")},
+        "degradations": metadata.get("degradations", []),
+    }
+    if Config.QUERY_LOG_QUESTION_TEXT:
+        event["question"]["text"] = question
+    return event
+
+
+class QueryLogger:
+    """Écrit les événements en JSONL depuis un thread dédié, avec rotation par taille."""
+
+    def __init__(self, directory: str, sample_rate: float, max_bytes: int, backup_count: int, queue_size: int):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, CURRENT_FILE.format(pid=os.getpid()))
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="rag-query-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def sampled(self, metadata: Dict[str, Any]) -> bool:
+        if metadata.get("blocked") or metadata.get("error"):
+            return True
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def log(self, question: str, user_id: str, outcome: str, metadata: Dict[str, Any], trace: RequestTrace):
+        """Dépose l'événement de la requête dans la file (sans jamais bloquer)."""
+        if not self.sampled(metadata):
+            EVENTS.inc(outcome="sampled_out")
+            return
+        try:
+            self._queue.put_nowait(build_event(question, user_id, outcome, metadata, trace))
+        except queue.Full:
+            EVENTS.inc(outcome="dropped")
+
+    def _run(self):
+        while True:
+            batch: List[Optional[Dict[str, Any]]] = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            events = [event for event in batch if event is not None]
+            if events:
+                try:
+                    self._write(events)
+                except Exception as e:
+                    # Erreur inattendue (ex: événement non sérialisable): seul ce lot est perdu
+                    EVENTS.inc(len(events), outcome="dropped")
+                    logger.error(f"❌ Journal des requêtes: lot de {len(events)} événement(s) perdu ({e})")
+            if batch[-1] is None:
+                return
+
+    def _write(self, events: List[Dict[str, Any]]):
+        lines = "".join(
+            json.dumps(e, ensure_ascii=False, separators=(",", ":"), default=str) + "\n" for e in events
+        )
+        try:
+            self._file.write(lines)
+            self._file.flush()
+        except (OSError, ValueError) as e:
+            EVENTS.inc(len(events), outcome="dropped")
+            logger.error(f"❌ Journal des requêtes: écriture impossible ({e})")
+            return
+        EVENTS.inc(len(events), outcome="written")
+        if self._file.tell() >= self.max_bytes:
+            try:
+                self._rotate()
+            except OSError as e:
+                logger.error(f"❌ Journal des requêtes: rotation impossible ({e})")
+
+    def _rotate(self):
+        self._file.close()
+        try:
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            os.replace(self.path, os.path.join(self.directory, ROTATED_FILE.format(pid=os.getpid(), stamp=stamp)))
+            rotated = sorted(glob.glob(os.path.join(self.directory, "queries-*-*.jsonl")), key=os.path.getmtime)
+            for old in rotated[:max(0, len(rotated) - self.backup_count)]:
+                os.remove(old)
+        finally:
+            # Fichier courant rouvert même si le renommage a échoué (la rotation sera retentée)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        """Écrit les événements en attente et arrête le thread d'écriture."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._file.close()
+
+
+_query_logger: Optional[QueryLogger] = None
+_query_logger_lock = threading.Lock()
+
+
+def get_query_logger() -> Optional[QueryLogger]:
+    """Retourne le journal structuré du processus, None s'il est désactivé."""
+    global _query_logger
+    if not Config.QUERY_LOG:
+        return None
+    with _query_logger_lock:
+        if _query_logger is None:
+            _query_logger = QueryLogger(
+                Config.QUERY_LOG_DIR,
+                Config.QUERY_LOG_SAMPLE_RATE,
+                Config.QUERY_LOG_MAX_BYTES,
+                Config.QUERY_LOG_BACKUP_COUNT,
+                Config.QUERY_LOG_QUEUE_SIZE,
+            )
+            logger.info(f"✅ Journal des requêtes: {_query_logger.path} (échantillonnage {Config.QUERY_LOG_SAMPLE_RATE:.0%})")
+        return _query_logger
+
+
+def _reload_sample_rate(changed: Set[str]):
+    if _query_logger is not None:
+        _query_logger.sample_rate = Config.QUERY_LOG_SAMPLE_RATE
+
+
+on_config_change({"QUERY_LOG_SAMPLE_RATE"}, _reload_sample_rate)
+
+
+def async_handler(*handlers: logging.Handler) -> logging.Handler:
+    """
+    Enveloppe des handlers (ex: FileHandler de app.log) derrière une file:
+    l'appel de journalisation ne fait que déposer l'enregistrement.
+    """
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return logging.handlers.QueueHandler(log_queue)
+
+
+def read_events(directory: str) -> List[Dict[str, Any]]:
+    """Relit les événements de tous les fichiers (tournés et courants), ex: pour une analyse hors ligne."""
+    events = []
+    for path in sorted(glob.glob(os.path.join(directory, "queries-*.jsonl")), key=os.path.getmtime):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    return events
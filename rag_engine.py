@@ -5,16 +5,36 @@ Moteur RAG (Retrieval-Augmented Generation) pour les questions juridiques.
 import re
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Any, Iterator, Optional, Set, Tuple
 
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from pinecone import Pinecone
 from tavily import TavilyClient
 
 from config import Config
 from guardrails import get_guardrails
+from http_pool import get_http_client, get_requests_session, http_timeout, pinecone_index_kwargs
+from metrics import span, trace_request, current_trace, record_cache, LLMMetricsCallback, QUERIES, SEARCHES
+from singleflight import SingleFlight, normalize_question
+from prompts import build_prompt_scaffolds
+from reranker import build_reranker
+from dedup import get_duplicate_filter, mmr_order, record_duplicates
+from session_context import SessionRetrievalContext
+from cache import PartitionedCache
+from legal_entities import parse_legal_entities
+from resilience import CircuitBreaker, bounded, get_breaker, hedged, is_circuit_open
+from deadline import request_deadline, stage_deadline, current_deadline, time_left, allows, degrade, degradations, is_timeout
+from context_format import CONTEXT_SEPARATOR, COMPACT, CitationMapper, format_entry, render_context
+from answer_store import AnswerStore, fingerprint, record_lookup
+from query_log import get_query_logger
+from profiling import profile_block
+from model_router import EXPANSION, SYNTHESIS, ModelRouter
+from tenants import Admission, get_tenants
+from config_reload import config_version, on_config_change, start_config_watcher
 
 logger = logging.getLogger(__name__)
 
@@ -22,30 +42,94 @@ logger = logging.getLogger(__name__)
 class ImprovedFusionRAGQuery:
     """Moteur RAG amélioré avec fusion de sources multiples."""
 
+    _INDEX_SETTINGS = frozenset({
+        "VECTOR_BACKEND", "PINECONE_API_KEY", "PINECONE_INDEX_NAME", "PINECONE_HOST", "PINECONE_NAMESPACE",
+        "LOCAL_INDEX_DIR", "LOCAL_INDEX_QUANTIZATION", "LOCAL_INDEX_RESCORE", "LOCAL_INDEX_FIRST_PASS_DIM",
+    })
+    _LLM_SETTINGS = frozenset({
+        "EXPANDER_MODEL", "SYNTHESIZER_MODEL", "GROQ_API_KEY", "GROQ_API_HOST",
+        "MODEL_ROUTING", "SMALL_EXPANDER_MODEL", "SMALL_SYNTHESIZER_MODEL", "MODEL_PRICES",
+    })
+
+    # Composants reconstruits au rechargement de la configuration (voir config_reload.py),
+    # dans cet ordre, quand l'un de leurs paramètres change
+    RELOADABLE = (
+        (_INDEX_SETTINGS, "_reload_index"),
+        (frozenset({"EMBEDDING_MODEL", "OPENAI_API_KEY", "OPENAI_BASE_URL"}), "_reload_embeddings"),
+        (_LLM_SETTINGS, "_init_llms"),
+        (frozenset({"TAVILY_API_KEY", "TAVILY_BASE_URL"}), "_init_tavily"),
+        (frozenset({"CONTEXT_FORMAT"}), "_init_prompts"),
+        (frozenset({"RERANKER", "RERANK_MODEL"}), "_init_reranker"),
+        (frozenset({"EMBEDDING_CACHE_SIZE", "SEARCH_CACHE_SIZE", "SEARCH_CACHE_TTL"}), "_resize_caches"),
+        # Après les prompts, modèles et index: l'empreinte du magasin en dépend
+        (
+            _INDEX_SETTINGS | _LLM_SETTINGS | {
+                "ANSWER_STORE", "ANSWER_STORE_PATH", "ANSWER_STORE_MIN_SIMILARITY", "CORPUS_VERSION",
+                "CONTEXT_FORMAT", "EMBEDDING_MODEL", "ROUTER_THRESHOLD",
+            },
+            "_init_answer_store",
+        ),
+    )
+
     def __init__(self):
         """Initialise le moteur RAG avec gestion d'erreurs robuste."""
         logger.info("Initialisation du moteur FusionRAG amélioré...")
 
+        # Surcharges de CONFIG_FILE appliquées avant la construction des composants
+        start_config_watcher()
+
         # Valide la configuration
         Config.validate()
 
         # Initialise les composants
         self._init_pinecone()
         self._init_embeddings()
-        self._init_expander_llm()
-        self._init_synthesizer_llm()
+        self._init_llms()
         self._init_tavily()
         self._init_prompts()
+        self._init_answer_store()
+        self._init_reranker()
+
+        # Callbacks de métriques (appels et tokens LLM)
+        self.expander_callbacks = [LLMMetricsCallback("expander")]
+        self.synthesizer_callbacks = [LLMMetricsCallback("synthesizer")]
+
+        # Coalescence des appels identiques en cours (entre sessions)
+        self._query_flight = SingleFlight("query")
+        self._embedding_flight = SingleFlight("embedding")
+        self._pinecone_flight = SingleFlight("pinecone")
+
+        # Caches partagés entre requêtes (embeddings, résultats Pinecone), une partition par namespace
+        self._embedding_cache = PartitionedCache("embedding", Config.EMBEDDING_CACHE_SIZE)
+        self._search_cache = PartitionedCache("pinecone", Config.SEARCH_CACHE_SIZE, Config.SEARCH_CACHE_TTL)
+
+        # Pool de threads partagé pour les appels bloquants (embeddings, Pinecone)
+        self._io_executor = ThreadPoolExecutor(max_workers=Config.IO_THREADS, thread_name_prefix="rag-io")
+
+        on_config_change(frozenset().union(*(keys for keys, _ in self.RELOADABLE)), self._on_config_change)
 
         logger.info("✅ Moteur FusionRAG amélioré initialisé avec succès")
 
     def _init_pinecone(self):
-        """Initialise la connexion Pinecone."""
+        """Initialise la connexion Pinecone (ou l'index local si VECTOR_BACKEND=local)."""
+        self.local_index = Config.VECTOR_BACKEND.lower() == "local"
+        if self.local_index:
+            from local_index import open_local_index
+            self.index_name = Config.LOCAL_INDEX_DIR
+            self.namespace = Config.PINECONE_NAMESPACE
+            self.index = open_local_index()
+            return
+
         try:
             self.pc = Pinecone(api_key=Config.PINECONE_API_KEY)
             self.index_name = Config.PINECONE_INDEX_NAME
             self.namespace = Config.PINECONE_NAMESPACE
-            self.index = self.pc.Index(self.index_name)
+            target = {"host": Config.PINECONE_HOST} if Config.PINECONE_HOST else {"name": self.index_name}
+            try:
+                self.index = self.pc.Index(**target, **pinecone_index_kwargs())
+            except TypeError:
+                # Versions du SDK où la taille du pool se règle sur le client uniquement
+                self.index = self.pc.Index(**target)
 
             logger.info(f"✅ Pinecone connecté - Index: {self.index_name}, Namespace: {self.namespace}")
         except Exception as e:
@@ -57,22 +141,34 @@ class ImprovedFusionRAGQuery:
         try:
             self.embeddings = OpenAIEmbeddings(
                 model=Config.EMBEDDING_MODEL,
-                openai_api_key=Config.OPENAI_API_KEY
+                openai_api_key=Config.OPENAI_API_KEY,
+                base_url=Config.OPENAI_BASE_URL,
+                http_client=get_http_client(Config.OPENAI_BASE_URL),
+                request_timeout=http_timeout(),
+                max_retries=0
             )
             logger.info("✅ Embeddings OpenAI initialisés")
         except Exception as e:
             logger.error(f"❌ Erreur Embeddings: {e}")
             raise
 
+    @staticmethod
+    def _chat_model(model: str, temperature: float) -> ChatOpenAI:
+        """Client de chat Groq (API compatible OpenAI) sur le pool HTTP partagé."""
+        return ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            openai_api_key=Config.GROQ_API_KEY,
+            base_url=Config.GROQ_BASE_URL,
+            http_client=get_http_client(Config.GROQ_BASE_URL),
+            request_timeout=http_timeout(),
+            max_retries=0
+        )
+
     def _init_expander_llm(self):
         """Initialise le LLM pour l'expansion de requêtes."""
         try:
-            self.llm_expander = ChatOpenAI(
-                model=Config.EXPANDER_MODEL,
-                temperature=0.3,
-                openai_api_key=Config.GROQ_API_KEY,
-                base_url=Config.GROQ_BASE_URL
-            )
+            self.llm_expander = self._chat_model(Config.EXPANDER_MODEL, 0.3)
             logger.info(f"✅ LLM Expander ({Config.EXPANDER_MODEL}) initialisé")
         except Exception as e:
             logger.error(f"❌ Erreur LLM Expander: {e}")
@@ -81,161 +177,86 @@ class ImprovedFusionRAGQuery:
     def _init_synthesizer_llm(self):
         """Initialise le LLM pour la synthèse."""
         try:
-            self.llm_synthesizer = ChatOpenAI(
-                model=Config.SYNTHESIZER_MODEL,
-                temperature=0,
-                openai_api_key=Config.GROQ_API_KEY,
-                base_url=Config.GROQ_BASE_URL
-            )
+            self.llm_synthesizer = self._chat_model(Config.SYNTHESIZER_MODEL, 0)
             logger.info(f"✅ LLM Synthesizer ({Config.SYNTHESIZER_MODEL}) initialisé")
         except Exception as e:
             logger.error(f"❌ Erreur LLM Synthesizer: {e}")
             raise
 
+    def _init_router(self):
+        """Initialise le routage par complexité (petits modèles seulement si MODEL_ROUTING)."""
+        small = None
+        if Config.MODEL_ROUTING:
+            small = {
+                EXPANSION: self._chat_model(Config.SMALL_EXPANDER_MODEL, 0.3),
+                SYNTHESIS: self._chat_model(Config.SMALL_SYNTHESIZER_MODEL, 0),
+            }
+            logger.info(
+                f"✅ Routage par complexité: {Config.SMALL_EXPANDER_MODEL} / {Config.SMALL_SYNTHESIZER_MODEL} "
+                f"sous le seuil {Config.ROUTER_THRESHOLD}"
+            )
+        self.router = ModelRouter({EXPANSION: self.llm_expander, SYNTHESIS: self.llm_synthesizer}, small)
+
+    def _init_llms(self):
+        self._init_expander_llm()
+        self._init_synthesizer_llm()
+        self._init_router()
+
     def _init_tavily(self):
         """Initialise le client Tavily."""
         try:
-            self.tavily_client = TavilyClient(api_key=Config.TAVILY_API_KEY)
+            self.tavily_client = TavilyClient(
+                api_key=Config.TAVILY_API_KEY,
+                api_base_url=Config.TAVILY_BASE_URL,
+                session=get_requests_session(Config.TAVILY_BASE_URL)
+            )
             logger.info("✅ Client Tavily initialisé")
         except Exception as e:
             logger.error(f"❌ Erreur Tavily: {e}")
             raise
 
     def _init_prompts(self):
-        """Initialise les templates de prompts."""
-        self.expansion_prompt = ChatPromptTemplate.from_template(
-"""Tu es un expert en recherche juridique québécoise.
-
-Génère 5 requêtes de recherche alternatives pour trouver l'information dans une base de données juridique.
-
-**RÈGLES IMPORTANTES:**
-1. Utilise des termes juridiques précis du Québec
-2. Inclus des variations avec numéros d'articles si pertinent
-3. Reformule avec synonymes juridiques
-4. Pense aux codes pertinents (C.c.Q., C.p.c., Code criminel, etc.)
-5. Considère les concepts juridiques connexes
-
-**EXEMPLES DE BONNES REQUÊTES:**
-- Question: "Comment divorcer au Québec?"
-  Requêtes:
-  1. divorce procédure Québec conditions
-  2. dissolution mariage Code civil Québec
-  3. séparation légale conjoints articles 516-521 CCQ
-  4. rupture union matrimoniale formalités
-  5. fin mariage divorce contentieux
-
-**Question de l'utilisateur:** {question}
-
-**Génère UNIQUEMENT 5 requêtes, une par ligne, sans numérotation:**
-"""
-        )
-
-        self.synthesis_prompt = ChatPromptTemplate.from_template(
-f"""Tu es un assistant juridique expert spécialisé dans le droit québécois.
-
-**MISSION:** Répondre aux questions juridiques en te basant STRICTEMENT sur les documents fournis.
-
-**CONTEXTE DE LA QUESTION:**
-- Région: Québec, Canada (PAS la France, PAS les USA)
-- Sources: Base de données juridique interne + Web (si nécessaire)
-
-**RÈGLES STRICTES (GUARDRAILS):**
-
-1. **PRIORITÉ AUX SOURCES:**
-   - TOUJOURS privilégier le CONTEXTE VÉRIFIÉ (base de données interne)
-   - N'utiliser le CONTEXTE WEB que si le contexte vérifié est insuffisant
-   - Si tu utilises le web, MENTIONNE-LE clairement: "Selon une source web..."
-
-2. **CITATIONS OBLIGATOIRES:**
-   - TOUJOURS citer les sources avec précision
-   - Format: "Selon l'Article X du [Nom du document]..."
-   - Mentionne les numéros d'articles, de lois, de codes
-
-3. **RÉPONSE STRUCTURÉE:**
-   - Commence par un résumé direct (1-2 phrases)
-   - Développe avec les détails pertinents
-   - Cite les articles et sources spécifiques
-   - Termine par le disclaimer obligatoire
-
-4. **QUALITÉ DE LA RÉPONSE:**
-   - Sois précis et factuel
-   - N'invente RIEN
-   - Si l'info n'est pas dans le contexte: "Désolé, je n'ai pas trouvé l'information pertinente dans les documents fournis."
-   - Ne fournis AUCUN conseil juridique personnel
-
-5. **HORS-SUJET:**
-   - Réponds UNIQUEMENT aux questions juridiques
-   - Pour toute autre question: "Je ne peux aider qu'avec des questions juridiques."
-
-**FORMAT DE RÉPONSE ATTENDU:**
-
-**Réponse directe:** [1-2 phrases résumant la réponse]
-
-**Détails:**
-[Développement avec citations précises]
-
-**Sources:**
-- [Source 1 avec article/section]
-- [Source 2 avec article/section]
-
-{Config.LEGAL_DISCLAIMER}
-
----
-
-**CONTEXTE VÉRIFIÉ (Base de données juridique interne):**
-{{context_pinecone}}
+        """Initialise les templates de prompts (système stable + contenu variable)."""
+        self.context_format = Config.CONTEXT_FORMAT.lower()
+        self.prompt_scaffolds = build_prompt_scaffolds()
+        self.expansion_prompt = self.prompt_scaffolds["expansion"].template
+        self.synthesis_prompt = self.prompt_scaffolds["synthesis"].template
+
+    def _init_answer_store(self):
+        """Charge les réponses pré-calculées si activées et à jour (prompts, modèles, corpus)."""
+        self.answer_store: Optional[AnswerStore] = None
+        if Config.ANSWER_STORE:
+            self.answer_store = AnswerStore.load(
+                Config.ANSWER_STORE_PATH, fingerprint(self), Config.ANSWER_STORE_MIN_SIMILARITY
+            )
 
----
+    def _init_reranker(self):
+        self.reranker = build_reranker()
 
-**CONTEXTE WEB (Internet - utiliser avec prudence):**
-{{context_web}}
+    def _reload_index(self):
+        self._init_pinecone()
+        # Les résultats en cache viennent de l'ancien index
+        self._search_cache.clear()
 
----
+    def _reload_embeddings(self):
+        self._init_embeddings()
+        # Clés déjà distinctes par modèle: libère seulement la mémoire des anciens vecteurs
+        self._embedding_cache.clear()
 
-**QUESTION DE L'UTILISATEUR:**
-{{question}}
+    def _resize_caches(self):
+        self._embedding_cache.resize(Config.EMBEDDING_CACHE_SIZE)
+        self._search_cache.resize(Config.SEARCH_CACHE_SIZE, Config.SEARCH_CACHE_TTL)
 
----
-
-**RÉPONSE (en respectant TOUTES les règles):**
-"""
-        )
+    def _on_config_change(self, changed: Set[str]):
+        """Reconstruit les composants dont les paramètres ont changé."""
+        for keys, method in self.RELOADABLE:
+            if keys & changed:
+                logger.info(f"🔄 {method} ({', '.join(sorted(keys & changed))})")
+                getattr(self, method)()
 
     def extract_legal_entities(self, text: str) -> List[str]:
-        """Extrait les entités juridiques de la question."""
-        entities = []
-
-        # Articles (ex: "article 1457", "art. 2847")
-        article_patterns = [
-            r'(?:article|art\.?)\s*(\d+(?:\.\d+)?)',
-            r'(?:articles|art\.?)\s*(\d+)\s*(?:à|et)\s*(\d+)'
-        ]
-        for pattern in article_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                entities.append(f"article {match.group(1)}")
-
-        # Codes juridiques
-        codes = [
-            "Code civil du Québec", "C.c.Q.", "CCQ",
-            "Code de procédure civile", "C.p.c.", "CPC",
-            "Code criminel", "C.cr.",
-            "Charte des droits et libertés"
-        ]
-        for code in codes:
-            if code.lower() in text.lower():
-                entities.append(code)
-
-        # Concepts juridiques courants
-        concepts = [
-            "contrat", "responsabilité", "divorce", "testament",
-            "succession", "bail", "hypothèque", "servitude",
-            "prescription", "délai", "recours", "dommages"
-        ]
-        for concept in concepts:
-            if concept in text.lower():
-                entities.append(concept)
-
+        """Extrait les entités juridiques de la question (articles, codes, concepts)."""
+        entities = parse_legal_entities(text).as_strings()
         logger.info(f"🔍 Entités extraites: {entities}")
         return entities
 
@@ -247,14 +268,13 @@ f"""Tu es un assistant juridique expert spécialisé dans le droit québécois.
             # Extraction d'entités pour enrichir
             entities = self.extract_legal_entities(user_question)
 
-            # Détection spéciale pour articles spécifiques
-            article_match = re.search(r'(?:article|art\.?)\s*(\d+)', user_question, re.IGNORECASE)
+            # Détection spéciale pour articles spécifiques (même analyse que les entités)
+            article_num = parse_legal_entities(user_question).first_article
 
             queries = []
 
             # Si un article spécifique est demandé, génère des requêtes ciblées
-            if article_match:
-                article_num = article_match.group(1)
+            if article_num:
                 logger.info(f"🎯 Article spécifique détecté: {article_num}")
 
                 # Requêtes ultra-ciblées pour articles
@@ -271,9 +291,21 @@ f"""Tu es un assistant juridique expert spécialisé dans le droit québécois.
                     f"responsabilité civile extracontractuelle"
                 ]
             else:
+                # Pas le temps d'une expansion LLM: la question originale seule
+                reserve_ms = Config.DEADLINE_RETRIEVAL_MS + Config.DEADLINE_SYNTHESIS_MS
+                if not allows(Config.DEADLINE_EXPANSION_MS, reserve_ms):
+                    degrade("expansion", "temps insuffisant pour l'expansion LLM")
+                    return [user_question]
+
                 # Génération normale avec le LLM pour les questions générales
-                chain = self.expansion_prompt | self.llm_expander | StrOutputParser()
-                response = chain.invoke({"question": user_question})
+                decision = self.router.route_expansion(user_question)
+                chain = self.expansion_prompt | self.router.llm(decision) | StrOutputParser()
+                self.prompt_scaffolds["expansion"].record_usage(question=user_question)
+                with span("expansion"), stage_deadline(Config.DEADLINE_EXPANSION_MS, reserve_ms), self.router.track(decision):
+                    response = chain.invoke(
+                        {"question": user_question},
+                        config={"callbacks": self.expander_callbacks + self.router.callbacks(decision)}
+                    )
 
                 # Nettoie et filtre les requêtes
                 queries = [q.strip() for q in response.strip().split('\n') if q.strip() and len(q.strip()) > 10]
@@ -306,39 +338,63 @@ f"""Tu es un assistant juridique expert spécialisé dans le droit québécois.
 
         except Exception as e:
             logger.error(f"❌ Erreur génération requêtes: {e}")
+            if is_timeout(e):
+                degrade("expansion", "délai de l'expansion LLM dépassé")
             return [user_question]
 
-    async def search_pinecone_async(self, query: str) -> List[Dict[str, Any]]:
-        """Recherche asynchrone dans Pinecone."""
+    async def search_pinecone_async(
+        self, query: str, session: Optional[SessionRetrievalContext] = None, namespace: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Recherche asynchrone dans Pinecone (servie par le contexte de session si possible),
+        dans le namespace donné (None = namespace par défaut).
+        """
+        if namespace is None:
+            namespace = self.namespace or ""
         try:
             # Détection d'article spécifique dans la requête
-            article_match = re.search(r'(?:article|art\.?)\s*(\d+)', query, re.IGNORECASE)
+            article_num = parse_legal_entities(query).first_article
 
-            query_embedding = await asyncio.to_thread(
-                self.embeddings.embed_query, query
+            # Les résultats gardés dépendent de l'index, du modèle, du top_k et du score minimum
+            session_key = (
+                namespace, query, article_num, self.index_name,
+                Config.EMBEDDING_MODEL, Config.PINECONE_TOP_K, Config.MIN_SIMILARITY_SCORE,
             )
+            if session is not None:
+                cached = session.cached_results(session_key)
+                record_cache("session_results", cached is not None)
+                if cached is not None:
+                    logger.info(f"   Query: '{query[:50]}...' → {len(cached)} résultats (contexte de session)")
+                    return cached
+
+            embedding_key = (Config.EMBEDDING_MODEL, query)
+            query_embedding = session.embedding(embedding_key) if session is not None else None
+            if query_embedding is None:
+                with span("embedding"):
+                    query_embedding = await self._run_blocking(self._embed_query, query, namespace)
+                if session is not None:
+                    session.store_embedding(embedding_key, query_embedding)
 
             search_kwargs = {
                 "vector": query_embedding,
-                "top_k": 20,
+                "top_k": Config.PINECONE_TOP_K,
                 "include_metadata": True
             }
+            if Config.CONTEXT_DEDUP.lower() == "mmr":
+                search_kwargs["include_values"] = True
 
             # Filtre par métadonnées si article spécifique détecté
-            if article_match:
-                article_num = article_match.group(1)
+            if article_num:
                 search_kwargs["filter"] = {
                     "article_num": {"$eq": article_num}
                 }
                 logger.info(f"🎯 Recherche avec filtre métadonnées: article_num = '{article_num}'")
 
-            if self.namespace:
-                search_kwargs["namespace"] = self.namespace
+            if namespace:
+                search_kwargs["namespace"] = namespace
 
-            results = await asyncio.to_thread(
-                self.index.query,
-                **search_kwargs
-            )
+            with span("pinecone"):
+                results = await self._run_blocking(self._query_index, query, search_kwargs)
 
             matches = results.get('matches', [])
 
@@ -359,76 +415,290 @@ f"""Tu es un assistant juridique expert spécialisé dans le droit québécois.
 
             logger.info(f"   → Après filtre (≥{Config.MIN_SIMILARITY_SCORE}): {len(filtered_matches)} résultats gardés")
 
+            if session is not None:
+                session.store_results(session_key, filtered_matches)
             return filtered_matches
 
         except Exception as e:
             logger.error(f"❌ Erreur recherche Pinecone pour '{query[:50]}...': {e}")
             return []
 
-    async def get_pinecone_context_async(self, queries: List[str]) -> Tuple[str, List[Dict]]:
+    async def _run_blocking(self, fn, *args):
+        """
+        Exécute un appel bloquant dans le pool partagé en propageant le contexte.
+
+        Contrairement à asyncio.to_thread, le pool survit à asyncio.run():
+        les recherches annulées n'ont pas à se terminer avant de rendre la main.
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._io_executor, functools.partial(ctx.run, fn, *args))
+
+    def _embed_query(self, query: str, namespace: Optional[str] = None) -> List[float]:
+        """
+        Calcule l'embedding d'une requête (cache LRU de la partition du namespace,
+        appels identiques concurrents partagés, requête couverte si l'appel tarde).
+        """
+        partition = (self.namespace or "") if namespace is None else namespace
+        key = (Config.EMBEDDING_MODEL, query)
+        embedding = self._embedding_cache.get(partition, key)
+        if embedding is not None:
+            return embedding
+
+        embedding, shared = self._embedding_flight.do(key, lambda: hedged(
+            "openai", lambda: self.embeddings.embed_query(query), Config.HEDGE_EMBEDDING_DELAY_MS
+        ))
+        record_cache("inflight_embedding", shared)
+        self._embedding_cache.put(partition, key, embedding)
+        return embedding
+
+    def _query_index(self, query: str, search_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Interroge l'index (cache LRU avec TTL, appels identiques concurrents partagés,
+        disjoncteur Pinecone, requête couverte si l'appel tarde; l'index local est
+        interrogé directement).
+        """
+        namespace = search_kwargs.get("namespace", "")
+        key = (
+            query,
+            Config.EMBEDDING_MODEL,
+            namespace,
+            search_kwargs["top_k"],
+            search_kwargs.get("include_values", False),
+            repr(search_kwargs.get("filter")),
+        )
+        results = self._search_cache.get(namespace, key)
+        if results is not None:
+            return results
+
+        if self.local_index:
+            search = lambda: self.index.query(**search_kwargs)
+        else:
+            breaker = get_breaker("pinecone")
+            search = lambda: hedged(
+                "pinecone", lambda: self._bounded_index_query(breaker, search_kwargs), Config.HEDGE_PINECONE_DELAY_MS
+            )
+        results, shared = self._pinecone_flight.do(key, search)
+        record_cache("inflight_pinecone", shared)
+        self._search_cache.put(namespace, key, results)
+        return results
+
+    def _bounded_index_query(self, breaker: CircuitBreaker, search_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Requête Pinecone sous le disjoncteur, bornée par le temps restant de la requête
+        (sinon HTTP_READ_TIMEOUT): un appel bloqué lève TimeoutError, compté comme échec.
+        """
+        left = time_left()
+        if left is not None and left <= 0:
+            # Délai épuisé avant l'appel: rien à imputer au service
+            raise TimeoutError("Délai de la requête écoulé")
+        timeout = Config.HTTP_READ_TIMEOUT if left is None else min(left, Config.HTTP_READ_TIMEOUT)
+        return breaker.call(bounded, lambda: self.index.query(**search_kwargs), timeout)
+
+    async def get_pinecone_context_async(
+        self, queries: List[str], session: Optional[SessionRetrievalContext] = None, namespace: Optional[str] = None
+    ) -> Tuple[str, List[Dict]]:
         """Récupère le contexte Pinecone en parallèle."""
         logger.info(f"🔎 Recherche Pinecone avec {len(queries)} requêtes...")
 
         try:
-            # Recherches en parallèle
-            tasks = [self.search_pinecone_async(q) for q in queries]
-            all_results = await asyncio.gather(*tasks)
-
-            # Déduplique les résultats par ID
-            all_matches = [match for sublist in all_results for match in sublist]
-            unique_chunks_dict = {match['id']: match for match in all_matches}
-            unique_chunks = list(unique_chunks_dict.values())
-
-            # Trie par score de similarité (décroissant)
-            unique_chunks.sort(key=lambda x: x.get('score', 0), reverse=True)
-
-            # Formate le contexte
-            context_parts = []
-            chunks_info = []
-            total_chars = 0
-
-            for i, chunk in enumerate(unique_chunks):
-                metadata = chunk.get('metadata', {})
-                text = metadata.get('text', '')
-                source = metadata.get('source', metadata.get('filename', 'Inconnue'))
-                article = metadata.get('article', 'N/A')
-                score = chunk.get('score', 0)
-
-                part = f"""Source: {source}
-Article/Section: {article}
-Score de pertinence: {score:.2f}
-Texte: {text}"""
-
-                # Limite la longueur totale
-                if total_chars + len(part) > Config.MAX_CONTEXT_TOKENS:
-                    logger.info(f"   ⚠️  Limite de contexte atteinte ({Config.MAX_CONTEXT_TOKENS} chars), arrêt à {i+1} chunks")
-                    break
-
-                context_parts.append(part)
-                chunks_info.append({
-                    'source': source,
-                    'article': article,
-                    'score': score,
-                    'text': text[:200]
-                })
-                total_chars += len(part)
-
-            context_text = "\n\n---\n\n".join(context_parts)
-
-            logger.info(f"✅ Contexte Pinecone: {len(context_parts)} chunks, {total_chars} caractères")
-            logger.info(f"   Top 3 sources:")
-            for i, info in enumerate(chunks_info[:3], 1):
-                logger.info(f"      {i}. {info['source']} (score: {info['score']:.2f})")
-
+            # Recherches en parallèle, dans le budget de l'étape (les tâches héritent du sous-délai)
+            with span("retrieval"), stage_deadline(Config.DEADLINE_RETRIEVAL_MS, Config.DEADLINE_SYNTHESIS_MS, essential=True) as deadline:
+                tasks = [asyncio.ensure_future(self.search_pinecone_async(q, session, namespace)) for q in queries]
+                timeout = deadline.remaining() if deadline is not None else None
+                if Config.ADAPTIVE_RETRIEVAL:
+                    all_results = await self._gather_adaptive(tasks, timeout)
+                else:
+                    all_results = await self._gather_within(tasks, timeout)
+
+            with span("context_build"):
+                context_text, chunks_info = self._build_context(all_results, queries[0])
             return context_text, chunks_info
 
         except Exception as e:
             logger.error(f"❌ Erreur get_pinecone_context: {e}")
             return "", []
 
-    def get_pinecone_context(self, queries: List[str]) -> Tuple[str, List[Dict]]:
+    async def _gather_within(
+        self, tasks: List[asyncio.Future], timeout: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Attend toutes les recherches, dans la limite du budget de l'étape (None = sans limite)."""
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            degrade("retrieval", f"{len(pending)}/{len(tasks)} recherche(s) abandonnée(s)")
+            SEARCHES.inc(len(pending), outcome="cancelled")
+        SEARCHES.inc(len(done), outcome="completed")
+        return [task.result() for task in tasks if task in done]
+
+    async def _gather_adaptive(
+        self, tasks: List[asyncio.Future], timeout: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Collecte les résultats au fil de l'eau et s'arrête dès que le budget de
+        contexte est rempli de chunks confiants, ou que le délai est écoulé.
+        La recherche sur la question originale (première tâche) est attendue,
+        sauf si le budget de l'étape (timeout) est épuisé avant.
+        """
+        loop = asyncio.get_running_loop()
+        budget_limited = timeout is not None and timeout < Config.ADAPTIVE_DEADLINE_MS / 1000
+        deadline = loop.time() + (timeout if budget_limited else Config.ADAPTIVE_DEADLINE_MS / 1000)
+        original = tasks[0]
+        pending = set(tasks)
+        results = []
+        confident_chars: Dict[str, int] = {}
+        reason = "toutes les recherches terminées"
+
+        while pending:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                reason = "budget de l'étape écoulé" if budget_limited else f"délai de {Config.ADAPTIVE_DEADLINE_MS} ms écoulé"
+                break
+
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                matches = task.result()
+                results.append(matches)
+                for match in matches:
+                    if match.get('score', 0) >= Config.ADAPTIVE_MIN_SCORE:
+                        part, _ = self._format_chunk(match)
+                        confident_chars[match['id']] = len(part)
+
+            if original.done() and sum(confident_chars.values()) >= Config.MAX_CONTEXT_TOKENS:
+                reason = "budget de contexte rempli"
+                break
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        completed = len(tasks) - len(pending)
+        SEARCHES.inc(completed, outcome="completed")
+        SEARCHES.inc(len(pending), outcome="cancelled")
+        trace = current_trace()
+        if trace is not None:
+            trace.incr("searches_cancelled", len(pending))
+
+        if pending:
+            logger.info(f"⚡ Recherche adaptative: {completed}/{len(tasks)} recherches utilisées, {len(pending)} annulées ({reason})")
+            if budget_limited and not original.done():
+                degrade("retrieval", f"{len(pending)}/{len(tasks)} recherche(s) abandonnée(s)")
+        return results
+
+    def _format_chunk(self, chunk: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Formate un chunk pour le prompt et retourne (texte, infos source)."""
+        metadata = chunk.get('metadata', {})
+        info = {
+            'id': chunk.get('id'),
+            'source': metadata.get('source', metadata.get('filename', 'Inconnue')),
+            'article': metadata.get('article', 'N/A'),
+            'score': chunk.get('score', 0),
+            # Texte complet: le contexte est rendu (et éventuellement réduit) à partir des infos
+            'text': metadata.get('text', '')
+        }
+        return format_entry(info, self.context_format), info
+
+    def _build_context(self, all_results: List[List[Dict[str, Any]]], question: str = "") -> Tuple[str, List[Dict]]:
+        """Fusionne les résultats de recherche, les reclasse si activé, et formate le contexte."""
+        # Déduplique les résultats par ID
+        all_matches = [match for sublist in all_results for match in sublist]
+        unique_chunks_dict = {match['id']: match for match in all_matches}
+        unique_chunks = list(unique_chunks_dict.values())
+
+        # Trie par score de similarité (décroissant)
+        unique_chunks.sort(key=lambda x: x.get('score', 0), reverse=True)
+
+        # Reclassement: seuls les meilleurs candidats entrent dans le contexte
+        rerank_scores: Dict[str, Optional[float]] = {}
+        max_chunks = None
+        if self.reranker is not None and question and unique_chunks:
+            with span("rerank"):
+                ranked = self.reranker.rerank(question, unique_chunks)
+            unique_chunks = [chunk for chunk, _ in ranked]
+            rerank_scores = {chunk['id']: score for chunk, score in ranked}
+            max_chunks = Config.RERANK_TOP_N
+            logger.info(f"🏅 Reclassement ({self.reranker.name}): {min(len(unique_chunks), max_chunks)} chunks visés")
+
+        # Formate le contexte
+        context_parts = []
+        chunks_info = []
+        total_chars = 0
+        duplicates = 0
+
+        candidates = self._context_candidates(unique_chunks, rerank_scores)
+        for i, (chunk, duplicate) in enumerate(candidates):
+            if duplicate:
+                duplicates += 1
+                continue
+
+            part, info = self._format_chunk(chunk)
+            if rerank_scores.get(chunk['id']) is not None:
+                info['rerank_score'] = rerank_scores[chunk['id']]
+
+            # Limite la longueur totale
+            if total_chars + len(part) > Config.MAX_CONTEXT_TOKENS:
+                logger.info(f"   ⚠️  Limite de contexte atteinte ({Config.MAX_CONTEXT_TOKENS} chars), arrêt à {i+1} chunks")
+                break
+
+            context_parts.append(part)
+            chunks_info.append(info)
+            total_chars += len(part)
+            if max_chunks is not None and len(context_parts) >= max_chunks:
+                break
+
+        if duplicates:
+            logger.info(f"   ♻️  {duplicates} quasi-doublon(s) écarté(s) du contexte")
+            record_duplicates(duplicates, Config.CONTEXT_DEDUP.lower())
+
+        context_text = render_context(chunks_info, self.context_format)
+        trace = current_trace()
+        if trace is not None:
+            trace.annotate("chunks", [
+                {"id": info['id'], "score": round(info['score'], 4), "rerank": info.get('rerank_score')}
+                for info in chunks_info
+            ])
+
+        logger.info(f"✅ Contexte Pinecone ({self.context_format}): {len(context_parts)} chunks, {len(context_text)} caractères")
+        logger.info(f"   Top 3 sources:")
+        for i, info in enumerate(chunks_info[:3], 1):
+            logger.info(f"      {i}. {info['source']} (score: {info['score']:.2f})")
+
+        return context_text, chunks_info
+
+    def _context_candidates(
+        self, chunks: List[Dict[str, Any]], rerank_scores: Dict[str, Optional[float]]
+    ) -> Iterator[Tuple[Dict[str, Any], bool]]:
+        """Candidats dans l'ordre d'insertion dans le contexte, avec un indicateur de quasi-doublon."""
+        mode = Config.CONTEXT_DEDUP.lower()
+
+        if mode == "mmr":
+            relevance = [
+                rerank_scores.get(c['id']) if rerank_scores.get(c['id']) is not None else c.get('score', 0)
+                for c in chunks
+            ]
+            yield from mmr_order(chunks, relevance, Config.MMR_LAMBDA, Config.MMR_MAX_SIMILARITY)
+            return
+
+        if mode == "simhash":
+            duplicate_filter = get_duplicate_filter()
+            kept: List[int] = []
+            for chunk in chunks:
+                yield chunk, not duplicate_filter.admit(chunk, kept)
+            return
+
+        for chunk in chunks:
+            yield chunk, False
+
+    def get_pinecone_context(
+        self, queries: List[str], session: Optional[SessionRetrievalContext] = None, namespace: Optional[str] = None
+    ) -> Tuple[str, List[Dict]]:
         """Version synchrone wrapper."""
-        return asyncio.run(self.get_pinecone_context_async(queries))
+        return asyncio.run(self.get_pinecone_context_async(queries, session, namespace))
 
     def get_web_context(self, queries: List[str]) -> str:
         """Recherche sur le web avec Tavily."""
@@ -443,11 +713,12 @@ Texte: {text}"""
                 # Enrichit la requête pour cibler le Québec
                 quebec_query = f"{query} Québec Canada"
 
-                response = self.tavily_client.search(
-                    query=quebec_query,
-                    search_depth="advanced",
-                    max_results=3
-                )
+                with span("web_search"):
+                    response = self.tavily_client.search(
+                        query=quebec_query,
+                        search_depth="advanced",
+                        max_results=3
+                    )
 
                 for result in response.get('results', []):
                     content = result.get('content', '')[:600]
@@ -457,24 +728,73 @@ Texte: {text}"""
                     )
 
             logger.info(f"✅ Contexte Web: {len(all_web_context)} résultats")
-            return "\n\n---\n\n".join(all_web_context)
+            return CONTEXT_SEPARATOR.join(all_web_context)
 
         except Exception as e:
             logger.error(f"❌ Erreur recherche web: {e}")
-            return ""
-
-    def synthesize_answer(self, context_pinecone: str, context_web: str, question: str, chunks_info: List[Dict]) -> str:
-        """Synthétise la réponse finale."""
+            if is_timeout(e):
+                degrade("web", "délai de la recherche web dépassé")
+            # Les résultats déjà obtenus restent utilisables
+            return CONTEXT_SEPARATOR.join(all_web_context)
+
+    def synthesize_answer(
+        self,
+        context_pinecone: str,
+        context_web: str,
+        question: str,
+        chunks_info: List[Dict],
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Synthétise la réponse finale (transmise morceau par morceau à on_token si fourni)."""
         try:
             logger.info("✍️  Synthèse de la réponse...")
 
-            chain = self.synthesis_prompt | self.llm_synthesizer | StrOutputParser()
+            decision = self.router.route_synthesis(
+                question, chunks_info, len(context_pinecone) + len(context_web), bool(context_web)
+            )
+            chain = self.synthesis_prompt | self.router.llm(decision) | StrOutputParser()
+            callbacks = self.synthesizer_callbacks + self.router.callbacks(decision)
+            self.prompt_scaffolds["synthesis"].record_usage(
+                context_pinecone=context_pinecone,
+                context_web=context_web,
+                question=question
+            )
 
-            answer = chain.invoke({
+            inputs = {
                 "context_pinecone": context_pinecone,
                 "context_web": context_web,
                 "question": question
-            })
+            }
+            deadline = current_deadline()
+            # Contexte compact: les identifiants [S1] cités sont remplacés par le nom des sources
+            citations = CitationMapper(chunks_info) if self.context_format == COMPACT else None
+            with span("synthesis"), self.router.track(decision):
+                if on_token is None:
+                    answer = chain.invoke(inputs, config={"callbacks": callbacks})
+                    if citations is not None:
+                        answer = citations.map(answer)
+                else:
+                    parts = []
+                    interrupted = False
+                    for token in chain.stream(inputs, config={"callbacks": callbacks}):
+                        if citations is not None:
+                            token = citations.feed(token)
+                        parts.append(token)
+                        if token:
+                            on_token(token)
+                        if deadline is not None and deadline.expired():
+                            # Échéance atteinte: la réponse partielle est rendue telle quelle
+                            degrade("synthesis", "réponse interrompue à l'échéance")
+                            interrupted = True
+                            break
+                    tail = citations.flush() if citations is not None else ""
+                    if interrupted:
+                        tail += "\n\n_(Réponse interrompue: délai de traitement dépassé.)_"
+                    if tail:
+                        parts.append(tail)
+                        on_token(tail)
+                    answer = "".join(parts)
+            streamed_length = len(answer)
 
             # Vérifie que le disclaimer est présent
             if Config.LEGAL_DISCLAIMER not in answer:
@@ -490,24 +810,112 @@ Texte: {text}"""
                         seen_sources.add(source)
                         answer += f"- {source} (pertinence: {chunk['score']:.0%})\n"
 
+            # Disclaimer et sources ajoutés après le texte du modèle
+            if on_token is not None and len(answer) > streamed_length:
+                on_token(answer[streamed_length:])
+
             logger.info("✅ Réponse générée avec succès")
             return answer
 
         except Exception as e:
             logger.error(f"❌ Erreur synthèse: {e}")
+            if is_circuit_open(e):
+                return f"Désolé, le service de génération est momentanément indisponible. Veuillez réessayer dans quelques instants.\n\n{Config.LEGAL_DISCLAIMER}"
+            if is_timeout(e):
+                degrade("synthesis", "délai de synthèse dépassé")
+                return f"Désolé, la génération de la réponse a dépassé le délai imparti. Veuillez réessayer.\n\n{Config.LEGAL_DISCLAIMER}"
             return f"Désolé, une erreur s'est produite lors de la génération de la réponse.\n\n{Config.LEGAL_DISCLAIMER}"
 
-    def query(self, user_question: str, user_id: str = "default") -> Tuple[str, Dict[str, bool]]:
+    def query(
+        self,
+        user_question: str,
+        user_id: str = "default",
+        session: Optional[SessionRetrievalContext] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        profile: bool = False,
+        namespace: Optional[str] = None,
+        admission: Optional[Admission] = None,
+        deadline_at: Optional[float] = None,
+    ) -> Tuple[str, Dict[str, bool]]:
         """
         Fonction principale de requête avec guardrails de sécurité.
 
         Args:
             user_question: Question de l'utilisateur
             user_id: Identifiant utilisateur pour rate limiting
+            session: Contexte de recherche de la conversation (questions de suivi)
+            on_token: Reçoit la réponse au fil de la synthèse (non appelé si
+                la requête est bloquée ou servie par un appel identique en cours)
+            profile: Profile cette requête (en plus de PROFILE_SAMPLE_RATE)
+            namespace: Corpus interrogé (None = PINECONE_NAMESPACE), parmi NAMESPACES
+            admission: Place du quota du namespace déjà réservée par l'appelant (ex: l'API,
+                avant la file d'exécution), qui la libère
+            deadline_at: Échéance de la requête (time.monotonic), fixée à sa soumission
+                dans la file d'exécution (None = QUERY_DEADLINE_MS à partir de maintenant)
 
         Returns:
             Tuple[str, Dict]: (réponse, metadata sur les sources utilisées)
         """
+        if not Config.SESSION_CONTEXT:
+            session = None
+
+        with profile_block("query", force=profile) as profile_run:
+            with trace_request() as trace, request_deadline(Config.QUERY_DEADLINE_MS, deadline_at) as deadline:
+                with span("query"), get_tenants().admit(namespace, admission) as admission:
+                    if admission.admitted:
+                        answer, metadata = self._run_query(user_question, user_id, session, on_token, admission.namespace)
+                    else:
+                        answer, metadata = (
+                            f"{admission.rejection}\n\n{Config.LEGAL_DISCLAIMER}",
+                            {"used_pinecone": False, "used_web": False, "blocked": True, "reason": admission.rejection}
+                        )
+
+        if profile_run is not None:
+            metadata["profile"] = profile_run.path
+        metadata["timings_ms"] = trace.timings_ms()
+        if trace.attributes.get("routing"):
+            metadata["model_tiers"] = {stage: d["tier"] for stage, d in trace.attributes["routing"].items()}
+        # Dégradations du pipeline (éventuellement partagé) et de cette requête
+        metadata["degradations"] = list(dict.fromkeys(metadata.get("degradations", []) + deadline.degradations))
+        metadata["namespace"] = admission.namespace
+        metadata["config_version"] = config_version()
+        outcome = self._query_outcome(metadata)
+        QUERIES.inc(outcome=outcome)
+        if admission.admitted:
+            get_tenants().record(admission.namespace, outcome)
+        query_logger = get_query_logger()
+        if query_logger is not None:
+            query_logger.log(user_question, user_id, outcome, metadata, trace)
+        return answer, metadata
+
+    @staticmethod
+    def _query_outcome(metadata: Dict[str, Any]) -> str:
+        """Classe le résultat d'une requête pour les métriques."""
+        if metadata.get("blocked"):
+            return "blocked"
+        if metadata.get("error"):
+            return "error"
+        if not metadata.get("used_pinecone") and not metadata.get("used_web"):
+            return "no_context"
+        return "answered"
+
+    def enable_search_cache(self, maxsize: int):
+        """Active (ou agrandit) le cache des résultats Pinecone, ex: pour un batch."""
+        if maxsize > self._search_cache.maxsize:
+            self._search_cache.resize(maxsize)
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {"embedding": self._embedding_cache.stats(), "pinecone": self._search_cache.stats()}
+
+    def _run_query(
+        self,
+        user_question: str,
+        user_id: str,
+        session: Optional[SessionRetrievalContext] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        namespace: str = "",
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Exécute le pipeline complet (guardrails, recherche, synthèse) dans un namespace."""
         try:
             logger.info(f"📝 Nouvelle requête: {user_question[:100]}...")
 
@@ -515,7 +923,8 @@ Texte: {text}"""
             guardrails = get_guardrails()
 
             # Validation avec detection d'injection, rate limiting, etc.
-            is_valid, error_msg = guardrails.full_validation(user_question, user_id)
+            with span("guardrails"), stage_deadline(Config.DEADLINE_GUARDRAILS_MS, Config.DEADLINE_SYNTHESIS_MS):
+                is_valid, error_msg = guardrails.full_validation(user_question, user_id)
 
             if not is_valid:
                 logger.error(f"🚨 Requête invalide rejetée: {error_msg}")
@@ -528,44 +937,38 @@ Texte: {text}"""
             sanitized_question = guardrails.sanitize_input(user_question)
             logger.info(f"✅ Requête validée et sanitizée")
 
-            # 1. Générer les requêtes améliorées (utiliser la version sanitized)
-            queries = self.generate_queries(sanitized_question)
-
-            # 2. Récupérer le contexte Pinecone avec métadonnées
-            context_pinecone, chunks_info = self.get_pinecone_context(queries)
-
-            # 3. Décider si la recherche web est nécessaire
-            needs_web = len(context_pinecone) < Config.MIN_CONTEXT_LENGTH
-            context_web = ""
-
-            if needs_web:
-                logger.info("⚠️  Contexte Pinecone insuffisant, recherche web activée")
-                context_web = self.get_web_context(queries)
+            # Question de suivi: résolue contre le contexte de la session
+            follow_up = False
+            if session is not None:
+                sanitized_question, follow_up = session.resolve(sanitized_question)
+
+            # Le magasin de réponses est construit sur le namespace par défaut
+            use_store = self.answer_store is not None and not follow_up and namespace == (self.namespace or "")
+            stored = self._stored_answer(sanitized_question) if use_store else None
+            if stored is not None:
+                answer, metadata = stored
+                if on_token is not None:
+                    on_token(answer)
+                if session is not None:
+                    session.record_turn(sanitized_question, [])
+                return answer, {**metadata, "coalesced": False, "follow_up": False}
+
+            if follow_up:
+                # Dépend de l'historique de la session: pas de coalescence
+                answer, metadata = self._answer_question(sanitized_question, session, True, on_token, namespace)
+                coalesced = False
             else:
-                logger.info("✅ Contexte Pinecone suffisant, pas de recherche web")
-
-            # 4. Vérifier qu'on a au moins un contexte
-            if not context_pinecone and not context_web:
-                logger.warning("⚠️  Aucun contexte trouvé")
-                return (
-                    f"Désolé, je n'ai pas trouvé l'information pertinente dans la base de données ou sur le web pour répondre à cette question.\n\n{Config.LEGAL_DISCLAIMER}",
-                    {"used_pinecone": False, "used_web": False}
+                # Coalescence: les questions identiques en cours partagent un seul pipeline
+                (answer, metadata), coalesced = self._query_flight.do(
+                    self._query_flight_key(sanitized_question, namespace),
+                    lambda: self._answer_question(sanitized_question, session, False, on_token, namespace)
                 )
+                record_cache("inflight_query", coalesced)
+                if coalesced and session is not None:
+                    # Le pipeline partagé a rempli le contexte d'une autre session
+                    session.record_turn(sanitized_question, [])
 
-            # 5. Synthétiser la réponse (utiliser la version sanitized)
-            answer = self.synthesize_answer(context_pinecone, context_web, sanitized_question, chunks_info)
-
-            # 6. Métadonnées enrichies
-            metadata = {
-                "used_pinecone": bool(context_pinecone),
-                "used_web": bool(context_web),
-                "chunks_found": len(chunks_info),
-                "queries_generated": len(queries)
-            }
-
-            logger.info(f"✅ Requête complétée - Pinecone: {metadata['used_pinecone']}, Web: {metadata['used_web']}, Chunks: {metadata['chunks_found']}")
-
-            return answer, metadata
+            return answer, {**metadata, "coalesced": coalesced, "follow_up": follow_up}
 
         except Exception as e:
             logger.error(f"❌ Erreur critique dans query(): {e}", exc_info=True)
@@ -573,3 +976,131 @@ Texte: {text}"""
                 f"Désolé, une erreur technique s'est produite. Veuillez réessayer.\n\n{Config.LEGAL_DISCLAIMER}",
                 {"used_pinecone": False, "used_web": False, "error": True}
             )
+
+    def _stored_answer(self, question: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Réponse pré-calculée d'une question fréquente (même question ou question voisine)."""
+        with span("answer_store"):
+            entry = self.answer_store.lookup_text(question)
+            similarity = 1.0
+            if entry is None:
+                try:
+                    # Embedding mis en cache: réutilisé par la recherche si la question n'est pas servie ici
+                    found = self.answer_store.lookup(question, self._embed_query(question))
+                except Exception as e:
+                    logger.warning(f"⚠️  Magasin de réponses indisponible pour cette requête: {e}")
+                    found = None
+                if found is None:
+                    record_lookup("miss")
+                    return None
+                entry, similarity = found
+
+        record_lookup("hit")
+        logger.info(f"⚡ Réponse pré-calculée (similarité {similarity:.3f}): '{entry['question'][:60]}'")
+        return entry["answer"], {**entry["metadata"], "answer_store": True, "answer_store_similarity": round(similarity, 4)}
+
+    def _follow_up_queries(self, question: str, session: SessionRetrievalContext) -> List[str]:
+        """
+        Requêtes d'une question de suivi, sans expansion LLM: la question résolue
+        (ou les requêtes ciblées si elle vise un article) + les requêtes du tour
+        précédent, déjà en cache dans la session.
+        """
+        if parse_legal_entities(question).first_article:
+            queries = self.generate_queries(question)
+        else:
+            queries = [question]
+
+        seen = {q.lower() for q in queries}
+        previous = [q for q in session.previous_queries() if q.lower() not in seen]
+
+        logger.info(f"🧵 Suivi: {len(queries)} nouvelle(s) requête(s) + {len(previous)} du tour précédent")
+        return (queries + previous)[:10]
+
+    def _query_flight_key(self, question: str, namespace: str) -> Tuple[str, ...]:
+        """Clé de coalescence: question normalisée, namespace et modèles."""
+        return (
+            normalize_question(question),
+            namespace,
+            Config.EMBEDDING_MODEL,
+            Config.EXPANDER_MODEL,
+            Config.SYNTHESIZER_MODEL,
+        )
+
+    def _answer_question(
+        self,
+        sanitized_question: str,
+        session: Optional[SessionRetrievalContext] = None,
+        follow_up: bool = False,
+        on_token: Optional[Callable[[str], None]] = None,
+        namespace: str = "",
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Recherche et synthèse pour une question déjà validée."""
+        # 1. Générer les requêtes améliorées (utiliser la version sanitized)
+        if follow_up:
+            queries = self._follow_up_queries(sanitized_question, session)
+        else:
+            queries = self.generate_queries(sanitized_question)
+        trace = current_trace()
+        if trace is not None:
+            trace.annotate("queries", queries)
+
+        # 2. Récupérer le contexte Pinecone avec métadonnées
+        context_pinecone, chunks_info = self.get_pinecone_context(queries, session, namespace)
+        if session is not None:
+            session.record_turn(sanitized_question, queries)
+
+        # 3. Décider si la recherche web est nécessaire
+        needs_web = len(context_pinecone) < Config.MIN_CONTEXT_LENGTH
+        context_web = ""
+
+        if needs_web and not allows(Config.DEADLINE_WEB_MS, Config.DEADLINE_SYNTHESIS_MS):
+            degrade("web", "temps insuffisant pour la recherche web")
+        elif needs_web:
+            logger.info("⚠️  Contexte Pinecone insuffisant, recherche web activée")
+            with stage_deadline(Config.DEADLINE_WEB_MS, Config.DEADLINE_SYNTHESIS_MS):
+                context_web = self.get_web_context(queries)
+        else:
+            logger.info("✅ Contexte Pinecone suffisant, pas de recherche web")
+
+        # 4. Vérifier qu'on a au moins un contexte
+        if not context_pinecone and not context_web:
+            logger.warning("⚠️  Aucun contexte trouvé")
+            return (
+                f"Désolé, je n'ai pas trouvé l'information pertinente dans la base de données ou sur le web pour répondre à cette question.\n\n{Config.LEGAL_DISCLAIMER}",
+                {"used_pinecone": False, "used_web": False, "degradations": degradations()}
+            )
+
+        # 5. Synthétiser la réponse (utiliser la version sanitized), contexte réduit si le temps manque
+        context_pinecone, chunks_info = self._fit_context_to_deadline(context_pinecone, chunks_info)
+        answer = self.synthesize_answer(context_pinecone, context_web, sanitized_question, chunks_info, on_token)
+
+        # 6. Métadonnées enrichies
+        metadata = {
+            "used_pinecone": bool(context_pinecone),
+            "used_web": bool(context_web),
+            "chunks_found": len(chunks_info),
+            "queries_generated": len(queries),
+            "degradations": degradations()
+        }
+
+        logger.info(f"✅ Requête complétée - Pinecone: {metadata['used_pinecone']}, Web: {metadata['used_web']}, Chunks: {metadata['chunks_found']}")
+
+        return answer, metadata
+
+    def _fit_context_to_deadline(self, context: str, chunks_info: List[Dict]) -> Tuple[str, List[Dict]]:
+        """
+        Réduit le contexte Pinecone quand le temps restant ne couvre plus le
+        budget de synthèse: moins d'extraits, donc moins de tokens à traiter.
+        """
+        deadline = current_deadline()
+        if deadline is None or len(chunks_info) <= 1:
+            return context, chunks_info
+
+        ratio = deadline.remaining() * 1000 / Config.DEADLINE_SYNTHESIS_MS
+        if ratio >= 1:
+            return context, chunks_info
+
+        keep = max(1, int(len(chunks_info) * max(ratio, 0.25)))
+        if keep >= len(chunks_info):
+            return context, chunks_info
+        deadline.degrade("context", f"contexte réduit à {keep}/{len(chunks_info)} extraits")
+        return render_context(chunks_info[:keep], self.context_format), chunks_info[:keep]
@@ -0,0 +1,136 @@
+"""
+Reclassement (rerank) des chunks candidats avant la construction du contexte.
+
+Deux modes, tous deux sur CPU:
+- "features": score léger combinant le score Pinecone, la correspondance
+  d'article, la correspondance de code et le recouvrement de termes;
+- "cross-encoder": petit cross-encoder (sentence-transformers, optionnel),
+  évalué par lots dans un budget de latence.
+"""
+
+import re
+import time
+import logging
+import unicodedata
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import Config
+from legal_entities import code_families, parse_legal_entities
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    "les", "des", "une", "pour", "dans", "avec", "sans", "sont", "est", "que", "qui",
+    "quoi", "quel", "quelle", "quels", "quelles", "comment", "pourquoi", "selon",
+    "mon", "mes", "son", "ses", "leur", "leurs", "sur", "par", "aux", "cette", "ces",
+    "québec", "quebec", "article", "articles",
+}
+
+# (chunk, score de reclassement ou None si non évalué)
+ScoredChunk = Tuple[Dict[str, Any], Optional[float]]
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _fold(text: str) -> str:
+    return unicodedata.normalize("NFC", text).casefold()
+
+
+def _terms(text: str) -> Set[str]:
+    return {w for w in _WORD_RE.findall(_fold(text)) if len(w) > 3 and w not in STOPWORDS}
+
+
+class FeatureReranker:
+    """Reclassement par caractéristiques simples, sans modèle."""
+
+    name = "features"
+
+    # Poids des caractéristiques (le score Pinecone reste la base)
+    WEIGHT_VECTOR = 1.0
+    WEIGHT_ARTICLE = 0.35
+    WEIGHT_CODE = 0.15
+    WEIGHT_OVERLAP = 0.3
+
+    def feature_score(self, chunk: Dict[str, Any], articles: Set[str], codes: Set[str], terms: Set[str]) -> float:
+        metadata = chunk.get('metadata', {})
+        text = metadata.get('text', '')
+        source = metadata.get('source', metadata.get('filename', ''))
+        article_field = f"{metadata.get('article_num', '')} {metadata.get('article', '')}"
+
+        score = self.WEIGHT_VECTOR * chunk.get('score', 0)
+
+        if articles and articles & set(_NUMBER_RE.findall(article_field)):
+            score += self.WEIGHT_ARTICLE
+
+        if codes and codes.intersection(code_families(f"{source} {text[:300]}")):
+            score += self.WEIGHT_CODE
+
+        if terms:
+            overlap = len(terms & _terms(text)) / len(terms)
+            score += self.WEIGHT_OVERLAP * overlap
+
+        return score
+
+    def rerank(self, question: str, chunks: List[Dict[str, Any]]) -> List[ScoredChunk]:
+        """
+        Retourne les chunks triés avec leur score de reclassement.
+
+        Les chunks ne sont pas modifiés: ils peuvent être partagés entre
+        requêtes concurrentes (voir singleflight.py).
+        """
+        parsed = parse_legal_entities(question)
+        articles = set(parsed.article_numbers)
+        codes = set(parsed.codes)
+        terms = _terms(question)
+
+        scored = [(chunk, self.feature_score(chunk, articles, codes, terms)) for chunk in chunks]
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+
+class CrossEncoderReranker(FeatureReranker):
+    """Reclassement par cross-encoder, par lots, dans un budget de latence."""
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, device="cpu")
+        logger.info(f"✅ Cross-encoder chargé: {model_name}")
+
+    def rerank(self, question: str, chunks: List[Dict[str, Any]]) -> List[ScoredChunk]:
+        # Ordre de départ: score par caractéristiques, pour que le budget serve aux meilleurs candidats
+        ordered = [chunk for chunk, _ in super().rerank(question, chunks)]
+        deadline = time.perf_counter() + Config.RERANK_BUDGET_MS / 1000
+        batch_size = Config.RERANK_BATCH_SIZE
+
+        scored: List[ScoredChunk] = []
+        for start in range(0, len(ordered), batch_size):
+            if time.perf_counter() >= deadline:
+                logger.info(f"   ⏱️  Budget de rerank atteint après {len(scored)}/{len(ordered)} chunks")
+                break
+            batch = ordered[start:start + batch_size]
+            pairs = [(question, c.get('metadata', {}).get('text', '')) for c in batch]
+            scored.extend((chunk, float(ce_score)) for chunk, ce_score in zip(batch, self.model.predict(pairs)))
+
+        # Les chunks évalués passent devant, les autres gardent l'ordre par caractéristiques
+        remaining = [(chunk, None) for chunk in ordered[len(scored):]]
+        return sorted(scored, key=lambda item: item[1], reverse=True) + remaining
+
+
+def build_reranker() -> Optional[FeatureReranker]:
+    """Construit le reranker configuré (None si désactivé)."""
+    mode = Config.RERANKER.lower()
+    if mode in ("", "none", "off"):
+        return None
+
+    if mode == "cross-encoder":
+        try:
+            return CrossEncoderReranker(Config.RERANK_MODEL)
+        except ImportError:
+            logger.warning("⚠️  sentence-transformers absent, reclassement par caractéristiques")
+        except Exception as e:
+            logger.error(f"❌ Erreur chargement cross-encoder: {e}. Reclassement par caractéristiques")
+
+    logger.info("✅ Reranker par caractéristiques activé")
+    return FeatureReranker()
@@ -0,0 +1,292 @@
+"""
+Disjoncteurs par service amont et requêtes couvertes (hedging).
+
+- Disjoncteur: après BREAKER_FAILURE_THRESHOLD échecs consécutifs (erreurs
+  réseau, timeouts, 5xx), le circuit s'ouvre et les appels vers ce service
+  échouent immédiatement (CircuitOpenError) au lieu d'attendre leur timeout.
+  Après BREAKER_RESET_TIMEOUT, un seul appel d'essai est laissé passer: son
+  succès referme le circuit, son échec le rouvre.
+- Requête couverte: pour les appels idempotents et sensibles à la latence
+  (embeddings, requêtes vectorielles), un second appel identique est lancé si
+  le premier n'a pas répondu après un délai; le premier résultat est retenu.
+
+Les disjoncteurs de Groq, OpenAI et Tavily sont branchés dans http_pool
+(transport partagé), celui de Pinecone autour des requêtes d'index, bornées
+par le temps restant de la requête (bounded): un appel bloqué compte comme
+un échec.
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+from urllib.parse import urlsplit
+
+from config import Config
+from metrics import REGISTRY
+from config_reload import on_config_change
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Valeur de la jauge rag_circuit_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+TRANSITIONS = REGISTRY.counter("rag_circuit_transitions_total", "Changements d'état des disjoncteurs")
+REJECTED = REGISTRY.counter("rag_circuit_rejected_total", "Appels refusés par un disjoncteur ouvert")
+HEDGES = REGISTRY.counter("rag_hedged_requests_total", "Requêtes couvertes lancées, par appel retenu")
+
+
+class CircuitOpenError(Exception):
+    """Le disjoncteur du service est ouvert: l'appel est refusé sans être tenté."""
+
+    def __init__(self, upstream: str):
+        super().__init__(f"Service {upstream} momentanément indisponible (disjoncteur ouvert)")
+        self.upstream = upstream
+
+
+class CircuitBreaker:
+    """Disjoncteur à échecs consécutifs (fermé → ouvert → semi-ouvert)."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, state: str):
+        self._state = state
+        TRANSITIONS.inc(upstream=self.name, state=state)
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            logger.warning(f"🔴 Disjoncteur {self.name} ouvert ({self._failures} échecs consécutifs)")
+        elif state == HALF_OPEN:
+            logger.info(f"🟡 Disjoncteur {self.name} semi-ouvert: appel d'essai autorisé")
+        else:
+            logger.info(f"🟢 Disjoncteur {self.name} refermé")
+
+    def allow(self) -> bool:
+        """Vrai si un appel peut être tenté (un seul appel d'essai à la fois en semi-ouvert)."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == HALF_OPEN and (
+                self._probe_started is None or now - self._probe_started >= self.reset_timeout
+            ):
+                self._probe_started = now
+                return True
+        REJECTED.inc(upstream=self.name)
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_started = None
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._transition(OPEN)
+
+    def record_neutral(self):
+        """Issue non imputable au service (ex: délai de la requête épuisé): libère l'appel d'essai."""
+        with self._lock:
+            self._probe_started = None
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Exécute fn sous le disjoncteur (CircuitOpenError si ouvert)."""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {"state": self._state, "consecutive_failures": self._failures}
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Une erreur 4xx est une réponse du service (il est joignable); le reste compte comme échec."""
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    return not (isinstance(status, int) and status < 500 and status != 408)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    """Retourne le disjoncteur partagé d'un service amont."""
+    with _breakers_lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            breaker = _breakers[upstream] = CircuitBreaker(
+                upstream, Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_TIMEOUT
+            )
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def upstream_name(base_url: str) -> str:
+    """Nom du service amont d'une URL (groq, openai, tavily, pinecone), sinon son hôte."""
+    netloc = urlsplit(base_url).netloc
+    known = (
+        ("groq", Config.GROQ_BASE_URL),
+        ("openai", Config.OPENAI_BASE_URL),
+        ("tavily", Config.TAVILY_BASE_URL),
+        ("pinecone", Config.PINECONE_HOST or ""),
+    )
+    for name, url in known:
+        if url and urlsplit(url).netloc == netloc:
+            return name
+    return netloc
+
+
+def is_circuit_open(error: BaseException) -> bool:
+    """Vrai si l'erreur (ou sa cause, les SDK encapsulant les erreurs réseau) vient d'un circuit ouvert."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, CircuitOpenError):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=Config.IO_THREADS, thread_name_prefix="rag-hedge")
+        return _hedge_executor
+
+
+_bounded_executor: Optional[ThreadPoolExecutor] = None
+
+
+def bounded(fn: Callable[[], T], timeout: float) -> T:
+    """
+    Attend un appel bloquant au plus timeout secondes (TimeoutError au-delà),
+    pour les SDK sans timeout par appel. L'appel abandonné se termine dans un
+    pool dédié, sans occuper le pool d'I/O du moteur.
+    """
+    global _bounded_executor
+    with _hedge_lock:
+        if _bounded_executor is None:
+            _bounded_executor = ThreadPoolExecutor(max_workers=Config.IO_THREADS, thread_name_prefix="rag-bounded")
+    future = _bounded_executor.submit(contextvars.copy_context().run, fn)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"Pas de réponse après {timeout:.2f}s") from None
+
+
+def hedged(upstream: str, fn: Callable[[], T], delay_ms: float) -> T:
+    """
+    Exécute un appel idempotent; s'il n'a pas répondu après delay_ms, lance un
+    second appel identique et retourne le premier succès. Désactivé si
+    delay_ms <= 0 ou si le disjoncteur du service n'est pas fermé.
+    """
+    if delay_ms <= 0 or get_breaker(upstream).state != CLOSED:
+        return fn()
+
+    executor = _get_hedge_executor()
+    # Un contexte par appel: la trace et le délai de la requête suivent les deux essais
+    primary = executor.submit(contextvars.copy_context().run, fn)
+    wait([primary], timeout=delay_ms / 1000)
+    if primary.done():
+        return primary.result()
+
+    hedge = executor.submit(contextvars.copy_context().run, fn)
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                HEDGES.inc(upstream=upstream, winner="hedge" if future is hedge else "primary")
+                return future.result()
+            error = future.exception()
+    HEDGES.inc(upstream=upstream, winner="none")
+    raise error
+
+
+def _collect_breaker_metrics() -> List[str]:
+    """Expose l'état des disjoncteurs (0 fermé, 1 semi-ouvert, 2 ouvert)."""
+    stats = breaker_stats()
+    if not stats:
+        return []
+    lines = ["# TYPE rag_circuit_state gauge"]
+    for name, state in sorted(stats.items()):
+        lines.append(f'rag_circuit_state{{upstream="{name}"}} {STATE_VALUES[state["state"]]}')
+    return lines
+
+
+REGISTRY.register_collector(_collect_breaker_metrics)
+
+
+def _reload_breakers(changed: Set[str]):
+    """Applique les nouveaux seuils aux disjoncteurs existants (leur état est conservé)."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    for breaker in breakers:
+        breaker.failure_threshold = Config.BREAKER_FAILURE_THRESHOLD
+        breaker.reset_timeout = Config.BREAKER_RESET_TIMEOUT
+
+
+on_config_change({"BREAKER_FAILURE_THRESHOLD", "BREAKER_RESET_TIMEOUT"}, _reload_breakers)
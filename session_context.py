@@ -0,0 +1,200 @@
+"""
+Contexte de recherche par session de conversation.
+
+Garde en mémoire (bornée) les derniers tours d'une session: questions,
+requêtes, embeddings et chunks récupérés. Une question de suivi ("et pour
+l'article suivant?") est d'abord résolue contre ce contexte, et Pinecone
+n'est interrogé que pour les requêtes absentes du cache de la session.
+
+L'objet est conservé dans st.session_state (un par session Streamlit).
+"""
+
+import re
+import logging
+import threading
+from array import array
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+from config import Config
+from legal_entities import parse_legal_entities
+
+logger = logging.getLogger(__name__)
+
+_NEXT_RE = re.compile(r"\b(?:l['’]\s*)?article\s+suivant\b|\b(?:le|au|du)\s+suivant\b", re.IGNORECASE)
+_PREVIOUS_RE = re.compile(r"\b(?:l['’]\s*)?article\s+précédent\b|\b(?:le|au|du)\s+précédent\b", re.IGNORECASE)
+_SUFFIX_RE = re.compile(r"\s*\(suite de: .*\)$", re.DOTALL)
+_SAME_RE = re.compile(
+    r"\b(?:cet|ce même|le même|même)\s+article\b|\bcelui-(?:ci|là)\b", re.IGNORECASE
+)
+# Requêtes par tour au plus (expansion ou question de suivi), pour dimensionner le cache de chunks
+MAX_QUERIES_PER_TURN = 10
+
+_FOLLOW_UP_START_RE = re.compile(
+    r"^\s*(?:et\b|mais\b|aussi\b|alors\b|dans ce cas\b|qu'en est-il\b|qu’en est-il\b)",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class SessionTurn:
+    """Un tour de conversation déjà traité."""
+
+    question: str
+    queries: List[str] = field(default_factory=list)
+
+    @property
+    def article(self) -> Optional[int]:
+        article = parse_legal_entities(self.question).first_article
+        return int(article.split(".")[0]) if article else None
+
+
+class SessionRetrievalContext:
+    """Mémoire de recherche bornée d'une session de conversation."""
+
+    def __init__(
+        self,
+        max_turns: Optional[int] = None,
+        max_chunks: Optional[int] = None,
+        max_embeddings: Optional[int] = None,
+    ):
+        max_turns = max_turns or Config.SESSION_MAX_TURNS
+        self.max_chunks = (
+            max_chunks or Config.SESSION_MAX_CHUNKS or Config.PINECONE_TOP_K * MAX_QUERIES_PER_TURN * max_turns
+        )
+        self.max_embeddings = max_embeddings or Config.SESSION_MAX_EMBEDDINGS
+        self.turns: Deque[SessionTurn] = deque(maxlen=max_turns)
+        self._chunks: Dict[str, Dict[str, Any]] = {}
+        # Nombre de recherches en cache qui référencent chaque chunk
+        self._chunk_refs: Counter = Counter()
+        self._results: "OrderedDict[Hashable, List[Tuple[str, float]]]" = OrderedDict()
+        self._embeddings: "OrderedDict[Hashable, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # Résolution des questions de suivi
+    # ------------------------------------------------------------------
+
+    def resolve(self, question: str) -> Tuple[str, bool]:
+        """
+        Réécrit une question de suivi en question autonome.
+
+        Returns:
+            Tuple[str, bool]: (question résolue, True si c'est un suivi)
+        """
+        if not self.turns:
+            return question, False
+
+        last = self.turns[-1]
+        article = last.article
+        resolved = question
+
+        parsed = parse_legal_entities(question)
+        if article is not None and parsed.first_article is None:
+            if _NEXT_RE.search(question):
+                resolved = _NEXT_RE.sub(f"l'article {article + 1}", question)
+            elif _PREVIOUS_RE.search(question) and article > 1:
+                resolved = _PREVIOUS_RE.sub(f"l'article {article - 1}", question)
+            elif _SAME_RE.search(question):
+                resolved = _SAME_RE.sub(f"l'article {article}", question)
+
+        # Connecteur ("et", "qu'en est-il"...) sans article, code ni notion juridique propre:
+        # une question courte mais complète ("Qu'est-ce qu'une hypothèque?") reste autonome
+        elliptic = bool(_FOLLOW_UP_START_RE.search(question)) and not parsed.entities
+        follow_up = resolved != question or elliptic
+        if not follow_up:
+            return question, False
+
+        resolved = f"{resolved} (suite de: {_SUFFIX_RE.sub('', last.question)})"
+        logger.info(f"🧵 Question de suivi résolue: {resolved[:120]}")
+        return resolved, True
+
+    def record_turn(self, question: str, queries: List[str]):
+        with self._lock:
+            self.turns.append(SessionTurn(question=question, queries=list(queries)))
+
+    def previous_queries(self) -> List[str]:
+        """Requêtes du tour précédent (leurs résultats sont en cache)."""
+        return list(self.turns[-1].queries) if self.turns else []
+
+    # ------------------------------------------------------------------
+    # Caches bornés (embeddings, résultats de recherche, chunks)
+    # ------------------------------------------------------------------
+
+    def embedding(self, key: Hashable) -> Optional[List[float]]:
+        """Embedding d'une requête déjà calculé dans la session (clé: modèle et requête)."""
+        with self._lock:
+            vector = self._embeddings.get(key)
+            if vector is None:
+                return None
+            self._embeddings.move_to_end(key)
+            return vector.tolist()
+
+    def store_embedding(self, key: Hashable, vector: List[float]):
+        with self._lock:
+            # array('f'): 4 octets par dimension au lieu d'un objet float Python
+            self._embeddings[key] = array("f", vector)
+            self._embeddings.move_to_end(key)
+            while len(self._embeddings) > self.max_embeddings:
+                self._embeddings.popitem(last=False)
+
+    def cached_results(self, key: Hashable) -> Optional[List[Dict[str, Any]]]:
+        """Résultats filtrés d'une recherche déjà faite dans la session (None si absents)."""
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None or any(chunk_id not in self._chunks for chunk_id, _ in entry):
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            matches = []
+            for chunk_id, score in entry:
+                matches.append({**self._chunks[chunk_id], 'score': score})
+            return matches
+
+    def store_results(self, key: Hashable, matches: List[Dict[str, Any]]):
+        with self._lock:
+            previous = self._results.pop(key, None)
+            if previous is not None:
+                self._release(previous)
+            for m in matches:
+                # Les vecteurs ne sont pas conservés (mémoire)
+                self._chunks[m['id']] = {'id': m['id'], 'metadata': dict(m.get('metadata', {}))}
+                self._chunk_refs[m['id']] += 1
+            self._results[key] = [(m['id'], m.get('score', 0)) for m in matches]
+
+            # Éviction par recherche entière (la moins récente): une recherche
+            # amputée d'une partie de ses chunks devrait de toute façon être refaite
+            while len(self._chunks) > self.max_chunks and len(self._results) > 1:
+                _, evicted = self._results.popitem(last=False)
+                self._release(evicted)
+
+    def _release(self, entry: List[Tuple[str, float]]):
+        """Libère les chunks qui ne sont plus référencés par aucune recherche."""
+        for chunk_id, _ in entry:
+            self._chunk_refs[chunk_id] -= 1
+            if self._chunk_refs[chunk_id] <= 0:
+                del self._chunk_refs[chunk_id]
+                self._chunks.pop(chunk_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self._chunks.clear()
+            self._chunk_refs.clear()
+            self._results.clear()
+            self._embeddings.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "turns": len(self.turns),
+                "chunks": len(self._chunks),
+                "searches": len(self._results),
+                "embeddings": len(self._embeddings),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
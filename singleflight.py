@@ -0,0 +1,84 @@
+"""
+Coalescence des requêtes identiques en cours d'exécution ("single-flight").
+
+Quand plusieurs threads demandent le même résultat au même moment, un seul
+exécute réellement l'appel; les autres attendent et reçoivent son résultat
+(ou son exception).
+"""
+
+import re
+import logging
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(text: str) -> str:
+    """Normalise une question pour la comparaison (casse, accents composés, ponctuation finale, espaces)."""
+    text = unicodedata.normalize("NFC", text).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?!.")
+
+
+class _Call:
+    """Appel en cours partagé entre le meneur et ses suiveurs."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Déduplique les appels concurrents portant la même clé."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced_total = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Exécute fn une seule fois pour tous les appels concurrents de même clé.
+
+        Returns:
+            Tuple[Any, bool]: (résultat, True si le résultat a été partagé)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.coalesced_total += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.followers:
+                logger.info(f"🔗 {self.name}: {call.followers} requête(s) identique(s) servie(s) par un seul appel")
+
+        return call.result, False
+
+    def in_flight(self) -> int:
+        """Nombre de clés en cours d'exécution."""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,240 @@
+"""
+Namespaces servis par un même déploiement (ex: civil, criminel, documents
+d'un client), choisis par requête.
+
+Chaque namespace a ses quotas (requêtes simultanées, requêtes par minute):
+au-delà, la requête est refusée immédiatement plutôt que d'occuper un worker,
+de sorte qu'un namespace très sollicité n'affame pas les autres. Les caches
+du moteur sont partitionnés par namespace (cache.PartitionedCache) et les
+latences, issues et requêtes en cours sont exportées par namespace.
+
+Les quotas (et le rate limiting des guardrails) sont tenus en mémoire, par
+processus: sous l'API, chacun des API_WORKERS processus en applique sa part
+(set_processes, per_process) pour que le total reste proche du quota configuré.
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from config import Config
+from metrics import REGISTRY
+from config_reload import on_config_change
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_QUERIES = REGISTRY.counter("rag_namespace_queries_total", "Requêtes par namespace et par issue")
+NAMESPACE_LATENCY = REGISTRY.summary("rag_namespace_query_duration_seconds", "Durée des requêtes par namespace")
+
+# Libellé du namespace par défaut de Pinecone ("") dans les métriques et les journaux
+DEFAULT_LABEL = "default"
+
+
+# Processus qui se partagent les quotas configurés (1 hors API)
+_processes = 1
+
+
+def label(namespace: str) -> str:
+    return namespace or DEFAULT_LABEL
+
+
+def per_process(limit: int) -> int:
+    """Part d'une limite globale appliquée par ce processus (0 = illimité; au moins 1 sinon)."""
+    if limit <= 0 or _processes == 1:
+        return limit
+    return max(1, math.ceil(limit / _processes))
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """"namespace:simultanées:par_minute,..." → {namespace: (simultanées, par_minute)}."""
+    limits = {}
+    for item in spec.split(","):
+        parts = item.strip().rsplit(":", 2)
+        if len(parts) == 3:
+            try:
+                limits[parts[0]] = (int(parts[1]), int(parts[2]))
+            except ValueError:
+                logger.warning(f"⚠️  Quota de namespace invalide ignoré: {item}")
+    return limits
+
+
+class NamespaceQuota:
+    """Requêtes simultanées et par minute d'un namespace (0 = illimité)."""
+
+    def __init__(self, namespace: str, max_concurrency: int, per_minute: int):
+        self.namespace = namespace
+        self.max_concurrency = max_concurrency
+        self.per_minute = per_minute
+        self.active = 0
+        self._recent: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[str]:
+        """Réserve une place; retourne le motif du refus si le quota est atteint."""
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self.max_concurrency and self.active >= self.max_concurrency:
+                return f"⏳ Trop de requêtes simultanées pour « {label(self.namespace)} ». Réessayez dans quelques secondes."
+            if self.per_minute and len(self._recent) >= self.per_minute:
+                return f"⏳ Limite de « {label(self.namespace)} » atteinte: {self.per_minute}/minute. Attendez quelques secondes."
+            self.active += 1
+            self._recent.append(now)
+            return None
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+class Admission:
+    """Résultat de l'admission d'une requête: namespace résolu, motif de refus éventuel, place réservée."""
+
+    def __init__(self, namespace: str, rejection: Optional[str] = None, quota: Optional[NamespaceQuota] = None):
+        self.namespace = namespace
+        self.rejection = rejection
+        self.started = time.perf_counter()
+        self._quota = quota
+
+    @property
+    def admitted(self) -> bool:
+        return self.rejection is None
+
+
+class TenantRegistry:
+    """Namespaces autorisés et leurs quotas."""
+
+    def __init__(
+        self, default: str, others: List[str], max_concurrency: int, per_minute: int,
+        limits: Dict[str, Tuple[int, int]],
+    ):
+        self.default = default
+        self.allowed = {default, *others}
+        self._quotas = {
+            namespace: NamespaceQuota(
+                namespace, *map(per_process, limits.get(namespace, (max_concurrency, per_minute)))
+            )
+            for namespace in self.allowed
+        }
+
+    def resolve(self, namespace: Optional[str]) -> Optional[str]:
+        """Namespace de la requête (None = namespace par défaut), None s'il n'est pas servi ici."""
+        if namespace is None:
+            return self.default
+        return namespace if namespace in self.allowed else None
+
+    def acquire(self, namespace: Optional[str]) -> Admission:
+        """
+        Réserve une place dans le quota du namespace. Une admission acceptée
+        doit être libérée par release(), ex: à la fin du travail qui la porte.
+        """
+        resolved = self.resolve(namespace)
+        if resolved is None:
+            NAMESPACE_QUERIES.inc(namespace="inconnu", outcome="rejected")
+            return Admission(namespace or "", f"❌ Namespace inconnu: « {namespace} ».")
+
+        quota = self._quotas[resolved]
+        rejection = quota.try_acquire()
+        if rejection is not None:
+            NAMESPACE_QUERIES.inc(namespace=label(resolved), outcome="rejected")
+            logger.warning(f"🚦 Quota du namespace {label(resolved)} atteint: {rejection}")
+            return Admission(resolved, rejection)
+        return Admission(resolved, quota=quota)
+
+    @staticmethod
+    def release(admission: Admission):
+        """Libère la place d'une admission acceptée (dans le registre qui l'a donnée)."""
+        if admission._quota is not None:
+            admission._quota.release()
+            admission._quota = None
+            NAMESPACE_LATENCY.observe(time.perf_counter() - admission.started, namespace=label(admission.namespace))
+
+    @contextmanager
+    def admit(self, namespace: Optional[str], reserved: Optional[Admission] = None) -> Iterator[Admission]:
+        """
+        Réserve une place dans le quota du namespace pour la durée de la requête
+        (sauf si l'appelant l'a déjà réservée: reserved, libérée par lui).
+        """
+        if reserved is not None:
+            yield reserved
+            return
+        admission = self.acquire(namespace)
+        try:
+            yield admission
+        finally:
+            self.release(admission)
+
+    def record(self, namespace: str, outcome: str):
+        """Compte l'issue d'une requête admise (answered, blocked, error, no_context)."""
+        NAMESPACE_QUERIES.inc(namespace=label(namespace), outcome=outcome)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            label(namespace): {"active": quota.active, "max_concurrency": quota.max_concurrency, "per_minute": quota.per_minute}
+            for namespace, quota in self._quotas.items()
+        }
+
+
+_tenants: Optional[TenantRegistry] = None
+_tenants_lock = threading.Lock()
+
+
+def set_processes(count: int):
+    """Déclare le nombre de processus servant les mêmes quotas (registre reconstruit)."""
+    global _processes, _tenants
+    _processes = max(1, count)
+    with _tenants_lock:
+        _tenants = None
+
+
+def get_tenants() -> TenantRegistry:
+    """Retourne le registre des namespaces du processus."""
+    global _tenants
+    with _tenants_lock:
+        if _tenants is None:
+            others = [ns.strip() for ns in Config.NAMESPACES.split(",") if ns.strip()]
+            if others and Config.VECTOR_BACKEND.lower() == "local":
+                # L'index local ne contient qu'un corpus
+                logger.warning("⚠️  NAMESPACES ignoré avec VECTOR_BACKEND=local: namespace par défaut seulement")
+                others = []
+            _tenants = TenantRegistry(
+                Config.PINECONE_NAMESPACE or "",
+                others,
+                Config.NAMESPACE_MAX_CONCURRENCY,
+                Config.NAMESPACE_QUERIES_PER_MINUTE,
+                parse_limits(Config.NAMESPACE_LIMITS),
+            )
+            logger.info(f"✅ Namespaces servis: {', '.join(sorted(label(ns) for ns in _tenants.allowed))}")
+        return _tenants
+
+
+def _collect_namespace_metrics() -> List[str]:
+    """Expose les requêtes en cours par namespace."""
+    if _tenants is None:
+        return []
+    lines = ["# TYPE rag_namespace_in_flight gauge"]
+    for namespace, stats in sorted(_tenants.stats().items()):
+        lines.append(f'rag_namespace_in_flight{{namespace="{namespace}"}} {stats["active"]}')
+    return lines
+
+
+REGISTRY.register_collector(_collect_namespace_metrics)
+
+
+def _reset_tenants(changed: Set[str]):
+    # Reconstruit au prochain appel; les requêtes en cours libèrent leur place dans l'ancien registre
+    global _tenants
+    with _tenants_lock:
+        _tenants = None
+
+
+on_config_change(
+    {"PINECONE_NAMESPACE", "NAMESPACES", "NAMESPACE_MAX_CONCURRENCY", "NAMESPACE_QUERIES_PER_MINUTE",
+     "NAMESPACE_LIMITS", "VECTOR_BACKEND"},
+    _reset_tenants,
+)